@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import sys
 from tqdm import tqdm
 import warnings
 
@@ -19,6 +20,45 @@ SOURCE_DIR = os.path.join(MSC_PROJECT_ROOT, "STOCK DATA", "hk_1h")
 # 输出文件
 OUTPUT_FILE = os.path.join(CURRENT_DIR, "hk_market_data.parquet")
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.sinks import parquet_sources, read_parquet_source
+from data_get.market_writer import MarketParquetWriter, finalize_ticker
+from data_get.market_schema import market_schema
+
+# 输出表结构 (统一紧凑类型，Datetime 存 UTC，香港时区记在元数据里；读取用 read_market(..., local_time=True))
+OUTPUT_SCHEMA = market_schema(['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume'], tz='Asia/Hong_Kong')
+
+def load_ticker_file(file_path, ticker, cols):
+    """读取一个来源 (Parquet 或 CSV)，统一为香港时间并去重；无有效数据返回 None"""
+    if file_path.lower().endswith('.csv'):
+        # === 标准读取 ===
+        df = pd.read_csv(file_path)
+        if df.empty: return None
+
+        # 1. 检查必要列
+        if 'Datetime' not in df.columns:
+            return None
+
+        # 2. 解析时间 (兼容 UTC 字符串)
+        df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
+
+        # 3. 标记 Ticker
+        df['Ticker'] = ticker
+    else:
+        df = read_parquet_source(file_path)
+        if df.empty: return None
+
+    # 统一转为香港时间
+    df['Datetime'] = df['Datetime'].dt.tz_convert('Asia/Hong_Kong')
+
+    # 统一列顺序并清洗
+    for c in cols:
+        if c not in df.columns: df[c] = None
+
+    # 简单去重，防止有重复行
+    return df[cols].drop_duplicates(subset=['Datetime'])
+
 def run_hk_cleaning_final():
     print("="*50)
     print("🇭🇰 港股数据清洗 (Final Path Fix)")
@@ -32,70 +72,48 @@ def run_hk_cleaning_final():
     print(f"📂 正确数据源: {SOURCE_DIR}")
     print(f"📝 扫描到文件: {len(csv_files)} 个 (这才是对的！)")
     
-    all_data = []
-    print(f"🚀 开始读取 (Standard Mode)...")
-    
-    for filename in tqdm(csv_files):
-        try:
-            file_path = os.path.join(SOURCE_DIR, filename)
-            
-            # === 标准读取 ===
-            df = pd.read_csv(file_path)
-            
-            if df.empty: continue
-            
-            # 1. 检查必要列
-            if 'Datetime' not in df.columns:
+    cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+    # 下载脚本直接写出的 Parquet (已带类型)，同名 CSV 跳过
+    sources = {ticker: [path] for ticker, path in parquet_sources(SOURCE_DIR).items()}
+    parquet_tickers = set(sources)
+    if parquet_tickers:
+        print(f"⚡ 直接读取 Parquet: {len(parquet_tickers)} 只")
+
+    for filename in csv_files:
+        ticker = filename.replace('_1h.csv', '').replace('.csv', '') + ".HK"
+        if ticker in parquet_tickers: continue
+        sources.setdefault(ticker, []).append(os.path.join(SOURCE_DIR, filename))
+
+    print(f"🚀 开始读取 (Streaming Mode): 逐只清洗、排序、填充后直接写出...")
+
+    # 按代码顺序逐只写出 (每只代码一个行组)，不再把全市场 concat 后全局排序
+    with MarketParquetWriter(OUTPUT_FILE, OUTPUT_SCHEMA) as writer:
+        for ticker, paths in tqdm(sorted(sources.items())):
+            frames = []
+            for file_path in paths:
+                try:
+                    df = load_ticker_file(file_path, ticker, cols)
+                except Exception:
+                    continue
+                if df is not None:
+                    frames.append(df)
+            if not frames:
                 continue
-                
-            # 2. 解析时间 (兼容 UTC 字符串)
-            df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
-            
-            # 3. 统一转为香港时间
-            df['Datetime'] = df['Datetime'].dt.tz_convert('Asia/Hong_Kong')
-
-            # 4. 提取 Ticker
-            ticker = filename.replace('_1h.csv', '').replace('.csv', '') + ".HK"
-            df['Ticker'] = ticker
-            
-            # 5. 统一列顺序并清洗
-            cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
-            for c in cols:
-                if c not in df.columns: df[c] = None
-            
-            all_aligned = df[cols].copy()
-            # 简单去重，防止有重复行
-            all_aligned.drop_duplicates(subset=['Datetime'], inplace=True)
-            
-            all_data.append(all_aligned)
-            
-        except Exception:
-            continue
-
-    if not all_data:
+
+            df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            # 填充逻辑 (价格前向填充、成交量补 0、删除仍有空值的行)
+            writer.write(finalize_ticker(df, dropna="all"))
+        if writer.rows == 0:
+            writer.abort()
+
+    if writer.rows == 0:
         print("❌ 没有读取到任何有效数据。")
         return
 
-    # 合并
-    print(f"\n📦 正在合并 {len(all_data)} 只股票...")
-    final_df = pd.concat(all_data, ignore_index=True)
-    
-    # 填充逻辑
-    print("🧹 执行 Resampling & Filling (修复数据间隙)...")
-    final_df = final_df.sort_values(['Ticker', 'Datetime'])
-    
-    price_cols = ['Open', 'High', 'Low', 'Close']
-    final_df[price_cols] = final_df.groupby('Ticker')[price_cols].ffill()
-    final_df['Volume'] = final_df['Volume'].fillna(0)
-    final_df.dropna(inplace=True)
-
-    # 保存
-    print(f"💾 正在保存至: {OUTPUT_FILE}")
-    final_df.to_parquet(OUTPUT_FILE, engine='pyarrow', compression='snappy')
-    
     print("="*50)
     print("✅ 完美完成！")
-    print(f"📊 最终数据形状: {final_df.shape}")
+    print(f"📊 最终数据形状: ({writer.rows}, {len(cols)})")
     print(f"📂 文件位置: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
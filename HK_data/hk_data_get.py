@@ -1,10 +1,8 @@
-import yfinance as yf
 import pandas as pd
 import os
-import time
+import sys
 import random
 import urllib3
-import requests
 from tqdm import tqdm
 
 # ==================== 1. 配置区域 ====================
@@ -27,7 +25,29 @@ os.makedirs(INTERNAL_OUTPUT_DIR, exist_ok=True)
 
 FAILED_LOG_FILE = os.path.join(INTERNAL_OUTPUT_DIR, "hk_failed_log.csv")
 
-HKEX_OFFICIAL_LIST_URL = "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx"
+# [配置] 已存在文件的处理方式
+#   "incremental": 只下载本地最后一根 K 线之后的数据并合并 (默认)
+#   "skip"       : 跳过已存在的文件 (旧行为，数据永远不会更新)
+#   "full"       : 重新下载 2 年并与本地合并
+UPDATE_MODE = "incremental"
+
+# [配置] 落盘格式: "csv" | "parquet" | "dataset" (见 data_get/sinks.py)
+SINK_FORMAT = "csv"
+# [配置] 采集遥测 (data_get/telemetry/*.jsonl，汇总: python data_get/telemetry.py summary)
+TELEMETRY = True
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.incremental import refresh_start
+from data_get.sinks import make_sink
+from data_get.universe_cache import get_hk_equity_tickers
+from data_get.negative_cache import NegativeCache, HK_MARKET
+from data_get.batch_fetch import fetch_single
+from data_get.throttle import AdaptiveThrottle
+from data_get.telemetry import Telemetry, payload_bytes
+
+# 自适应节流 (429 / 错误率过高时熔断，冷却后探测恢复)，取代固定的报错后 sleep(1)
+throttle = AdaptiveThrottle()
 
 # ==================== 2. 环境初始化 ====================
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -38,34 +58,41 @@ print(f"🌍 已配置代理: {PROXY_URL}")
 # ==================== 3. 核心功能函数 ====================
 
 def get_precise_hk_tickers():
-    """获取精准名单（已过滤只保留 Equity）"""
+    """获取精准名单（已过滤只保留 Equity）；名单缓存为本地 Parquet，TTL 内不联网也不解析 Excel"""
     print("📋 正在获取 HKEX 官方证券名单...")
     try:
-        resp = requests.get(HKEX_OFFICIAL_LIST_URL, verify=False, timeout=30)
-        temp_path = os.path.join(CURRENT_DIR, "hk_list_temp.xlsx")
-        with open(temp_path, 'wb') as f:
-            f.write(resp.content)
-            
-        df = pd.read_excel(temp_path, header=2, engine='openpyxl')
-        try: os.remove(temp_path)
-        except: pass
-
-        if 'Stock Code' in df.columns and 'Category' in df.columns:
-            # 核心过滤：只保留正股 (Equity)
-            df_equity = df[df['Category'] == 'Equity'].copy()
-            codes = df_equity['Stock Code'].astype(str).str.replace(r'\D', '', regex=True)
-            codes = codes[codes.str.len() > 0]
-            codes = codes.apply(lambda x: x.zfill(4) + ".HK").unique().tolist()
+        codes = get_hk_equity_tickers()
+        if codes:
             print(f"✅ 获取成功！已过滤衍生品，剩余 {len(codes)} 只正股。")
             return codes
             
     except Exception as e:
-        print(f"⚠️ 无法获取官方名单 ({e})，切换至回退模式 (0001-0999)...")
+        print(f"⚠️ 无法获取官方名单 ({e})，切换至回退模式 (0001-9998)...")
     
-    return [f"{str(i).zfill(4)}.HK" for i in range(1, 9999)]
+    return get_fallback_tickers()
+
+def get_fallback_tickers():
+    """
+    回退模式：号段 0001-9998 里绝大部分是空号。
+    用负缓存跳过冷却期内的已知空号；到期的空号先批量复查 (几天日线、一次几十只)，只有复活的才进入逐只抓取。
+    """
+    candidates = [f"{str(i).zfill(4)}.HK" for i in range(1, 9999)]
+    dead_cache = NegativeCache(HK_MARKET)
+
+    due = dead_cache.due() & set(candidates)
+    if due:
+        print(f"🔁 批量复查到期的空号: {len(due)} 只...")
+        revived = dead_cache.bulk_recheck(due, throttle=throttle)
+        print(f"   复活 {len(revived)} 只")
+
+    dead = dead_cache.dead_now()
+    plausible = [t for t in candidates if t not in dead]
+    print(f"🧹 负缓存跳过 {len(candidates) - len(plausible)} 个已知空号，剩余 {len(plausible)} 个待试探")
+    return plausible
 
 def run_safe_download():
     tickers = get_precise_hk_tickers()
+    telemetry = Telemetry("hk_data_get", enabled=TELEMETRY, config={"workers": 1, "update_mode": UPDATE_MODE})
     total = len(tickers)
     
     print(f"🚀 开始抓取 (目标: {total} 只 | 带失败统计)")
@@ -73,64 +100,78 @@ def run_safe_download():
     print(f"📝 失败日志: {FAILED_LOG_FILE}")
     
     # 统计计数器
-    stats = {"Success": 0, "Skip": 0, "Empty": 0, "Error": 0}
+    stats = {"Success": 0, "Updated": 0, "Skip": 0, "Empty": 0, "Error": 0}
     # 失败记录列表
     failed_records = []
 
+    # 空号负缓存：空结果记下来，回退模式下次直接跳过
+    dead_cache = NegativeCache(HK_MARKET)
+
+    # 统一以香港时间落盘，文件名去掉 .HK 后缀
+    sink = make_sink(SINK_FORMAT, OUTPUT_SUBDIR, 'Asia/Hong_Kong',
+                     stem_fn=lambda t: f"{t.replace('.HK', '')}_1h")
     pbar = tqdm(tickers, total=total, unit="stock")
     
     for ticker in pbar:
-        file_path = os.path.join(OUTPUT_SUBDIR, f"{ticker.replace('.HK', '')}_1h.csv")
-        
-        # 1. 跳过已存在
-        if os.path.exists(file_path):
+        # 1. 已存在的文件：跳过 或 计算增量起点
+        exists = sink.exists(ticker)
+        if exists and UPDATE_MODE == "skip":
             stats["Skip"] += 1
             pbar.set_description(f"⏩ 跳过 {ticker}")
             continue
+        start = None
+        if exists and UPDATE_MODE == "incremental":
+            start = refresh_start(sink.last_timestamp(ticker))
             
         try:
-            pbar.set_description(f"⬇️ 下载 {ticker}")
+            pbar.set_description(f"{'🔄 更新' if start is not None else '⬇️ 下载'} {ticker}")
             
-            # 2. 下载数据
-            stock = yf.Ticker(ticker)
-            df = stock.history(period="2y", interval="1h")
+            # 2. 下载数据 (增量模式只请求 start 之后的 K 线)
+            # raise_errors=True：429 直接抛出交给节流器，无数据返回空表
+            waited = throttle.before_request()
+            with telemetry.fetch(ticker) as rec:
+                rec.update(sleep_s=waited)
+                df = fetch_single(ticker, period="2y", interval="1h", start=start)
+                rec.update(rows=len(df), nbytes=payload_bytes(df))
+            throttle.record_success()
             
             # --- 情况 A: 无数据 ---
+            if df.empty and exists:
+                # 增量窗口内没有新 K 线 (停牌/假期)，不算失败
+                stats["Updated"] += 1
+                continue
             if df.empty:
                 stats["Empty"] += 1
                 failed_records.append({"Ticker": ticker, "Reason": "Empty Data (No history found)"})
+                dead_cache.mark_dead(ticker)
                 continue
                 
-            # 3. 时区转换
-            if df.index.tz is None:
-                df.index = df.index.tz_localize('UTC')
-            df.index = df.index.tz_convert('Asia/Hong_Kong')
-            
-            # 4. 保存
-            df.reset_index(inplace=True)
-            df['Ticker'] = ticker
-            cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
-            save_df = df[[c for c in cols if c in df.columns]]
-            save_df.to_csv(file_path, index=False)
+            # 3. 保存 (转为香港时间，与本地数据合并去重，原子写回)
+            sink.write(ticker, df)
+            if not exists:
+                dead_cache.mark_alive(ticker)
             
-            stats["Success"] += 1
+            stats["Updated" if exists else "Success"] += 1
             
             # 随机休眠
-            time.sleep(random.uniform(1.0, 2.0))
+            telemetry.sleep(random.uniform(1.0, 2.0))
 
         except Exception as e:
             # --- 情况 B: 报错 ---
             stats["Error"] += 1
             error_msg = str(e).replace('\n', ' ')[:100]
             failed_records.append({"Ticker": ticker, "Reason": f"Error: {error_msg}"})
-            time.sleep(1)
+            throttle.record_failure(e)
 
+    telemetry.close(breaker_trips=throttle.trips)
     print("\n" + "="*40)
     print(f"📊 任务完成")
     print(f"✅ 成功下载: {stats['Success']}")
+    print(f"🔄 增量更新: {stats['Updated']}")
     print(f"⏩ 跳过已存: {stats['Skip']}")
     print(f"📭 无数据  : {stats['Empty']}")
     print(f"❌ 发生错误: {stats['Error']}")
+    print(f"🪦 空号缓存: {dead_cache.counts()}")
     
     # === 保存失败日志 ===
     if failed_records:
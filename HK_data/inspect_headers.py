@@ -1,10 +1,15 @@
 import os
+import sys
 
 # ==================== 路径配置 ====================
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 MSC_PROJECT_ROOT = os.path.dirname(PROJECT_ROOT)
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.csv_reader import sniff_layout
+
 # 你的数据源路径
 SOURCE_DIR = os.path.join(MSC_PROJECT_ROOT, "STOCK DATA", "us_stocks_data", "hk_1h")
 
@@ -41,13 +46,16 @@ def inspect_files():
             for idx, line in enumerate(lines):
                 print(f"   第 {idx+1} 行: {line}")
                 
-            # 自动判断
-            if line[0].startswith("Price"):
-                print("   👉 结论: 这是【三层表头】(旧版格式)")
-            elif line[0].startswith("Datetime"):
+            # 自动判断 (与清洗脚本共用 data_get/csv_reader.py 的嗅探逻辑)
+            layout = sniff_layout(file_path)
+            if layout is None:
+                print("   👉 结论: 没有数据行")
+            elif layout['kind'] == 'yf':
+                print(f"   👉 结论: 这是【三层表头】(旧版格式)，跳过前 {layout['skip_rows']} 行")
+            elif layout['kind'] == 'flat':
                 print("   👉 结论: 这是【标准格式】")
             else:
-                print("   👉 结论: 未知/混合格式")
+                print(f"   👉 结论: 未知/混合格式 (第一列按时间解析，跳过前 {layout['skip_rows']} 行)")
                 
         except Exception as e:
             print(f"   ❌ 读取出错: {e}")
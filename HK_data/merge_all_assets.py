@@ -1,5 +1,7 @@
 import pandas as pd
 import os
+import sys
+import argparse
 from tqdm import tqdm
 import warnings
 
@@ -21,106 +23,156 @@ SOURCE_CONFIG = {
 
 # 输出文件
 OUTPUT_FILE = os.path.join(CURRENT_DIR, "hk_unified_market.parquet")
+# [配置] 额外写出 Hive 分区目录 (去掉 .parquet 的同名目录，见 data_get/market_dataset.py；可用 --partitioned 打开)
+PARTITIONED = False
 
-def process_folder(asset_type, folder_path):
-    """读取指定文件夹下的所有CSV，并打上标签"""
-    data_list = []
-    
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.sinks import parquet_sources, read_parquet_source
+from data_get.market_writer import MarketParquetWriter, finalize_ticker
+from data_get.build_manifest import BuildManifest, open_previous
+from data_get.market_schema import market_schema
+from data_get.market_dataset import partition_file, dataset_path, dataset_stats
+
+COLS = ['Datetime', 'Ticker', 'Asset_Type', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# 输出表结构 (统一紧凑类型: Ticker / Asset_Type 字典编码，Datetime 存 UTC + 香港时区元数据)
+OUTPUT_SCHEMA = market_schema(COLS, tz='Asia/Hong_Kong')
+
+def collect_folder(asset_type, folder_path, sources):
+    """登记指定文件夹下的数据来源: sources[ticker] 追加 (资产类型, 路径)，此时不读取数据"""
     if not os.path.exists(folder_path):
         print(f"⚠️ 警告: 文件夹不存在 {folder_path}，跳过。")
-        return []
+        return
+
+    # 下载脚本直接写出的 Parquet (已带类型)，同名 CSV 跳过
+    parquet_tickers = set()
+    for ticker, path in parquet_sources(folder_path).items():
+        sources.setdefault(ticker, []).append((asset_type, path))
+        parquet_tickers.add(ticker)
 
     files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
-    print(f"📂 正在处理 [{asset_type}]: 找到 {len(files)} 个文件")
+    print(f"📂 登记 [{asset_type}]: 找到 {len(files)} 个 CSV 文件, {len(parquet_tickers)} 个 Parquet")
     
-    for filename in tqdm(files, desc=f"Reading {asset_type}"):
+    for filename in files:
+        # 1. 提取 Ticker
+        ticker = filename.replace('_1h.csv', '').replace('.csv', '')
+        if not ticker.endswith('.HK'):
+            ticker += '.HK'
+        if ticker in parquet_tickers: continue
+        sources.setdefault(ticker, []).append((asset_type, os.path.join(folder_path, filename)))
+
+def load_source(asset_type, ticker, file_path):
+    """读取一个来源并打上标签；无有效数据返回 None"""
+    if file_path.lower().endswith('.csv'):
+        df = pd.read_csv(file_path)
+        if df.empty: return None
+
+        # 2. 确保 Datetime 格式统一
+        if 'Datetime' not in df.columns: return None
+
+        # [一致性] 这里的逻辑和你原来的脚本完全一样
+        df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
+    else:
+        df = read_parquet_source(file_path)
+        if df.empty: return None
+    df['Datetime'] = df['Datetime'].dt.tz_convert('Asia/Hong_Kong')
+
+    # [一致性] 加上去重，防止CSV内部有重复行
+    df = df.drop_duplicates(subset=['Datetime'])
+
+    # 3. 标准化列
+    df['Ticker'] = ticker
+    df['Asset_Type'] = asset_type  # <--- 唯一的区别：新增身份标签
+
+    # 补齐缺失列
+    for c in COLS:
+        if c not in df.columns: df[c] = None
+    return df[COLS]
+
+def merge_ticker(ticker, entries, manifest):
+    """读取一只代码的全部来源并清洗，登记各文件行数；无有效数据返回 None"""
+    frames = []
+    for asset_type, file_path in entries:
         try:
-            file_path = os.path.join(folder_path, filename)
-            df = pd.read_csv(file_path)
-            
-            if df.empty: continue
-            
-            # 1. 提取 Ticker
-            ticker = filename.replace('_1h.csv', '').replace('.csv', '')
-            if not ticker.endswith('.HK'):
-                ticker += '.HK'
-            
-            # 2. 确保 Datetime 格式统一
-            if 'Datetime' not in df.columns: continue
-            
-            # [一致性] 这里的逻辑和你原来的脚本完全一样
-            df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
-            df['Datetime'] = df['Datetime'].dt.tz_convert('Asia/Hong_Kong')
-            
-            # [一致性] 加上去重，防止CSV内部有重复行
-            df.drop_duplicates(subset=['Datetime'], inplace=True)
-
-            # 3. 标准化列
-            df['Ticker'] = ticker
-            df['Asset_Type'] = asset_type  # <--- 唯一的区别：新增身份标签
-            
-            cols = ['Datetime', 'Ticker', 'Asset_Type', 'Open', 'High', 'Low', 'Close', 'Volume']
-            # 补齐缺失列
-            for c in cols:
-                if c not in df.columns: df[c] = None
-                
-            data_list.append(df[cols])
-            
+            df = load_source(asset_type, ticker, file_path)
         except Exception:
-            continue
-            
-    return data_list
+            df = None
+        manifest.record(file_path, 0 if df is None else len(df))
+        if df is not None:
+            frames.append(df)
+    if not frames:
+        return None
 
-def run_unified_merge():
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    # 前向填充价格、Volume 填 0、删除依然没有收盘价的行
+    return finalize_ticker(df, dropna=['Close'])
+
+def run_unified_merge(full=False, partitioned=PARTITIONED):
     print("="*50)
     print("🇭🇰 全港股市场统一数据库构建 (Final Compatible Ver)")
     print("="*50)
     
-    all_market_data = []
-    
-    # 1. 依次处理三种资产
+    # 1. 依次登记三种资产的数据来源 (只列文件，不读数据)
+    sources = {}
     for asset_type, path in SOURCE_CONFIG.items():
-        chunk = process_folder(asset_type, path)
-        all_market_data.extend(chunk)
+        collect_folder(asset_type, path, sources)
         
-    if not all_market_data:
+    if not sources:
         print("❌ 错误：没有读取到任何数据！")
         return
 
-    # 2. 合并
-    print(f"\n📦 正在合并 {len(all_market_data)} 个文件片段...")
-    final_df = pd.concat(all_market_data, ignore_index=True)
-    
-    # 3. 清洗 (和你原来的逻辑一致)
-    print("🧹 执行最终清洗 (Sorting & Filling)...")
-    final_df.sort_values(['Ticker', 'Datetime'], inplace=True)
-    
-    # 前向填充价格
-    price_cols = ['Open', 'High', 'Low', 'Close']
-    final_df[price_cols] = final_df.groupby('Ticker')[price_cols].ffill()
-    
-    # Volume 填 0
-    final_df['Volume'] = final_df['Volume'].fillna(0)
-    
-    # 删除依然为空的行
-    final_df.dropna(subset=['Close'], inplace=True)
-    
-    # 4. 优化内存
-    final_df['Asset_Type'] = final_df['Asset_Type'].astype('category')
-    final_df['Ticker'] = final_df['Ticker'].astype('category')
+    # 2. 对照清单: 只重新读取新增 / 内容变化的文件，其余代码从旧输出按行组原样拷贝
+    manifest = BuildManifest(OUTPUT_FILE, params={"schema": OUTPUT_SCHEMA.to_string()})
+    plan = manifest.plan({t: [path for _, path in entries] for t, entries in sources.items()}, full=full)
+    previous = open_previous(plan, OUTPUT_FILE)
+    dirty = plan.dirty if previous else set(sources)
+    print(f"🧾 增量清单: {plan.summary() if previous else f'全部重建 {len(dirty)} 只'}")
 
-    # 5. 保存
-    print(f"💾 正在保存至: {OUTPUT_FILE}")
-    final_df.to_parquet(OUTPUT_FILE, engine='pyarrow', compression='snappy')
-    
+    # 3. 按代码顺序逐只读取、清洗并写出 (每只代码一个行组，峰值内存约为单只代码)
+    print(f"\n🧹 逐只清洗并写出 {len(dirty)} 只代码 (Sorting & Filling)...")
+    asset_tickers = {}
+    try:
+        with MarketParquetWriter(OUTPUT_FILE, OUTPUT_SCHEMA) as writer:
+            for ticker, entries in tqdm(sorted(sources.items()), desc="Merging"):
+                if ticker in dirty:
+                    df = merge_ticker(ticker, entries, manifest)
+                    if df is None or not writer.write(df):
+                        continue
+                elif not previous.copy_to(writer, ticker):
+                    continue
+                for asset_type in {asset_type for asset_type, _ in entries}:
+                    asset_tickers[asset_type] = asset_tickers.get(asset_type, 0) + 1
+            if writer.rows == 0:
+                writer.abort()
+    finally:
+        if previous:
+            previous.close()
+
+    if writer.rows == 0:
+        print("❌ 错误：没有读取到任何数据！")
+        return
+
+    manifest.save()
+    print(f"💾 已保存至: {OUTPUT_FILE}")
     print("="*50)
     print("✅ 统一数据库构建完成！")
     print("-" * 30)
-    print(f"📊 总行数: {len(final_df):,}")
-    print(f"📈 包含资产数: {final_df['Ticker'].nunique():,}")
+    print(f"📊 总行数: {writer.rows:,}")
+    print(f"📈 包含资产数: {writer.tickers:,}")
     print("   具体分布:")
-    print(final_df.groupby('Asset_Type')['Ticker'].nunique().to_string())
+    print(pd.Series(asset_tickers, name='Ticker').rename_axis('Asset_Type').sort_index().to_string())
     print("-" * 30)
 
+    if partitioned:
+        root = dataset_path(OUTPUT_FILE)
+        partition_file(OUTPUT_FILE, root, market="HK")
+        partitions, files = dataset_stats(root)
+        print(f"🗂️ 分区目录已更新: {root} ({partitions:,} 个分区, {files:,} 个文件)")
+
 if __name__ == "__main__":
-    run_unified_merge()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="港股 股票/ETF/REIT 统一数据库构建")
+    parser.add_argument("--full", action="store_true", help="忽略清单，全部重新读取")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED, help="额外写出 Hive 分区目录")
+    args = parser.parse_args()
+    run_unified_merge(full=args.full, partitioned=args.partitioned)
\ No newline at end of file
@@ -1,10 +1,8 @@
-import yfinance as yf
 import pandas as pd
 import os
-import time
+import sys
 import random
 import urllib3
-import requests
 from tqdm import tqdm
 
 # ==================== 1. 配置区域 ====================
@@ -27,7 +25,25 @@ for d in DIRS.values():
     os.makedirs(d, exist_ok=True)
 
 FAILED_LOG_FILE = os.path.join(CURRENT_DIR, "hk_funds_bonds_failed.csv")
-HKEX_URL = "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx"
+
+# [配置] 已存在文件的处理方式: "incremental" (只补新 K 线) | "skip" (旧行为) | "full" (重下 2 年并合并)
+UPDATE_MODE = "incremental"
+# [配置] 落盘格式: "csv" | "parquet" | "dataset" (见 data_get/sinks.py)
+SINK_FORMAT = "csv"
+# [配置] 采集遥测 (data_get/telemetry/*.jsonl，汇总: python data_get/telemetry.py summary)
+TELEMETRY = True
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.incremental import refresh_start
+from data_get.sinks import make_sink
+from data_get.universe_cache import load_hkex_frame, hk_codes
+from data_get.batch_fetch import fetch_single
+from data_get.throttle import AdaptiveThrottle
+from data_get.telemetry import Telemetry, DISABLED, payload_bytes
+
+# 自适应节流 (429 / 错误率过高时熔断，冷却后探测恢复)，取代固定的报错后 sleep(1)
+throttle = AdaptiveThrottle()
 
 # ==================== 2. 环境初始化 ====================
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,43 +55,18 @@ os.environ['HTTPS_PROXY'] = PROXY_URL
 def get_categorized_tickers():
     print("📋 正在获取 HKEX 官方证券名单并分类...")
     try:
-        resp = requests.get(HKEX_URL, verify=False, timeout=30)
-        temp_path = os.path.join(CURRENT_DIR, "hk_list_temp_fb.xlsx")
-        with open(temp_path, 'wb') as f:
-            f.write(resp.content)
-            
-        # 读取 CSV (你的文件其实是 CSV 格式)
-        try:
-            # 尝试直接读取 Excel
-            df = pd.read_excel(temp_path, header=2, engine='openpyxl')
-        except:
-            # 如果失败，尝试作为 CSV 读取 (兼容你上传的那个格式)
-            df = pd.read_csv(temp_path, header=2)
-
-        try: os.remove(temp_path)
-        except: pass
-
-        if 'Stock Code' not in df.columns or 'Category' not in df.columns:
-            print("❌ 官方名单格式有变，无法解析！")
-            print(f"   列名: {df.columns.tolist()}")
-            return None
-
-        # 清洗 Stock Code
-        df['Ticker'] = df['Stock Code'].astype(str).str.extract(r'(\d+)')[0]
-        df['Ticker'] = df['Ticker'].str.zfill(4) + ".HK"
+        # 名单缓存为本地 Parquet (Excel 解析/格式校验在 universe_cache.py 里)
+        df = load_hkex_frame()
         
         # === [修正] 精确分类逻辑 ===
         # 1. ETFs: 对应 'Exchange Traded Products'
-        etf_mask = df['Category'] == 'Exchange Traded Products'
-        etfs = df[etf_mask]['Ticker'].unique().tolist()
+        etfs = hk_codes(df, 'Exchange Traded Products')
         
         # 2. REITs: 对应 'Real Estate Investment Trusts'
-        reit_mask = df['Category'] == 'Real Estate Investment Trusts'
-        reits = df[reit_mask]['Ticker'].unique().tolist()
+        reits = hk_codes(df, 'Real Estate Investment Trusts')
         
         # 3. Bonds: 对应 'Debt Securities'
-        bond_mask = df['Category'] == 'Debt Securities'
-        bonds = df[bond_mask]['Ticker'].unique().tolist()
+        bonds = hk_codes(df, 'Debt Securities')
 
         print(f"✅ 分类解析完成 (总计目标: {len(etfs)+len(reits)+len(bonds)}):")
         print(f"   📊 ETFs  : {len(etfs)} 只 (如 2800.HK)")
@@ -88,57 +79,61 @@ def get_categorized_tickers():
         print(f"❌ 获取名单失败: {e}")
         return None
 
-def download_batch(category_name, tickers, save_dir):
+def download_batch(category_name, tickers, save_dir, telemetry=DISABLED):
     print(f"\n🚀 开始抓取 [{category_name}] (目标: {len(tickers)} 只)")
     
-    stats = {"Success": 0, "Skip": 0, "Empty": 0, "Error": 0}
+    stats = {"Success": 0, "Updated": 0, "Skip": 0, "Empty": 0, "Error": 0}
     failed_records = []
     
+    sink = make_sink(SINK_FORMAT, save_dir, 'Asia/Hong_Kong',
+                     stem_fn=lambda t: f"{t.replace('.HK', '')}_1h")
     pbar = tqdm(tickers, unit="stock")
     
     for ticker in pbar:
-        file_name = f"{ticker.replace('.HK', '')}_1h.csv"
-        file_path = os.path.join(save_dir, file_name)
-        
-        if os.path.exists(file_path):
+        exists = sink.exists(ticker)
+        if exists and UPDATE_MODE == "skip":
             stats["Skip"] += 1
             continue
+        start = None
+        if exists and UPDATE_MODE == "incremental":
+            start = refresh_start(sink.last_timestamp(ticker))
             
         try:
-            pbar.set_description(f"⬇️ {category_name}: {ticker}")
+            pbar.set_description(f"{'🔄' if start is not None else '⬇️'} {category_name}: {ticker}")
             
-            stock = yf.Ticker(ticker)
-            df = stock.history(period="2y", interval="1h")
+            # raise_errors=True：429 直接抛出交给节流器，无数据返回空表
+            waited = throttle.before_request()
+            with telemetry.fetch(ticker) as rec:
+                rec.update(sleep_s=waited, dataset=category_name)
+                df = fetch_single(ticker, period="2y", interval="1h", start=start)
+                rec.update(rows=len(df), nbytes=payload_bytes(df))
+            throttle.record_success()
             
+            if df.empty and exists:
+                # 增量窗口内没有新 K 线，不算失败
+                stats["Updated"] += 1
+                continue
             if df.empty:
                 stats["Empty"] += 1
                 if category_name != "BOND": # 债券空值太正常了，不记入错误日志以免刷屏
                     failed_records.append({"Category": category_name, "Ticker": ticker, "Reason": "Empty Data"})
                 continue
                 
-            if df.index.tz is None:
-                df.index = df.index.tz_localize('UTC')
-            df.index = df.index.tz_convert('Asia/Hong_Kong')
-            
-            df.reset_index(inplace=True)
-            df['Ticker'] = ticker
-            cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
-            save_df = df[[c for c in cols if c in df.columns]]
-            
-            if not save_df.empty:
-                save_df.to_csv(file_path, index=False)
-                stats["Success"] += 1
+            if not df.dropna(how='all').empty:
+                # 转为香港时间，与本地数据合并去重，原子写回
+                sink.write(ticker, df)
+                stats["Updated" if exists else "Success"] += 1
             else:
                 stats["Empty"] += 1
 
-            time.sleep(random.uniform(0.5, 1.5))
+            telemetry.sleep(random.uniform(0.5, 1.5))
 
         except Exception as e:
             stats["Error"] += 1
             failed_records.append({"Category": category_name, "Ticker": ticker, "Reason": str(e)[:50]})
-            time.sleep(1)
+            throttle.record_failure(e)
 
-    print(f"🏁 [{category_name}] 结束: ✅{stats['Success']} | 📭{stats['Empty']} | ❌{stats['Error']}")
+    print(f"🏁 [{category_name}] 结束: ✅{stats['Success']} | 🔄{stats['Updated']} | 📭{stats['Empty']} | ❌{stats['Error']}")
     return failed_records
 
 def main():
@@ -146,10 +141,12 @@ def main():
     if not targets: return
 
     all_failed = []
+    telemetry = Telemetry("other_data_get", enabled=TELEMETRY, config={"workers": 1, "update_mode": UPDATE_MODE})
     # 依次执行
-    all_failed.extend(download_batch("ETF", targets["ETF"], DIRS["ETF"]))
-    all_failed.extend(download_batch("REIT", targets["REIT"], DIRS["REIT"]))
-    all_failed.extend(download_batch("BOND", targets["BOND"], DIRS["BOND"]))
+    all_failed.extend(download_batch("ETF", targets["ETF"], DIRS["ETF"], telemetry))
+    all_failed.extend(download_batch("REIT", targets["REIT"], DIRS["REIT"], telemetry))
+    all_failed.extend(download_batch("BOND", targets["BOND"], DIRS["BOND"], telemetry))
+    telemetry.close(breaker_trips=throttle.trips)
     
     if all_failed:
         df_log = pd.DataFrame(all_failed)
@@ -1,4 +1,5 @@
 import os
+import sys
 import pandas as pd
 import glob
 from pathlib import Path
@@ -11,6 +12,11 @@ HK_RAW_DIR = r"E:\Msc project\STOCK DATA"
 HK_CLEAN_FILE = r"E:\Msc project\Yfinance RPA\HK_data\hk_unified_market.parquet"
 # ===================================================
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_schema import read_market
+
 def get_folder_size_mb(folder_path):
     """计算文件夹大小 (MB)"""
     total_size = 0
@@ -56,7 +62,7 @@ def scan_hk_assets():
     if os.path.exists(HK_CLEAN_FILE):
         try:
             # 只读取必要列以加速统计
-            df = pd.read_parquet(HK_CLEAN_FILE, columns=['Ticker', 'Datetime'])
+            df = read_market(HK_CLEAN_FILE, columns=['Ticker', 'Datetime'], local_time=True)
             
             clean_rows = len(df)
             clean_tickers = df['Ticker'].nunique()
@@ -1,9 +1,14 @@
-import pandas as pd
 import os
+import sys
 
 # ==================== 路径配置 ====================
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.join(CURRENT_DIR, "hk_market_data.parquet")
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_schema import read_market
 
 def verify_dataset():
     print("="*50)
@@ -19,7 +24,8 @@ def verify_dataset():
     # 2. 读取数据
     print(f"📂 正在加载数据: {DATA_FILE}")
     print("   (数据量较大，请稍候...)")
-    df = pd.read_parquet(DATA_FILE)
+    # 统一紧凑类型读取，时间转回香港时区
+    df = read_market(DATA_FILE, local_time=True)
     
     print("\n✅ 读取成功！基础指标如下：")
     print("-" * 30)
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from functools import partial
+import numpy as np
+import pandas as pd
+
+# ==================== 采集吞吐量压测 ====================
+# 在本地替身服务器上跑真实的采集代码 (FetchEngine + AdaptiveThrottle + us_data_get 的下载函数 + sink)，
+# 每个场景测:
+#   - 端到端吞吐量 (tickers/s)
+#   - 单次请求延迟 p50 / p95 / p99 (含落盘)
+#   - 错误 / 限流次数、熔断次数、节流累计等待
+#   - 恢复时间: outage 结束后到第一条成功响应的秒数
+# 服务器延迟/故障注入都带固定种子，结果可复现 (除了线程调度带来的少量抖动)。
+# 替身服务器跑在独立进程里 (StandinProcess)，不和采集端抢 GIL；默认用 null sink (只计数不落盘)，
+# 测的是采集本身而不是本地 CSV 序列化，需要把落盘算进去时用 --sink csv/parquet/dataset。
+#
+# 用法:
+#   python benchmark/bench_acquisition.py                     # 跑全部场景
+#   python benchmark/bench_acquisition.py --scenario outage --tickers 300 --workers 8
+#   python benchmark/bench_acquisition.py --sink csv                          # 含落盘开销
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+RESULTS_DIR = os.path.join(CURRENT_DIR, "results")
+
+for p in (PROJECT_ROOT, CURRENT_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+from standin_server import StandinProcess, synthetic_universe
+from data_get.fetch_engine import FetchEngine
+from data_get.throttle import AdaptiveThrottle
+from data_get.sinks import make_sink
+from data_get import us_data_get
+
+# 压测时把节流器的时间尺度缩短 (真实配置的冷却是 15 秒起步)
+BENCH_THROTTLE = {
+    "window_sec": 10,
+    "min_samples": 10,
+    "error_rate_threshold": 0.5,
+    "base_delay": 0.1,
+    "max_delay": 2.0,
+    "cooldown": 1.0,
+    "max_cooldown": 8.0,
+}
+
+# 场景: server 为替身服务器配置，client 为采集端配置
+SCENARIOS = {
+    "baseline": {
+        "server": {"latency_ms": 60, "latency_tail_ms": 30},
+        "client": {"workers": 4, "rate": 20.0, "burst": 4, "batch_size": 1},
+    },
+    "high_concurrency": {
+        "server": {"latency_ms": 60, "latency_tail_ms": 30},
+        "client": {"workers": 16, "rate": 80.0, "burst": 16, "batch_size": 1},
+    },
+    "batched": {
+        "server": {"latency_ms": 60, "latency_tail_ms": 30},
+        "client": {"workers": 4, "rate": 40.0, "burst": 20, "batch_size": 20},
+    },
+    "flaky": {
+        "server": {"latency_ms": 60, "latency_tail_ms": 120, "error_rate": 0.05},
+        "client": {"workers": 8, "rate": 40.0, "burst": 8, "batch_size": 1},
+    },
+    "server_rate_limit": {
+        "server": {"latency_ms": 40, "latency_tail_ms": 20, "rate_limit_rps": 5,
+                   "rate_limit_burst": 5, "penalty_sec": 2.0},
+        "client": {"workers": 8, "rate": 40.0, "burst": 8, "batch_size": 1},
+    },
+    "outage": {
+        "server": {"latency_ms": 40, "latency_tail_ms": 20, "outage": [2.0, 4.0]},
+        "client": {"workers": 8, "rate": 30.0, "burst": 8, "batch_size": 1},
+    },
+}
+
+
+# 压测可选的落盘方式: null = 不写文件
+BENCH_SINKS = ("null", "csv", "parquet", "dataset")
+
+
+class NullSink:
+    """不落盘的 sink: 只记录写过的代码和行数，接口同 data_get/sinks.py"""
+    fmt = "null"
+
+    def __init__(self):
+        self.rows = {}
+
+    def path(self, ticker):
+        return os.devnull
+
+    def exists(self, ticker):
+        return ticker in self.rows
+
+    def size_bytes(self, ticker):
+        return 0
+
+    def last_timestamp(self, ticker):
+        return None
+
+    def write(self, ticker, df):
+        if df is None or df.empty:
+            return 0, 0
+        self.rows[ticker] = self.rows.get(ticker, 0) + len(df)
+        return len(df), self.rows[ticker]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def recovery_time(chart_log, outage):
+    """outage 结束后到第一条 200 响应的秒数"""
+    if not outage:
+        return None
+    end = outage[0] + outage[1]
+    after = [t for t, status in chart_log if t >= end and status == 200]
+    return round(after[0] - end, 3) if after else None
+
+
+def run_scenario(standin, name, tickers, overrides=None, sink_format="null"):
+    spec = SCENARIOS[name]
+    client = dict(spec["client"])
+    client.update(overrides or {})
+
+    standin.configure(defaults=True, **spec["server"])
+    standin.reset()
+
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    if sink_format == "null":
+        sink = NullSink()
+    else:
+        sink = make_sink(sink_format, workdir, "America/New_York", layout="yf")
+    throttle = AdaptiveThrottle(**BENCH_THROTTLE)
+    engine = FetchEngine(max_workers=client["workers"], rate_per_sec=client["rate"], burst=client["burst"],
+                         host_budgets={}, throttle=throttle)
+
+    latencies = []
+    lat_lock = threading.Lock()
+
+    def timed(fn, item):
+        t0 = time.monotonic()
+        try:
+            return fn(item)
+        finally:
+            with lat_lock:
+                latencies.append(time.monotonic() - t0)
+
+    batch_size = client["batch_size"]
+    if batch_size > 1:
+        items = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+        fetch_fn, cost_fn = partial(us_data_get.download_ticker_batch, sink=sink), len
+    else:
+        items = list(tickers)
+        fetch_fn, cost_fn = partial(us_data_get.download_ticker, sink=sink), None
+
+    counts = {"ok": 0, "empty": 0, "error": 0, "rate_limited": 0}
+    t0 = time.monotonic()
+    try:
+        for item, outcomes, error in engine.run(items, partial(timed, fetch_fn), host=standin.host, cost_fn=cost_fn):
+            if error is not None:
+                members = item if isinstance(item, list) else [item]
+                outcomes = [(t, None, error, None) for t in members]
+            for ticker, rows, err, _ in outcomes:
+                throttle.record(err)
+                if err is not None:
+                    counts["rate_limited" if us_data_get.is_rate_limit_message(err) else "error"] += 1
+                elif sink.exists(ticker):
+                    counts["ok"] += 1
+                else:
+                    counts["empty"] += 1
+    finally:
+        elapsed = time.monotonic() - t0
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = standin.snapshot()
+    return {
+        "scenario": name,
+        "sink": sink_format,
+        "tickers": len(tickers),
+        **counts,
+        "elapsed_s": round(elapsed, 2),
+        "tickers_per_s": round(len(tickers) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "server_requests": stats["chart_requests"],
+        "server_429": stats["by_status"].get("429", 0),
+        "server_500": stats["by_status"].get("500", 0),
+        "breaker_trips": throttle.trips,
+        "throttle_wait_s": round(throttle.sleep_time, 2),
+        "recovery_s": recovery_time(stats["chart_log"], spec["server"].get("outage")),
+        "client": client,
+    }
+
+
+def run_benchmark(scenarios, n_tickers, overrides=None, sink_format="null", save=True):
+    standin = StandinProcess(port=0).start()
+    os.environ.update(standin.endpoint_env())
+    print(f"🧪 替身服务器 (独立进程): {standin.url} | 落盘: {sink_format}")
+    tickers = synthetic_universe(n_tickers)
+
+    results = []
+    try:
+        for name in scenarios:
+            print(f"\n▶️ 场景 [{name}] ({n_tickers} 只)...")
+            result = run_scenario(standin, name, tickers, overrides, sink_format)
+            results.append(result)
+            print(f"   {result['tickers_per_s']} tickers/s | p95 {result['p95_ms']} ms | "
+                  f"错误 {result['error']} | 限流 {result['rate_limited']} | 熔断 {result['breaker_trips']}")
+    finally:
+        standin.stop()
+
+    table = pd.DataFrame([{k: v for k, v in r.items() if k != "client"} for r in results])
+    print("\n" + "=" * 60)
+    print(table.to_string(index=False))
+    print("=" * 60)
+
+    if save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"acquisition_{datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {out}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="采集吞吐量离线压测")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append",
+                        help="只跑指定场景 (可重复)，默认全部")
+    parser.add_argument("--tickers", type=int, default=200, help="每个场景抓取的代码数")
+    parser.add_argument("--workers", type=int, help="覆盖场景里的并发线程数")
+    parser.add_argument("--rate", type=float, help="覆盖场景里的全局限速 (请求/秒)")
+    parser.add_argument("--batch-size", type=int, help="覆盖场景里的批大小")
+    parser.add_argument("--sink", choices=BENCH_SINKS, default="null", help="落盘格式 (null = 不落盘，只测采集)")
+    parser.add_argument("--no-save", action="store_true", help="不写入 benchmark/results/")
+    args = parser.parse_args()
+
+    overrides = {k: v for k, v in {"workers": args.workers, "rate": args.rate,
+                                   "batch_size": args.batch_size}.items() if v is not None}
+    run_benchmark(args.scenario or list(SCENARIOS), args.tickers, overrides, args.sink, save=not args.no_save)
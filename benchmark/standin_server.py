@@ -0,0 +1,522 @@
+import os
+import io
+import sys
+import json
+import time
+import zlib
+import random
+import hashlib
+import argparse
+import threading
+import subprocess
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import numpy as np
+import pandas as pd
+
+# ==================== Yahoo / SEC / HKEX 本地替身服务器 ====================
+# 离线回放图表接口和名单文件，可配置延迟、错误率、429 注入，用来压测下载脚本的并发与退避参数。
+#
+#   GET  /v8/finance/chart/<ticker>   图表接口 (range=730d 或 period1/period2)
+#   GET  /files/company_tickers.json  SEC 代码表
+#   GET  /ListOfSecurities.xlsx       HKEX 证券名单
+#   GET  /etf_symbols_list.csv        美股 ETF 名单
+#   GET  /__stats                     服务端统计 (JSON)
+#   POST /__config                    更新配置 (JSON body，只改传入的键；"defaults": true 先恢复默认)；POST /__reset 清空统计
+#
+# StandinServer 在当前进程的线程里运行；StandinProcess 把它放到独立进程 (压测用，见 bench_acquisition.py)。
+#
+# 数据来源: fixtures 目录里有录制的响应就回放 (chart/<TICKER>.json、company_tickers.json 等)，
+#          没有就按代码名做种子生成确定性的合成数据。
+# 录制: python benchmark/standin_server.py record AAPL MSFT  (需要能访问 Yahoo)
+#
+# 让下载脚本指向替身服务器:
+#   RPA_YAHOO_BASE=http://127.0.0.1:8765
+#   RPA_SEC_TICKERS_URL=http://127.0.0.1:8765/files/company_tickers.json
+#   RPA_HKEX_LIST_URL=http://127.0.0.1:8765/ListOfSecurities.xlsx
+#   RPA_US_ETF_LIST_URL=http://127.0.0.1:8765/etf_symbols_list.csv
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+FIXTURES_DIR = os.path.join(CURRENT_DIR, "fixtures")
+
+DEFAULT_PORT = 8765
+
+DEFAULT_CONFIG = {
+    "latency_ms": 80,          # 基础延迟
+    "latency_tail_ms": 40,     # 额外延迟 ~ 指数分布 (均值)，制造长尾
+    "error_rate": 0.0,         # 随机返回 500 的比例
+    "p429": 0.0,               # 随机返回 429 的比例
+    "rate_limit_rps": None,    # 服务端令牌桶限速 (请求/秒)，超出返回 429；None = 不限
+    "rate_limit_burst": 10,
+    "penalty_sec": 0.0,        # 触发限速后，所有请求继续 429 的惩罚时长 (模拟 Yahoo 的封禁窗口)
+    "outage": None,            # [开始秒, 持续秒]：相对服务启动/重置时间，窗口内图表接口全部 429
+    "missing_rate": 0.02,      # 返回 404 (退市/无数据) 的代码比例 (按代码名确定，可复现)
+    "universe_size": 500,      # 合成 SEC 名单的代码数
+    "seed": 42,
+}
+
+YAHOO_CHART_PREFIX = "/v8/finance/chart/"
+US_TZ = "America/New_York"
+
+
+# ==================== 合成数据 ====================
+
+def ticker_seed(ticker, seed):
+    return zlib.crc32(f"{seed}:{ticker}".encode())
+
+
+def synthetic_universe(n):
+    """确定性的合成代码: AAAA, AAAB, ..."""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    out = []
+    for i in range(n):
+        code, x = "", i
+        for _ in range(4):
+            code = letters[x % 26] + code
+            x //= 26
+        out.append(code)
+    return out
+
+
+def us_trading_hours(start, end):
+    """美股常规时段的整点 K 线 (09:30 开始，每小时一根，最后一根 15:30)"""
+    days = pd.bdate_range(start.tz_convert(US_TZ).normalize().tz_localize(None),
+                          end.tz_convert(US_TZ).normalize().tz_localize(None))
+    offsets = pd.to_timedelta([9.5 + h for h in range(7)], unit="h")
+    stamps = (days.values[:, None] + offsets.values[None, :]).ravel()
+    index = pd.DatetimeIndex(stamps).tz_localize(US_TZ)
+    return index[(index >= start) & (index <= end)]
+
+
+def synthetic_chart(ticker, start, end, seed):
+    """确定性的合成小时 K 线 (同一代码、同一时间点的价格固定，增量请求可以与全量对上)"""
+    index = us_trading_hours(start, end)
+    rng = np.random.default_rng(ticker_seed(ticker, seed))
+    base = 20 + rng.random() * 180
+    vol = 0.002 + rng.random() * 0.01
+    phase = rng.random() * 100
+    # 价格只取决于绝对小时数 (哈希噪声 + 慢周期)，不同窗口请求到的同一根 K 线数值一致
+    hours = (index.asi8 // 3_600_000_000_000).astype(np.float64)
+    noise = np.sin(hours * 12.9898 + phase) * 43758.5453
+    noise = (noise - np.floor(noise)) - 0.5
+    close = base * np.exp(noise * vol * 10 + np.sin(hours / 500.0 + phase) * 0.2)
+    open_ = close * (1 + noise * vol)
+    high = np.maximum(open_, close) * (1 + vol / 2)
+    low = np.minimum(open_, close) * (1 - vol / 2)
+    volume = (1e5 * (1.5 + noise)).astype(np.int64)
+    return {
+        "chart": {
+            "result": [{
+                "meta": {"symbol": ticker, "currency": "USD", "exchangeTimezoneName": US_TZ,
+                         "dataGranularity": "1h"},
+                "timestamp": (index.asi8 // 1_000_000_000).tolist(),
+                "indicators": {"quote": [{
+                    "open": np.round(open_, 4).tolist(),
+                    "high": np.round(high, 4).tolist(),
+                    "low": np.round(low, 4).tolist(),
+                    "close": np.round(close, 4).tolist(),
+                    "volume": volume.tolist(),
+                }]},
+            }],
+            "error": None,
+        }
+    }
+
+
+def range_days(text):
+    """Yahoo 的 range 参数: 730d / 2y / 6mo"""
+    text = str(text)
+    for suffix, days in (("mo", 30), ("d", 1), ("y", 365)):
+        if text.endswith(suffix) and text[:-len(suffix)].isdigit():
+            return int(text[:-len(suffix)]) * days
+    return 730
+
+
+def not_found_chart(ticker):
+    return {"chart": {"result": None, "error": {
+        "code": "Not Found", "description": f"No data found, symbol may be delisted ({ticker})"}}}
+
+
+def slice_chart(payload, start, end):
+    """录制的响应按请求窗口裁剪"""
+    result = payload["chart"]["result"][0]
+    stamps = np.asarray(result.get("timestamp") or [], dtype=np.int64)
+    keep = (stamps >= int(start.timestamp())) & (stamps <= int(end.timestamp()))
+    quote = result["indicators"]["quote"][0]
+    sliced = dict(result)
+    sliced["timestamp"] = stamps[keep].tolist()
+    sliced["indicators"] = {"quote": [{k: np.asarray(v, dtype=object)[keep].tolist() for k, v in quote.items()}]}
+    return {"chart": {"result": [sliced], "error": None}}
+
+
+# ==================== 服务器 ====================
+
+class StandinServer:
+    def __init__(self, config=None, fixtures_dir=FIXTURES_DIR, host="127.0.0.1", port=DEFAULT_PORT):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config or {})
+        self.fixtures_dir = fixtures_dir
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+        self._file_cache = {}
+        self.reset()
+
+    # ---------- 生命周期 ----------
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def endpoint_env(self):
+        """下载脚本需要的环境变量 (见 data_get/endpoints.py)"""
+        return {
+            "RPA_YAHOO_BASE": self.url,
+            "RPA_SEC_TICKERS_URL": f"{self.url}/files/company_tickers.json",
+            "RPA_HKEX_LIST_URL": f"{self.url}/ListOfSecurities.xlsx",
+            "RPA_US_ETF_LIST_URL": f"{self.url}/etf_symbols_list.csv",
+        }
+
+    def start(self):
+        server = self
+
+        class Handler(StandinHandler):
+            standin = server
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]   # port=0 时取系统分配的端口
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def configure(self, defaults=False, **changes):
+        """更新配置；defaults=True 时先恢复默认配置 (压测切换场景时避免沿用上个场景的故障注入)"""
+        with self.lock:
+            if defaults:
+                self.config = dict(DEFAULT_CONFIG)
+            self.config.update(changes)
+            self.rng = random.Random(self.config["seed"])
+
+    def reset(self):
+        """清空统计并重置时间原点 (outage 窗口从这里开始计时)"""
+        with self.lock:
+            self.started_at = time.monotonic()
+            self.rng = random.Random(self.config["seed"])
+            self.tokens = float(self.config["rate_limit_burst"])
+            self.last_refill = self.started_at
+            self.penalty_until = 0.0
+            self.stats = {"requests": 0, "by_status": {}, "chart_requests": 0, "bytes": 0}
+            self.chart_log = []   # (相对时间, 状态码)
+
+    def snapshot(self):
+        with self.lock:
+            stats = json.loads(json.dumps(self.stats))
+            stats["uptime"] = time.monotonic() - self.started_at
+            stats["config"] = dict(self.config)
+            stats["chart_log"] = list(self.chart_log)
+            return stats
+
+    # ---------- 故障注入 ----------
+    def _rate_limited(self, now):
+        """服务端令牌桶 + 惩罚窗口"""
+        cfg = self.config
+        if now < self.penalty_until:
+            return True
+        rps = cfg["rate_limit_rps"]
+        if not rps:
+            return False
+        self.tokens = min(float(cfg["rate_limit_burst"]), self.tokens + (now - self.last_refill) * rps)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return False
+        if cfg["penalty_sec"]:
+            self.penalty_until = now + cfg["penalty_sec"]
+        return True
+
+    def decide(self, is_chart):
+        """返回 (状态码 或 None, 延迟秒数)；None 表示正常处理"""
+        with self.lock:
+            cfg = self.config
+            now = time.monotonic()
+            delay = cfg["latency_ms"] / 1000.0
+            if cfg["latency_tail_ms"]:
+                delay += self.rng.expovariate(1000.0 / cfg["latency_tail_ms"])
+            if not is_chart:
+                return None, delay
+            elapsed = now - self.started_at
+            outage = cfg["outage"]
+            if outage and outage[0] <= elapsed < outage[0] + outage[1]:
+                return 429, delay
+            if self._rate_limited(now):
+                return 429, delay
+            roll = self.rng.random()
+            if roll < cfg["p429"]:
+                return 429, delay
+            if roll < cfg["p429"] + cfg["error_rate"]:
+                return 500, delay
+            return None, delay
+
+    def record(self, status, nbytes, is_chart):
+        with self.lock:
+            self.stats["requests"] += 1
+            key = str(status)
+            self.stats["by_status"][key] = self.stats["by_status"].get(key, 0) + 1
+            self.stats["bytes"] += nbytes
+            if is_chart:
+                self.stats["chart_requests"] += 1
+                self.chart_log.append((round(time.monotonic() - self.started_at, 4), status))
+
+    # ---------- 内容 ----------
+    def fixture_path(self, *parts):
+        return os.path.join(self.fixtures_dir, *parts)
+
+    def _read_fixture(self, *parts):
+        path = self.fixture_path(*parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def chart_body(self, ticker, query):
+        """返回 (状态码, JSON bytes)"""
+        now = pd.Timestamp.now(tz="UTC").floor("h")
+        if "period1" in query:
+            start = pd.Timestamp(int(query["period1"][0]), unit="s", tz="UTC")
+            end = pd.Timestamp(int(query.get("period2", [int(now.timestamp())])[0]), unit="s", tz="UTC")
+        else:
+            start, end = now - pd.Timedelta(days=range_days(query.get("range", ["730d"])[0])), now
+
+        recorded = self._read_fixture("chart", f"{ticker}.json")
+        if recorded is not None:
+            payload = json.loads(recorded)
+            if not payload["chart"].get("result"):
+                return 404, json.dumps(payload).encode()
+            return 200, json.dumps(slice_chart(payload, start, end)).encode()
+
+        if random.Random(ticker_seed(ticker, self.config["seed"])).random() < self.config["missing_rate"]:
+            return 404, json.dumps(not_found_chart(ticker)).encode()
+        return 200, json.dumps(synthetic_chart(ticker, start, end, self.config["seed"])).encode()
+
+    def list_body(self, name):
+        """名单文件：优先 fixtures，没有就合成 (结果缓存，ETag 稳定)"""
+        if name in self._file_cache:
+            return self._file_cache[name]
+        body = self._read_fixture(name)
+        if body is None:
+            tickers = synthetic_universe(self.config["universe_size"])
+            if name == "company_tickers.json":
+                body = json.dumps({str(i): {"cik_str": 1000 + i, "ticker": t, "title": f"{t} Corp"}
+                                   for i, t in enumerate(tickers)}).encode()
+            elif name == "etf_symbols_list.csv":
+                body = ("symbol\n" + "\n".join(f"E{t[1:]}" for t in tickers[:100]) + "\n").encode()
+            else:
+                body = synthetic_hkex_xlsx()
+        self._file_cache[name] = body
+        return body
+
+
+class StandinProcess:
+    """
+    在独立进程里运行替身服务器 (serve 子命令)，接口与 StandinServer 相同，通过 /__config /__reset /__stats 控制。
+    压测时服务端生成 JSON、客户端解析和落盘不再抢同一个 GIL，吞吐量才反映采集端的并发/退避参数。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.proc = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    endpoint_env = StandinServer.endpoint_env
+
+    def start(self):
+        env = dict(os.environ, PYTHONIOENCODING="utf-8", PYTHONUNBUFFERED="1")
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", str(self.port)],
+                                     stdout=subprocess.PIPE, text=True, encoding="utf-8", env=env)
+        # 第一行输出是 "替身服务器已启动: http://host:port" (port=0 时由系统分配)
+        line = self.proc.stdout.readline()
+        if "http://" not in line:
+            self.stop()
+            raise RuntimeError(f"替身服务器进程启动失败: {line.strip() or '无输出'}")
+        self.port = int(line.strip().rsplit(":", 1)[1])
+        return self
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait(timeout=10)
+            self.proc.stdout.close()
+            self.proc = None
+
+    def _call(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        req = urllib.request.Request(self.url + path, data=data, method="GET" if data is None else "POST",
+                                     headers={"Content-Type": "application/json"})
+        # 控制接口直连本机，不走下载脚本设置的 HTTP(S)_PROXY
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        with opener.open(req, timeout=30) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    def configure(self, defaults=False, **changes):
+        return self._call("/__config", {"defaults": defaults, **changes})
+
+    def reset(self):
+        self._call("/__reset", {})
+
+    def snapshot(self):
+        return self._call("/__stats")
+
+
+def synthetic_hkex_xlsx():
+    """与 HKEX 名单同样布局的 xlsx：前两行说明，第 3 行表头"""
+    rows = []
+    for i in range(1, 401):
+        category = "Equity" if i <= 300 else ("Exchange Traded Products" if i <= 360 else
+                                             "Real Estate Investment Trusts" if i <= 380 else "Debt Securities")
+        code = i if category == "Equity" else 2800 + i
+        rows.append({"Stock Code": f"{code:05d}", "Name of Securities": f"HK CO {code}",
+                     "Category": category, "Sub-Category": "", "Board Lot": "500"})
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["List of Securities"], ["Updated daily"]]).to_excel(
+            writer, index=False, header=False, startrow=0)
+        pd.DataFrame(rows).to_excel(writer, index=False, startrow=2)
+    return buf.getvalue()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    standin = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass   # 压测时不刷屏
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        server = self.standin
+
+        if path == "/__stats":
+            return self._send(200, json.dumps(server.snapshot()).encode())
+
+        is_chart = path.startswith(YAHOO_CHART_PREFIX)
+        status, delay = server.decide(is_chart)
+        if delay > 0:
+            time.sleep(delay)
+
+        if status is not None:
+            body = b"Too Many Requests" if status == 429 else b"Internal Server Error"
+            server.record(status, len(body), is_chart)
+            return self._send(status, body, "text/plain")
+
+        if is_chart:
+            ticker = path[len(YAHOO_CHART_PREFIX):].strip("/")
+            status, body = server.chart_body(ticker, parse_qs(parsed.query))
+            server.record(status, len(body), True)
+            return self._send(status, body)
+
+        name = os.path.basename(path)
+        types = {"company_tickers.json": "application/json",
+                 "ListOfSecurities.xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                 "etf_symbols_list.csv": "text/csv"}
+        if name not in types:
+            server.record(404, 0, False)
+            return self._send(404, b"", "text/plain")
+
+        body = server.list_body(name)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            server.record(304, 0, False)
+            return self._send(304, b"", types[name], {"ETag": etag})
+        server.record(200, len(body), False)
+        return self._send(200, body, types[name], {"ETag": etag})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if path == "/__config":
+            self.standin.configure(**payload)
+            return self._send(200, json.dumps(self.standin.config).encode())
+        if path == "/__reset":
+            self.standin.reset()
+            return self._send(200, b"{}")
+        return self._send(404, b"", "text/plain")
+
+
+# ==================== 录制 ====================
+
+def record_fixtures(tickers, fixtures_dir=FIXTURES_DIR, interval="1h", period="730d"):
+    """从真实 Yahoo 录制图表响应到 fixtures/chart/<TICKER>.json (需要网络/代理)"""
+    import requests
+    os.makedirs(os.path.join(fixtures_dir, "chart"), exist_ok=True)
+    headers = {"User-Agent": "Mozilla/5.0"}
+    for t in tickers:
+        url = f"https://query2.finance.yahoo.com/v8/finance/chart/{t}"
+        try:
+            resp = requests.get(url, params={"interval": interval, "range": period}, headers=headers, timeout=30)
+            with open(os.path.join(fixtures_dir, "chart", f"{t}.json"), "wb") as f:
+                f.write(resp.content)
+            print(f"✅ {t}: HTTP {resp.status_code}, {len(resp.content) / 1024:.0f} KB")
+        except Exception as e:
+            print(f"❌ {t}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yahoo / SEC / HKEX 本地替身服务器")
+    sub = parser.add_subparsers(dest="command")
+
+    serve = sub.add_parser("serve", help="启动服务器 (默认)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--latency-ms", type=float, default=DEFAULT_CONFIG["latency_ms"])
+    serve.add_argument("--error-rate", type=float, default=DEFAULT_CONFIG["error_rate"])
+    serve.add_argument("--p429", type=float, default=DEFAULT_CONFIG["p429"])
+    serve.add_argument("--rate-limit", type=float, default=None, help="服务端限速 (请求/秒)")
+    serve.add_argument("--penalty", type=float, default=0.0, help="触发限速后的惩罚秒数")
+
+    rec = sub.add_parser("record", help="从真实 Yahoo 录制图表响应")
+    rec.add_argument("tickers", nargs="+")
+
+    args = parser.parse_args(sys.argv[1:] or ["serve"])
+    if args.command == "record":
+        record_fixtures(args.tickers)
+    else:
+        standin = StandinServer({
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "p429": args.p429,
+            "rate_limit_rps": args.rate_limit,
+            "penalty_sec": args.penalty,
+        }, port=args.port).start()
+        print(f"🧪 替身服务器已启动: {standin.url}")
+        for k, v in standin.endpoint_env().items():
+            print(f"   {k}={v}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            standin.stop()
@@ -0,0 +1,204 @@
+import threading
+import pandas as pd
+import yfinance as yf
+
+from data_get.endpoints import yahoo_base
+from data_get.chart_client import fetch_chart
+
+# ==================== 多代码批量下载 ====================
+# yf.download 接受代码列表，返回 (Ticker, Price) 两层表头的大表。
+# 这里负责:
+#   1. 按批调用 yf.download，并把 MultiIndex 结果拆回每只代码自己的 DataFrame
+#   2. 批内失败的成员对半拆分、重新组成更小的批次重试，直到单只
+#   3. 单只时改用 Ticker.history(raise_errors=True)，拿到真实的异常 (区分 "空数据" 和 "报错")
+# 设置了 RPA_YAHOO_BASE 时 (本地替身服务器)，两者都改走 chart_client.fetch_chart，返回形状不变。
+
+PRICE_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# 旧版 yfinance 的 download() 把结果/错误放在模块级全局变量里 (shared._DFS / shared._ERRORS)，
+# 并发调用会互相覆盖，所以批量下载串行执行；批内并发交给 yfinance 自己的线程。
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+def is_rate_limit_message(msg):
+    msg = str(msg)
+    return "429" in msg or "Too Many Requests" in msg or "Rate limit" in msg
+
+
+def is_missing_data_error(error):
+    """raise_errors=True 时，退市/无数据的代码也会抛异常 (YFTickerMissingError 及其子类)，这类不算失败"""
+    missing_cls = getattr(getattr(yf, 'exceptions', None), 'YFTickerMissingError', None)
+    if missing_cls is not None and isinstance(error, missing_cls):
+        return True
+    msg = str(error)
+    return "possibly delisted" in msg or "No data found" in msg or "no price data found" in msg
+
+
+def split_multi_ticker_frame(data, tickers):
+    """把 yf.download 的多代码结果拆成 {ticker: DataFrame}，只保留该代码自己有数据的行"""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+
+    if not isinstance(data.columns, pd.MultiIndex):
+        # 单只代码且没有返回多层表头
+        if len(tickers) == 1:
+            single = data.dropna(how='all')
+            if not single.empty:
+                frames[tickers[0]] = single
+        return frames
+
+    # 找出哪一层是代码 (group_by='ticker' 在第 0 层，group_by='column' 在第 1 层)
+    names = list(data.columns.names)
+    if 'Ticker' in names:
+        level = names.index('Ticker')
+    else:
+        level = 0 if set(tickers) & set(data.columns.get_level_values(0)) else 1
+    available = set(data.columns.get_level_values(level))
+
+    for ticker in tickers:
+        key = ticker if ticker in available else ticker.upper()
+        if key not in available:
+            continue
+        sub = data.xs(key, axis=1, level=level)
+        # 多代码合并时索引是并集，其他代码有数据的时间点在这里全是 NaN
+        sub = sub.dropna(how='all')
+        if not sub.empty:
+            sub.columns.name = None
+            frames[ticker] = sub
+    return frames
+
+
+def download_batch(tickers, **download_kwargs):
+    """
+    下载一批代码，返回 (frames, failed)
+    - frames: {ticker: DataFrame}
+    - failed: {ticker: 错误信息}，没有拿到数据的成员都在这里
+    """
+    tickers = list(tickers)
+    if yahoo_base() is not None:
+        return _download_batch_standin(tickers, **download_kwargs)
+
+    kwargs = {"group_by": "ticker", "progress": False, "threads": True}
+    kwargs.update(download_kwargs)
+    if kwargs.get("start") is not None:
+        # 增量模式：有起点就不再传 period
+        kwargs.pop("period", None)
+    else:
+        kwargs.pop("start", None)
+
+    with _DOWNLOAD_LOCK:
+        data = yf.download(tickers, **kwargs)
+        # 新版 yfinance 不再暴露这个字典，拿不到就按 "无数据" 处理
+        errors = dict(getattr(getattr(yf, 'shared', None), '_ERRORS', None) or {})
+
+    frames = split_multi_ticker_frame(data, tickers)
+    failed = {}
+    for t in tickers:
+        if t not in frames:
+            failed[t] = errors.get(t.upper(), errors.get(t, "No data returned"))
+    return frames, failed
+
+
+def _download_batch_standin(tickers, period="730d", interval="1h", start=None, auto_adjust=True, **_):
+    """替身服务器没有多代码接口 (Yahoo 本身也没有，yf.download 内部同样是逐只请求)"""
+    frames, failed = {}, {}
+    for t in tickers:
+        try:
+            df = fetch_chart(t, period=period, interval=interval, start=start, auto_adjust=auto_adjust)
+        except Exception as e:
+            failed[t] = str(e)
+            continue
+        if df.empty:
+            failed[t] = "No data returned"
+        else:
+            frames[t] = df
+    return frames, failed
+
+
+def fetch_single(ticker, period="730d", interval="1h", auto_adjust=True, start=None):
+    """单只下载：raise_errors=True 让 429 / 网络错误直接抛出 (无数据返回空表)；给了 start 则只取其后的数据"""
+    if start is not None:
+        window = {"start": start}
+    else:
+        window = {"period": period}
+    if yahoo_base() is not None:
+        df = fetch_chart(ticker, interval=interval, auto_adjust=auto_adjust, **window)
+        return df[[c for c in PRICE_COLS if c in df.columns]] if not df.empty else df
+    try:
+        df = yf.Ticker(ticker).history(
+            interval=interval,
+            auto_adjust=auto_adjust,
+            raise_errors=True,
+            **window
+        )
+    except Exception as e:
+        if is_missing_data_error(e):
+            return pd.DataFrame()
+        raise
+    if df.empty:
+        return df
+    return df[[c for c in PRICE_COLS if c in df.columns]]
+
+
+def fetch_resilient(tickers, batch_size=20, single_fn=None, stats=None, **download_kwargs):
+    """
+    批量抓取 + 失败成员拆分重试。
+    返回 (results, errors)
+    - results: {ticker: DataFrame}，确认无数据的代码对应空 DataFrame
+    - errors:  {ticker: Exception 或错误信息}，真正报错 (含限流) 的代码
+    single_fn: 单只兜底函数，默认 fetch_single(ticker, **download_kwargs 中的 period/interval/start)
+    stats:     可选 dict，累加 requests (实际请求批次数) / retries (拆分重试的批次数)，供遥测使用
+    """
+    if single_fn is None:
+        single_kwargs = {k: download_kwargs[k] for k in ("period", "interval", "auto_adjust", "start")
+                         if k in download_kwargs}
+
+        def single_fn(t):
+            return fetch_single(t, **single_kwargs)
+
+    results = {}
+    errors = {}
+    tickers = list(tickers)
+    queue = [tickers[i:i + batch_size] for i in range(0, len(tickers), max(1, batch_size))]
+    initial = len(queue)
+    calls = 0
+
+    while queue:
+        batch = queue.pop(0)
+        calls += 1
+        if stats is not None:
+            stats["requests"] = stats.get("requests", 0) + 1
+            stats["retries"] = stats.get("retries", 0) + (1 if calls > initial else 0)
+
+        # --- 单只：拿真实异常 ---
+        if len(batch) == 1:
+            ticker = batch[0]
+            try:
+                results[ticker] = single_fn(ticker)
+            except Exception as e:
+                errors[ticker] = e
+            continue
+
+        frames, failed = download_batch(batch, **download_kwargs)
+        results.update(frames)
+        if not failed:
+            continue
+
+        # 限流时不再拆分 (拆分只会产生更多请求)，直接交给调用方处理
+        limited = [t for t, msg in failed.items() if is_rate_limit_message(msg)]
+        for t in limited:
+            errors[t] = failed.pop(t)
+        if not failed:
+            continue
+
+        # 失败成员对半拆分，送回更小的批次
+        members = list(failed)
+        if len(members) == 1:
+            queue.append(members)
+        else:
+            mid = len(members) // 2
+            queue.append(members[:mid])
+            queue.append(members[mid:])
+
+    return results, errors
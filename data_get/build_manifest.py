@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+import pyarrow.parquet as pq
+
+# ==================== 增量清洗清单 (Manifest) ====================
+# 全市场 Parquet 旁边放一个 <输出名>.manifest.json，记录上次构建时每个原始文件的:
+#   path / size / mtime / hash (内容哈希) / rows (清洗后行数) / ticker
+# 再次构建时:
+#   1. size + mtime 都没变 -> 视为未变 (不读文件)
+#   2. size 或 mtime 变了 -> 计算内容哈希，哈希相同也视为未变 (只是被 touch 过)
+#   3. 新文件 / 内容变化 / 来源被删除 的代码标记为 dirty，只重新解析这些代码
+#   4. 其余代码直接从旧输出里按行组拷贝 (每只代码是自己的行组，见 market_writer.py)，不再解析 CSV
+# 清单版本号或构建参数 (schema 等) 变化时整体重建。
+#
+# 用法:
+#   manifest = BuildManifest(OUTPUT_FILE, params={"schema": str(SCHEMA)})
+#   plan = manifest.plan({ticker: [path, ...]}, full=False)
+#   previous = open_previous(plan, OUTPUT_FILE)        # None 表示全部重建
+#   ... 按代码顺序: dirty -> 重新清洗 + manifest.record(path, rows)；其余 -> previous.copy_to(writer, ticker)
+#   manifest.save()   # 输出文件写完之后
+
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+
+def manifest_path(output_file):
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+def _source_files(path):
+    """
+    来源可以是单个文件，也可以是目录: _dataset 下的分区目录或 Hive 分区数据集 (Market=.../Month=.../*.parquet)，
+    递归列出所有 Parquet 片段，返回 [(相对路径, 完整路径)]，按相对路径排序
+    """
+    if not os.path.isdir(path):
+        return [(os.path.basename(path), path)]
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith('.parquet'):
+                full = os.path.join(root, name)
+                files.append((os.path.relpath(full, path).replace(os.sep, '/'), full))
+    return sorted(files)
+
+
+def file_signature(path):
+    """不读内容的快速签名: (总字节数, 最新修改时间)"""
+    stats = [os.stat(f) for _, f in _source_files(path)]
+    return sum(s.st_size for s in stats), max((s.st_mtime for s in stats), default=0.0)
+
+
+def content_hash(path):
+    """内容哈希 (blake2b)，目录按相对路径顺序连续哈希 (相对路径也计入，分区挪动也算变化)"""
+    h = hashlib.blake2b(digest_size=16)
+    for rel, f in _source_files(path):
+        h.update(rel.encode())
+        with open(f, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(HASH_CHUNK), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildPlan:
+    def __init__(self, dirty, unchanged, removed, reuse):
+        self.dirty = dirty            # 需要重新解析的代码
+        self.unchanged = unchanged    # 可以从旧输出拷贝的代码
+        self.removed = removed        # 来源已全部删除的代码 (输出里去掉)
+        self.reuse = reuse            # 是否有可复用的旧输出
+
+    def summary(self):
+        return (f"重新解析 {len(self.dirty)} 只 | 复用 {len(self.unchanged)} 只 | "
+                f"移除 {len(self.removed)} 只")
+
+
+class BuildManifest:
+    def __init__(self, output_file, params=None):
+        self.output_file = output_file
+        self.path = manifest_path(output_file)
+        self.params = params or {}
+        self.old = self._load()
+        self.files = {}
+
+    def _load(self):
+        if not os.path.exists(self.path) or not os.path.exists(self.output_file):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                old = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if old.get("version") != MANIFEST_VERSION or old.get("params") != self.params:
+            return None
+        return old
+
+    def _entry(self, path, ticker):
+        """
+        当前文件的清单条目与是否变化；未变化时沿用旧条目 (含 hash / rows)，
+        变化时 rows 置空，等 record() 填写
+        """
+        size, mtime = file_signature(path)
+        old = (self.old or {}).get("files", {}).get(path)
+        if old and old["ticker"] == ticker:
+            if old["size"] == size and old["mtime"] == mtime:
+                return dict(old), False
+            digest = content_hash(path)
+            if old["hash"] == digest:
+                return dict(old, size=size, mtime=mtime), False
+        else:
+            digest = content_hash(path)
+        return {"ticker": ticker, "size": size, "mtime": mtime, "hash": digest, "rows": None}, True
+
+    def plan(self, sources, full=False):
+        """
+        sources: {ticker: [来源路径, ...]}
+        返回 BuildPlan；full=True 或没有可用的旧清单 / 旧输出时全部重建
+        """
+        if full:
+            self.old = None
+        old_files = (self.old or {}).get("files", {})
+        old_paths = {}
+        for path, entry in old_files.items():
+            old_paths.setdefault(entry["ticker"], set()).add(path)
+
+        dirty, unchanged = set(), set()
+        for ticker, paths in sources.items():
+            # 新代码、或来源集合变化 (新增 / 删除了文件) 都要重建
+            changed = old_paths.get(ticker) != set(paths)
+            for path in paths:
+                self.files[path], file_changed = self._entry(path, ticker)
+                changed = changed or file_changed
+            (dirty if changed else unchanged).add(ticker)
+
+        removed = set(old_paths) - set(sources)
+        return BuildPlan(dirty, unchanged, removed, reuse=self.old is not None)
+
+    def record(self, path, rows):
+        """登记重新解析后该文件的有效行数"""
+        if path in self.files:
+            self.files[path]["rows"] = int(rows)
+
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "params": self.params,
+            "output": os.path.basename(self.output_file),
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+            "files": self.files,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class PreviousOutput:
+    """上一次构建的输出: 按 Ticker 列的行组统计信息建立 代码 -> 行组 索引，用于原样拷贝"""
+
+    def __init__(self, path):
+        self.file = pq.ParquetFile(path)
+        self.groups = {}
+        meta = self.file.metadata
+        col = self.file.schema_arrow.get_field_index('Ticker')
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(col).statistics
+            if stats is None or not stats.has_min_max or stats.min != stats.max:
+                raise ValueError("旧输出不是每个行组一只代码，无法增量复用")
+            ticker = stats.min.decode() if isinstance(stats.min, bytes) else stats.min
+            self.groups.setdefault(ticker, []).append(i)
+
+    def close(self):
+        self.file.close()
+
+    def copy_to(self, writer, ticker):
+        """把一只代码的全部行组写入新文件，返回行数 (旧输出里没有该代码返回 0)"""
+        groups = self.groups.get(ticker)
+        if not groups:
+            return 0
+        return writer.write(self.file.read_row_groups(groups))
+
+
+def open_previous(plan, output_file):
+    """打开可复用的旧输出；旧文件不是逐只写出的 (行组统计缺失等) 时返回 None，调用方应全部重建"""
+    if not plan.reuse:
+        return None
+    try:
+        return PreviousOutput(output_file)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 旧输出无法增量复用，将全部重建: {e}")
+        return None
@@ -0,0 +1,72 @@
+import threading
+import time
+import pandas as pd
+import requests
+
+from data_get.endpoints import yahoo_base, proxy_kwargs
+
+# ==================== 轻量图表接口客户端 ====================
+# 只在设置了 RPA_YAHOO_BASE (指向本地替身服务器) 时使用。
+# yfinance 会先去 fc.yahoo.com / getcrumb 拿 cookie，且地址写死在库里，无法整体重定向；
+# 这里直接请求 /v8/finance/chart/<ticker>，把 JSON 解析成与 Ticker.history() 相同形状的 DataFrame:
+#   - 索引: 交易所时区的 Datetime
+#   - 列:   Open, High, Low, Close, Volume
+# 错误语义与 history(raise_errors=True) 对齐: 429 抛出带 "Too Many Requests" 的异常，404/无数据返回空表。
+
+_local = threading.local()
+
+QUOTE_COLS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+class ChartRateLimitError(Exception):
+    """替身服务器返回 429 (消息里带 "Too Many Requests"，is_rate_limit_error 能识别)"""
+
+
+def _session():
+    # 每个线程一个 Session (连接复用，且不跨线程共享)
+    if getattr(_local, "session", None) is None:
+        _local.session = requests.Session()
+    return _local.session
+
+
+def parse_chart(payload):
+    """解析 chart JSON；无数据返回空 DataFrame"""
+    chart = payload.get("chart") or {}
+    results = chart.get("result") or []
+    if not results:
+        return pd.DataFrame()
+    result = results[0]
+    stamps = result.get("timestamp") or []
+    quotes = ((result.get("indicators") or {}).get("quote") or [{}])[0]
+    if not stamps or not quotes:
+        return pd.DataFrame()
+
+    tz = (result.get("meta") or {}).get("exchangeTimezoneName") or "UTC"
+    index = pd.to_datetime(stamps, unit="s", utc=True).tz_convert(tz)
+    index.name = "Datetime"
+    df = pd.DataFrame({col: quotes.get(key, [None] * len(stamps)) for key, col in QUOTE_COLS.items()},
+                      index=index)
+    df = df.apply(pd.to_numeric, errors="coerce")
+    return df.dropna(how="all")
+
+
+def fetch_chart(ticker, period="730d", interval="1h", start=None, auto_adjust=True, timeout=30):
+    """请求一只代码的 K 线 (auto_adjust 对小时线没有影响，保留参数只为与 fetch_single 对齐)"""
+    base = yahoo_base()
+    if base is None:
+        raise RuntimeError("未设置 RPA_YAHOO_BASE，无法使用替身图表接口")
+    url = f"{base}/v8/finance/chart/{ticker}"
+    params = {"interval": interval, "includePrePost": "false"}
+    if start is not None:
+        params["period1"] = int(pd.Timestamp(start).timestamp())
+        params["period2"] = int(time.time())
+    else:
+        params["range"] = period
+
+    resp = _session().get(url, params=params, timeout=timeout, **proxy_kwargs(url))
+    if resp.status_code == 429:
+        raise ChartRateLimitError(f"429 Too Many Requests ({ticker})")
+    if resp.status_code == 404:
+        return pd.DataFrame()
+    resp.raise_for_status()
+    return parse_chart(resp.json())
@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import urllib3
 import ssl
@@ -14,59 +15,53 @@ BASE_DIR = os.path.join(PROJECT_ROOT, "us_stocks_data")
 PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
 PROXY_URL = 'http://127.0.0.1:10808'
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.job_ledger import (JobLedger, migrate_progress_file, US_STOCK,
+                                 DONE, EMPTY, ERROR, RATE_LIMITED, PENDING)
+from data_get.universe_cache import get_sec_tickers as fetch_sec_tickers
+
 # 设置代理以获取 SEC 名单
 os.environ['HTTP_PROXY'] = PROXY_URL
 os.environ['HTTPS_PROXY'] = PROXY_URL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 def get_sec_tickers():
-    """获取目标总名单"""
-    print("正在拉取 SEC 全量名单进行比对...")
+    """获取目标总名单 (与采集脚本共用本地缓存，TTL 内不联网)"""
+    print("正在读取 SEC 全量名单进行比对...")
     session = requests.Session()
     session.proxies = {'http': PROXY_URL, 'https': PROXY_URL}
     session.verify = False
-    headers = {'User-Agent': 'MscProject Research (kevin_kou_student@example.com)', 'Host': 'www.sec.gov'}
     
     try:
-        resp = session.get("https://www.sec.gov/files/company_tickers.json", headers=headers, timeout=30)
-        data = resp.json()
-        return set(item['ticker'] for item in data.values())
+        return set(fetch_sec_tickers(session=session))
     except Exception as e:
         print(f"名单获取失败: {e}")
         return set()
 
 def audit_data():
-    # 1. 读取各方数据
+    # 1. 读取各方数据 (SEC 名单 + SQLite 账本，不再扫描数据目录)
     sec_tickers = get_sec_tickers()
     
-    if os.path.exists(PROGRESS_FILE):
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            progress_tickers = set(line.strip() for line in f if line.strip())
-    else:
-        progress_tickers = set()
-
-    # 读取实际下载了 CSV 的文件
-    if os.path.exists(BASE_DIR):
-        files = os.listdir(BASE_DIR)
-        csv_tickers = set(f.split('_1h.csv')[0] for f in files if f.endswith('.csv'))
-    else:
-        csv_tickers = set()
+    ledger = JobLedger(US_STOCK)
+    migrate_progress_file(ledger, BASE_DIR, progress_file=PROGRESS_FILE)
+    counts = ledger.counts()
+    processed_tickers = ledger.processed_tickers()
 
     # 2. 计算差异
-    # 真正漏掉的（既没在 progress.txt 也没下载下来的）
-    missing_tickers = sec_tickers - progress_tickers
-    
-    # 无数据的（在 progress.txt 里，但文件夹里没 CSV，说明是退市或空数据）
-    empty_data_tickers = progress_tickers - csv_tickers
+    # 真正漏掉的（SEC 名单里有，但账本里没有 "有数据/空数据" 记录的）
+    missing_tickers = sec_tickers - processed_tickers
 
     # 3. 输出报告
     print("\n" + "="*40)
     print(f"📊 数据采集审计报告")
     print("="*40)
     print(f"1. SEC 目标总数:  {len(sec_tickers)}")
-    print(f"2. 已处理总数:    {len(progress_tickers)} (包含有数据和无数据的)")
-    print(f"3. 有效 CSV 文件: {len(csv_tickers)} (实际入库量)")
-    print(f"4. 无数据/退市:   {len(empty_data_tickers)} (Yahoo返回空)")
+    print(f"2. 已处理总数:    {len(processed_tickers)} (包含有数据和无数据的)")
+    print(f"3. 有效 CSV 文件: {counts.get(DONE, 0)} (实际入库量, {ledger.total_bytes() / 1024 / 1024:.1f} MB)")
+    print(f"4. 无数据/退市:   {counts.get(EMPTY, 0)} (Yahoo返回空)")
+    print(f"5. 报错 / 限流:   {counts.get(ERROR, 0)} / {counts.get(RATE_LIMITED, 0)}")
+    print(f"6. 等待重抓:      {counts.get(PENDING, 0)}")
     print("-" * 40)
     print(f"❌ 需重试 (漏网之鱼): {len(missing_tickers)}")
     print("="*40)
@@ -0,0 +1,102 @@
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# ==================== 按 Schema 读取 OHLCV CSV ====================
+# 历史 CSV 有两种表头布局 (见 HK_data/inspect_headers.py):
+#   yf   : yf.download 的三层表头
+#            Price,Close,High,Low,Open,Volume
+#            Ticker,AAPL,AAPL,AAPL,AAPL,AAPL
+#            Datetime,,,,,
+#            2024-01-02 09:30:00-05:00,...
+#   flat : 标准单层表头 (Datetime 或 Date 开头)
+# 先读前几行嗅探布局 (列名 + 要跳过的元数据行数 + 时间是否带时区偏移)，
+# 再用 pyarrow.csv 按固定类型一次解析，不再整表读成字符串后逐列 to_datetime / to_numeric。
+#
+# 用法:
+#   table = read_ohlcv_csv(path)      # pa.Table: Datetime (UTC) + Open/High/Low/Close/Volume (float64)；无数据返回 None
+
+OHLCV_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+OHLCV_SCHEMA = pa.schema([('Datetime', pa.timestamp('ns', tz='UTC'))] +
+                         [(c, pa.float64()) for c in OHLCV_COLS])
+
+# 嗅探时读取的行数 (表头 + 元数据行 + 第一条数据)
+SNIFF_LINES = 8
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+OFFSET_RE = re.compile(r'(Z|[+-]\d{2}:?\d{2})$')
+
+
+def sniff_layout(path, n_lines=SNIFF_LINES):
+    """
+    读前几行判断表头布局，返回 dict (没有数据行返回 None):
+      kind       : "yf" (三层表头) | "flat" (标准表头) | "unknown" (第一列名未知，但数据行是日期)
+      names      : 列名 (第一列统一命名为 Datetime)
+      skip_rows  : 数据开始前的总行数 (表头 + 元数据行)
+      has_offset : 时间字符串是否带时区偏移 (决定按带时区还是本地时间解析)
+    """
+    lines = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for _ in range(n_lines):
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line.rstrip('\r\n'))
+    if len(lines) < 2:
+        return None
+
+    header = [c.strip() for c in lines[0].split(',')]
+    data_idx = next((i for i in range(1, len(lines)) if DATE_RE.match(lines[i].split(',')[0].strip())), None)
+    if data_idx is None:
+        return None
+
+    if header[0] == 'Price':
+        kind = 'yf'
+    elif header[0] in ('Datetime', 'Date'):
+        kind = 'flat'
+    else:
+        kind = 'unknown'
+    first_value = lines[data_idx].split(',')[0].strip()
+    return {
+        'kind': kind,
+        'names': ['Datetime'] + header[1:],
+        'skip_rows': data_idx,
+        'has_offset': bool(OFFSET_RE.search(first_value)),
+    }
+
+
+def _read_coerce(path, layout):
+    """兜底: 个别脏文件 (非法时间/数值) Arrow 严格解析会报错，改用 pandas 逐列 coerce"""
+    df = pd.read_csv(path, header=None, names=layout['names'], skiprows=layout['skip_rows'], dtype=str)
+    out = pd.DataFrame({'Datetime': pd.to_datetime(df['Datetime'], utc=True, errors='coerce')})
+    for c in OHLCV_COLS:
+        out[c] = pd.to_numeric(df[c], errors='coerce') if c in df.columns else None
+    return pa.Table.from_pandas(out, schema=OHLCV_SCHEMA, preserve_index=False)
+
+
+def read_ohlcv_csv(path, layout=None):
+    """按固定 Schema 读取一个 OHLCV CSV，时间统一为 UTC；去掉时间为空的行，无数据返回 None"""
+    layout = layout or sniff_layout(path)
+    if layout is None:
+        return None
+
+    # 带偏移的字符串直接解析成 UTC；不带偏移的按 UTC 解释 (与 pd.to_datetime(utc=True) 一致)
+    ts_type = pa.timestamp('ns', tz='UTC') if layout['has_offset'] else pa.timestamp('ns')
+    read_options = pacsv.ReadOptions(column_names=layout['names'], skip_rows=layout['skip_rows'])
+    convert_options = pacsv.ConvertOptions(
+        column_types={'Datetime': ts_type, **{c: pa.float64() for c in OHLCV_COLS}},
+        include_columns=['Datetime'] + OHLCV_COLS,
+        include_missing_columns=True,
+    )
+    try:
+        table = pacsv.read_csv(path, read_options=read_options, convert_options=convert_options)
+        if not layout['has_offset']:
+            table = table.set_column(0, 'Datetime', pc.assume_timezone(table['Datetime'], 'UTC'))
+    except pa.ArrowInvalid:
+        table = _read_coerce(path, layout)
+
+    table = table.filter(pc.is_valid(table['Datetime']))
+    if table.num_rows == 0:
+        return None
+    return table.cast(OHLCV_SCHEMA)
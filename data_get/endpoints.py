@@ -0,0 +1,59 @@
+import os
+from urllib.parse import urlparse
+
+# ==================== 数据源地址配置 ====================
+# 默认指向真实的 Yahoo / SEC / HKEX。设置下面的环境变量即可把所有下载脚本指向本地替身服务器
+# (benchmark/standin_server.py)，用于离线压测并发/退避参数:
+#
+#   RPA_YAHOO_BASE       图表接口根地址，例如 http://127.0.0.1:8765
+#                        设置后不再走 yfinance，改用 chart_client.py 直接请求 /v8/finance/chart/<ticker>
+#   RPA_SEC_TICKERS_URL  SEC company_tickers.json 地址
+#   RPA_HKEX_LIST_URL    HKEX ListOfSecurities.xlsx 地址
+#   RPA_US_ETF_LIST_URL  美股 ETF 名单 CSV 地址
+#
+# 地址在调用时读取 (不是 import 时)，压测脚本可以先 import 再设置环境变量。
+
+DEFAULTS = {
+    "RPA_YAHOO_BASE": None,
+    "RPA_SEC_TICKERS_URL": "https://www.sec.gov/files/company_tickers.json",
+    "RPA_HKEX_LIST_URL": "https://www.hkex.com.hk/eng/services/trading/securities/securitieslists/ListOfSecurities.xlsx",
+    "RPA_US_ETF_LIST_URL": "https://raw.githubusercontent.com/rreichel3/US-Stock-Symbols/main/etf/etf_symbols_list.csv",
+}
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def endpoint(name):
+    return os.environ.get(name) or DEFAULTS[name]
+
+
+def yahoo_base():
+    """图表接口替身地址；None 表示使用真实的 yfinance"""
+    base = endpoint("RPA_YAHOO_BASE")
+    return base.rstrip("/") if base else None
+
+
+def sec_tickers_url():
+    return endpoint("RPA_SEC_TICKERS_URL")
+
+
+def hkex_list_url():
+    return endpoint("RPA_HKEX_LIST_URL")
+
+
+def us_etf_list_url():
+    return endpoint("RPA_US_ETF_LIST_URL")
+
+
+def is_local(url):
+    return urlparse(url).hostname in LOCAL_HOSTS
+
+
+def proxy_kwargs(url):
+    """
+    本地地址不走代理。下载脚本会设置 HTTP(S)_PROXY 环境变量，Session 上也可能显式配置了代理；
+    requests 里把 proxies 的值设为 None 会同时屏蔽这两者。
+    """
+    if is_local(url):
+        return {"proxies": {"http": None, "https": None}}
+    return {}
@@ -1,4 +1,5 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 
@@ -10,44 +11,50 @@ BASE_DIR = os.path.join(PROJECT_ROOT, "us_stocks_data")
 PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
 REPORT_NAME = os.path.join(CURRENT_DIR, "failure_report.csv")
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.job_ledger import (JobLedger, migrate_progress_file, US_STOCK,
+                                 DONE, EMPTY, ERROR, RATE_LIMITED)
+
+STATUS_LABELS = {
+    EMPTY: "No Data / Delisted",
+    ERROR: "Error",
+    RATE_LIMITED: "Rate Limited (429)",
+}
+
 def generate_failure_report():
     print("=" * 50)
     print(f"📊 开始扫描缺失股票清单... ({datetime.now().strftime('%H:%M:%S')})")
     print("=" * 50)
 
-    # 1. 加载 progress.txt 中的名单
-    if not os.path.exists(PROGRESS_FILE):
-        print(f"❌ 错误：找不到进度文件 {PROGRESS_FILE}")
+    # 1. 打开 SQLite 账本 (首次运行自动迁移 progress.txt)
+    ledger = JobLedger(US_STOCK)
+    migrate_progress_file(ledger, BASE_DIR, progress_file=PROGRESS_FILE)
+    if ledger.is_empty():
+        print(f"❌ 错误：账本为空，且找不到进度文件 {PROGRESS_FILE}")
         return
-    
-    with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-        # 使用 set 提高查找效率
-        recorded_tickers = set(line.strip() for line in f if line.strip())
-    
-    print(f"✅ 已记录的总尝试数: {len(recorded_tickers)}")
 
-    # 2. 扫描数据文件夹中的实际 CSV 文件
-    if not os.path.exists(BASE_DIR):
-        print(f"❌ 错误：找不到数据目录 {BASE_DIR}")
-        return
-    
-    # 提取已经存在的股票代码
-    files = os.listdir(BASE_DIR)
-    success_tickers = set(f.split('_1h.csv')[0] for f in files if f.endswith('.csv'))
-    
-    print(f"✅ 实际下载成功的数量: {len(success_tickers)}")
+    counts = ledger.counts()
+    print(f"✅ 已记录的总尝试数: {sum(counts.values())}")
+    print(f"✅ 实际下载成功的数量: {counts.get(DONE, 0)}")
 
-    # 3. 找出“失败/无数据”的股票
-    # 逻辑：在 progress.txt 中出现过，但在文件夹里没找到 CSV 的
-    failed_tickers = sorted(list(recorded_tickers - success_tickers))
+    # 2. 直接按状态查询 "无数据/失败" 的股票 (不再扫描目录做集合差)
+    failed_jobs = ledger.jobs(EMPTY, ERROR, RATE_LIMITED)
     
-    print(f"❌ 识别到无数据/失败的股票数: {len(failed_tickers)}")
+    print(f"❌ 识别到无数据/失败的股票数: {len(failed_jobs)}")
+    for status, label in STATUS_LABELS.items():
+        print(f"   - {label}: {counts.get(status, 0)}")
 
-    # 4. 导出为报告文件
-    if failed_tickers:
-        df = pd.DataFrame(failed_tickers, columns=['Ticker'])
-        df['Status'] = 'No Data / Delisted / Network Error'
+    # 3. 导出为报告文件
+    if failed_jobs:
+        df = pd.DataFrame(failed_jobs)
+        df = df.rename(columns={
+            'ticker': 'Ticker', 'attempts': 'Attempts', 'error': 'Last_Error',
+            'updated_at': 'Last_Attempt'
+        })
+        df['Status'] = df['status'].map(STATUS_LABELS)
         df['Check_Time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        df = df[['Ticker', 'Status', 'Attempts', 'Last_Error', 'Last_Attempt', 'Check_Time']]
         
         df.to_csv(REPORT_NAME, index=False)
         print("-" * 50)
@@ -55,9 +62,9 @@ def generate_failure_report():
         print(f"💡 你可以直接打开这个 CSV 查看所有未能下载成功的股票。")
         
         # 打印前 10 个作为预览
-        print(f"📝 失败示例预览: {failed_tickers[:10]}")
+        print(f"📝 失败示例预览: {df['Ticker'].head(10).tolist()}")
     else:
-        print("🎉 恭喜！所有在进度表中的股票都成功生成了 CSV 文件。")
+        print("🎉 恭喜！所有在账本中的股票都成功生成了 CSV 文件。")
 
 if __name__ == "__main__":
     generate_failure_report()
\ No newline at end of file
@@ -0,0 +1,169 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# ==================== 并发抓取引擎 ====================
+# 全局令牌桶 + 每个 Host 的请求预算 (并发上限 + 独立速率)
+# 用法:
+#   engine = FetchEngine(max_workers=4, rate_per_sec=2.0, host_budgets=HOST_BUDGETS,
+#                        throttle=AdaptiveThrottle())
+#   for item, result, error in engine.run(tickers, fetch_fn, host="query2.finance.yahoo.com"):
+#       engine.throttle.record(error)   # 结果在主线程里按完成顺序返回，进度记录无需加锁
+#
+# 传入 throttle 后，每个请求发出前都会经过熔断器/退避 (见 throttle.py)；
+# 成功/失败由调用方记录，因为批量任务里可能部分成功、部分限流。
+# 每个请求发出前的等待 (全局暂停 + 熔断/退避 + 令牌桶) 累加到 wait_time；
+# fetch_fn 内可用 engine.last_wait() 取到本线程这次请求的等待秒数 (遥测用)。
+
+YAHOO_HOST = "query2.finance.yahoo.com"
+
+# 默认的 Host 预算 (rate: 每秒请求数, burst: 突发容量, max_in_flight: 同时在途请求数)
+DEFAULT_HOST_BUDGETS = {
+    YAHOO_HOST: {"rate": 2.0, "burst": 4, "max_in_flight": 4},
+}
+
+
+class TokenBucket:
+    """线程安全的令牌桶。允许"预支"令牌：不足时先记账，再在锁外睡眠补齐差额。"""
+
+    def __init__(self, rate_per_sec, burst=1):
+        self.rate = float(rate_per_sec)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= tokens
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+class HostBudget:
+    """单个 Host 的请求预算：同时在途数量 + 独立的速率上限"""
+
+    def __init__(self, rate=None, burst=1, max_in_flight=None):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def __enter__(self):
+        if self.slots is not None:
+            self.slots.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        if self.slots is not None:
+            self.slots.release()
+        return False
+
+
+class FetchEngine:
+    def __init__(self, max_workers=4, rate_per_sec=2.0, burst=4, host_budgets=None, throttle=None):
+        self.max_workers = max(1, int(max_workers))
+        self.throttle = throttle
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        budgets = DEFAULT_HOST_BUDGETS if host_budgets is None else host_budgets
+        self.hosts = {host: HostBudget(**cfg) for host, cfg in budgets.items()}
+
+        self.requests = 0
+        self.errors = 0
+        self.started_at = None
+        self.pause_until = 0.0
+        self.wait_time = 0.0
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---------- 限流 ----------
+    def pause(self, seconds):
+        """让所有 worker 一起暂停 (例如触发 429 时)"""
+        with self.lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+
+    def _wait_if_paused(self):
+        while True:
+            with self.lock:
+                remaining = self.pause_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1.0))
+
+    def last_wait(self):
+        """当前线程最近一次请求发出前的等待秒数"""
+        return getattr(self._local, "wait", 0.0)
+
+    def _call(self, fetch_fn, item, host, cost):
+        t0 = time.monotonic()
+        self._wait_if_paused()
+        if self.throttle is not None:
+            self.throttle.before_request()
+        budget = self.hosts.get(host)
+        self.bucket.acquire(cost)
+        if budget is not None and budget.bucket is not None:
+            budget.bucket.acquire(cost)
+        waited = time.monotonic() - t0
+        self._local.wait = waited
+        with self.lock:
+            self.requests += cost
+            self.wait_time += waited
+        if budget is None:
+            return fetch_fn(item)
+        with budget:
+            return fetch_fn(item)
+
+    # ---------- 主循环 ----------
+    def run(self, items, fetch_fn, host=YAHOO_HOST, cost_fn=None):
+        """
+        并发执行 fetch_fn(item)，按完成顺序 yield (item, result, error)。
+        - 在途任务数限制为 max_workers 的 2 倍，避免一次性提交上万个 Future
+        - cost_fn(item) 返回该任务消耗的令牌数 (默认 1)
+        """
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        pending = {}
+        iterator = iter(items)
+        window = self.max_workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                while len(pending) < window:
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    cost = cost_fn(item) if cost_fn else 1
+                    pending[pool.submit(self._call, fetch_fn, item, host, cost)] = item
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        yield item, future.result(), None
+                    except Exception as e:
+                        with self.lock:
+                            self.errors += 1
+                        yield item, None, e
+
+    # ---------- 统计 ----------
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return time.monotonic() - self.started_at
+
+    def requests_per_sec(self):
+        elapsed = self.elapsed()
+        return self.requests / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        text = (f"请求数: {self.requests} | 错误: {self.errors} | "
+                f"耗时: {self.elapsed() / 60:.1f}分 | 实际速率: {self.requests_per_sec():.2f} req/s")
+        if self.throttle is not None:
+            text += f" | {self.throttle.report()}"
+        return text
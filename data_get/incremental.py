@@ -0,0 +1,115 @@
+import os
+import pandas as pd
+
+# ==================== 增量刷新工具 ====================
+# 思路：读出本地文件最后一根 K 线的时间 -> 只请求之后的数据 (带少量重叠)
+#      -> 与旧数据合并去重 -> 写临时文件后原子替换，避免中途崩溃留下半个文件
+#
+# 支持两种 CSV 布局:
+#   "yf"   : yf.download 的原样输出 (Price/Ticker 两层表头 + Datetime 索引)，us_data_get.py 使用
+#   "flat" : Datetime, Ticker, Open, High, Low, Close, Volume 平铺列，其余下载脚本使用
+
+# 与上次最后一根 K 线的重叠区间 (覆盖 Yahoo 对最近几根 K 线的修正)
+OVERLAP = pd.Timedelta(hours=3)
+# Yahoo 1h 数据最多回溯 730 天，留 1 天余量
+MAX_LOOKBACK = pd.Timedelta(days=729)
+
+
+def last_stored_timestamp(path, tail_bytes=4096):
+    """只读文件末尾几 KB，取最后一行第一列的时间戳 (UTC)。没有文件/解析失败返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - tail_bytes))
+            lines = f.read().decode('utf-8', errors='ignore').splitlines()
+    except OSError:
+        return None
+
+    for line in reversed(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            return pd.Timestamp(line.split(',')[0]).tz_convert('UTC')
+        except (ValueError, TypeError):
+            # 表头行或无时区的脏数据
+            return None
+    return None
+
+
+def refresh_start(last_ts, overlap=OVERLAP):
+    """根据最后时间戳计算本次请求的起点；None 表示需要全量下载"""
+    if last_ts is None:
+        return None
+    earliest = pd.Timestamp.now(tz='UTC') - MAX_LOOKBACK
+    return max(last_ts - overlap, earliest)
+
+
+def read_stored_frame(path, layout="flat"):
+    """按布局读回已有 CSV"""
+    if layout == "yf":
+        df = pd.read_csv(path, header=[0, 1], index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True)
+        df.index.name = 'Datetime'
+        return df
+    df = pd.read_csv(path)
+    df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True)
+    return df
+
+
+def merge_frames(old, new, layout="flat"):
+    """合并新旧数据：重叠部分以新数据为准，按时间排序"""
+    if layout == "yf":
+        new = new.copy()
+        new.index = new.index.tz_convert('UTC')
+        merged = pd.concat([old, new])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        return merged
+
+    # 两边都统一到 UTC 再拼接 (时区不同的时间列 concat 后会退化成 object)
+    old = old.copy()
+    old['Datetime'] = pd.to_datetime(old['Datetime'], utc=True)
+    new = new.copy()
+    new['Datetime'] = pd.to_datetime(new['Datetime'], utc=True)
+    merged = pd.concat([old, new], ignore_index=True)
+    merged = merged.drop_duplicates(subset=['Datetime'], keep='last')
+    return merged.sort_values('Datetime').reset_index(drop=True)
+
+
+def write_csv_atomic(df, path, index=True):
+    """先写同目录临时文件，再 os.replace 原子替换"""
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=index)
+    os.replace(tmp_path, path)
+
+
+def merge_into_csv(path, fresh, layout="flat", tz=None):
+    """
+    把新抓到的数据并入已有 CSV 并原子写回。
+    - fresh: 与该布局一致的 DataFrame ("yf" 为带时区索引，"flat" 含 Datetime 列)
+    - tz:    写回时使用的时区 (默认沿用 fresh 的时区)
+    返回 (新增行数, 合并后总行数)
+    """
+    if layout == "yf":
+        tz = tz or fresh.index.tz
+    else:
+        tz = tz or fresh['Datetime'].dt.tz
+
+    if os.path.exists(path):
+        old = read_stored_frame(path, layout)
+        old_len = len(old)
+        merged = merge_frames(old, fresh, layout)
+    else:
+        old_len = 0
+        merged = merge_frames(fresh.iloc[0:0], fresh, layout)
+
+    if layout == "yf":
+        merged.index = merged.index.tz_convert(tz)
+        write_csv_atomic(merged, path, index=True)
+    else:
+        merged['Datetime'] = merged['Datetime'].dt.tz_convert(tz)
+        write_csv_atomic(merged, path, index=False)
+    return len(merged) - old_len, len(merged)
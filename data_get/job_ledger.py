@@ -0,0 +1,188 @@
+import os
+import threading
+from datetime import datetime, timezone
+from peewee import (SqliteDatabase, Model, CharField, IntegerField, FloatField,
+                    DateTimeField, TextField, fn)
+
+# ==================== 任务账本 (SQLite) ====================
+# 取代只能追加的 progress.txt：每只代码一行，记录状态、尝试次数、最后一根 K 线、文件大小、耗时。
+# - (dataset, ticker) 唯一索引，(dataset, status) 普通索引 -> 审计脚本直接查询，不再扫目录做集合差
+# - WAL 模式 + busy_timeout：多个进程/线程可以同时写，读不会被写阻塞
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+LEDGER_FILE = os.path.join(CURRENT_DIR, "job_ledger.db")
+LEGACY_PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
+
+# 数据集名称
+US_STOCK = "us_stock_1h"
+US_ETF = "us_etf_1h"
+US_FUTURE = "us_future_1h"
+
+# 状态
+DONE = "done"                  # 有数据，已落盘
+EMPTY = "empty"                # Yahoo 返回空 (退市 / 无交易)
+ERROR = "error"                # 其他报错
+RATE_LIMITED = "rate_limited"  # 被限流 (429)
+PENDING = "pending"            # 等待 (重新) 抓取
+
+# 已处理完成、下次运行可以跳过的状态
+PROCESSED = (DONE, EMPTY)
+FAILED = (ERROR, RATE_LIMITED)
+
+db = SqliteDatabase(None)
+_write_lock = threading.Lock()
+
+
+class Job(Model):
+    dataset = CharField()
+    ticker = CharField()
+    status = CharField(default=PENDING)
+    attempts = IntegerField(default=0)
+    last_bar = DateTimeField(null=True)
+    size_bytes = IntegerField(default=0)
+    duration = FloatField(default=0.0)
+    error = TextField(null=True)
+    updated_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = "jobs"
+        indexes = (
+            (("dataset", "ticker"), True),
+            (("dataset", "status"), False),
+        )
+
+
+def open_ledger(path=LEDGER_FILE):
+    """打开 (必要时创建) 账本数据库，重复调用安全"""
+    if db.database != path:
+        if not db.is_closed():
+            db.close()
+        db.init(path, pragmas={
+            "journal_mode": "wal",
+            "busy_timeout": 30000,
+            "synchronous": "normal",
+        })
+    db.connect(reuse_if_open=True)
+    db.create_tables([Job], safe=True)
+    return db
+
+
+def _to_naive_utc(ts):
+    """SQLite 不存时区，统一存 UTC 的 naive datetime"""
+    if ts is None:
+        return None
+    if getattr(ts, "tzinfo", None) is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.to_pydatetime() if hasattr(ts, "to_pydatetime") else ts
+
+
+class JobLedger:
+    def __init__(self, dataset, path=LEDGER_FILE):
+        self.dataset = dataset
+        open_ledger(path)
+
+    # ---------- 写入 ----------
+    def record(self, ticker, status, last_bar=None, size_bytes=None, duration=None, error=None):
+        """记录一次尝试：attempts + 1，其余字段按传入值更新"""
+        now = datetime.now()
+        row = {
+            Job.dataset: self.dataset,
+            Job.ticker: ticker,
+            Job.status: status,
+            Job.attempts: 1,
+            Job.last_bar: _to_naive_utc(last_bar),
+            Job.size_bytes: size_bytes or 0,
+            Job.duration: duration or 0.0,
+            Job.error: str(error)[:500] if error is not None else None,
+            Job.updated_at: now,
+        }
+        update = {
+            Job.status: status,
+            Job.attempts: Job.attempts + 1,
+            Job.error: row[Job.error],
+            Job.updated_at: now,
+        }
+        if last_bar is not None:
+            update[Job.last_bar] = row[Job.last_bar]
+        if size_bytes is not None:
+            update[Job.size_bytes] = size_bytes
+        if duration is not None:
+            update[Job.duration] = duration
+
+        with _write_lock, db.atomic():
+            (Job.insert(row)
+             .on_conflict(conflict_target=[Job.dataset, Job.ticker], update=update)
+             .execute())
+
+    def reset(self, tickers, status=PENDING):
+        """把指定代码重置为待抓取 (保留尝试次数)，返回更新行数"""
+        tickers = list(tickers)
+        updated = 0
+        with _write_lock, db.atomic():
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                updated += (Job.update(status=status, updated_at=datetime.now())
+                            .where((Job.dataset == self.dataset) & (Job.ticker.in_(chunk)))
+                            .execute())
+        return updated
+
+    def import_tickers(self, rows):
+        """批量导入 [(ticker, status), ...]，已存在的代码不覆盖，返回导入行数"""
+        now = datetime.now()
+        data = [{"dataset": self.dataset, "ticker": t, "status": s, "attempts": 1, "updated_at": now}
+                for t, s in rows]
+        with _write_lock, db.atomic():
+            for i in range(0, len(data), 500):
+                Job.insert_many(data[i:i + 500]).on_conflict_ignore().execute()
+        return len(data)
+
+    # ---------- 查询 ----------
+    def _query(self, statuses=None):
+        query = Job.select().where(Job.dataset == self.dataset)
+        if statuses:
+            query = query.where(Job.status.in_(list(statuses)))
+        return query
+
+    def tickers(self, *statuses):
+        """返回处于指定状态的代码集合 (不传状态 = 全部)"""
+        return {row.ticker for row in self._query(statuses).select(Job.ticker)}
+
+    def processed_tickers(self):
+        return self.tickers(*PROCESSED)
+
+    def jobs(self, *statuses):
+        return list(self._query(statuses).order_by(Job.ticker).dicts())
+
+    def counts(self):
+        """{status: 数量}"""
+        query = (Job.select(Job.status, fn.COUNT(Job.id).alias("n"))
+                 .where(Job.dataset == self.dataset)
+                 .group_by(Job.status))
+        return {row.status: row.n for row in query}
+
+    def total_bytes(self):
+        return (Job.select(fn.COALESCE(fn.SUM(Job.size_bytes), 0))
+                .where((Job.dataset == self.dataset) & (Job.status == DONE))
+                .scalar())
+
+    def is_empty(self):
+        return not self._query().exists()
+
+
+def migrate_progress_file(ledger, data_dir, progress_file=LEGACY_PROGRESS_FILE,
+                          filename_fn=lambda t: f"{t}_1h.csv"):
+    """
+    一次性把旧的 progress.txt 导入账本。
+    progress.txt 区分不了 "有数据" 和 "空数据"，这里按 CSV 是否存在推断 DONE / EMPTY。
+    账本已有记录时不做任何事，返回导入行数。
+    """
+    if not ledger.is_empty() or not os.path.exists(progress_file):
+        return 0
+    with open(progress_file, "r", encoding="utf-8") as f:
+        tickers = sorted({line.strip() for line in f if line.strip()})
+    existing = set(os.listdir(data_dir)) if os.path.exists(data_dir) else set()
+    rows = [(t, DONE if filename_fn(t) in existing else EMPTY) for t in tickers]
+    n = ledger.import_tickers(rows)
+    print(f"📥 已从 progress.txt 迁移 {n} 条记录到账本 ({ledger.dataset})")
+    return n
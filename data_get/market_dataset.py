@@ -0,0 +1,235 @@
+import os
+import json
+import zlib
+import shutil
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ==================== Hive 分区的全市场数据集 ====================
+# full_market_data.parquet / engineered_features_final.parquet / hk_unified_market.parquet 都是单个大文件，
+# 查一只代码一个月也要把整个文件读进来。可选的分区布局:
+#   <root>/Market=US/Asset_Type=Stock/Month=2024-01/Bucket=07/part-0.parquet
+#   - Market / Asset_Type : 市场、资产类型 (文件里没有这两列时用调用方给的默认值)
+#   - Month               : UTC 时间的年月
+#   - Bucket              : 代码哈希分桶 (crc32 % TICKER_BUCKETS)，按代码查询时只打开一个桶
+# 读取统一走 pyarrow.dataset + 过滤下推 (market_filter)，目录/行组统计不匹配的文件根本不打开。
+# 分区列不写进文件本体 (在路径里)，读回时由 read_market 去掉 Month / Bucket。
+#
+# 用法:
+#   python data_get/market_dataset.py build data_process/output/full_market_data.parquet   # -> 同名目录
+#   df = read_market(root, columns=[...], filters=market_filter(tickers=['AAPL'], start='2024-03-01', end='2024-03-31'))
+
+# [配置] 代码分桶数 (9000 只代码 -> 每桶约 280 只)
+TICKER_BUCKETS = 32
+# [配置] 分区文件内的行组大小
+ROW_GROUP_SIZE = 128 * 1024
+
+PARTITION_COLS = ['Market', 'Asset_Type', 'Month', 'Bucket']
+HELPER_COLS = ['Month', 'Bucket']
+# 分区列不在文件本体里，原始列顺序记在元数据里，读回时恢复
+COLUMN_ORDER_KEY = b"column_order"
+PARTITIONING = ds.partitioning(pa.schema([
+    ('Market', pa.string()),
+    ('Asset_Type', pa.string()),
+    ('Month', pa.string()),
+    ('Bucket', pa.string()),
+]), flavor="hive")
+
+
+def ticker_bucket(ticker, buckets=TICKER_BUCKETS):
+    """稳定的代码分桶 (跨进程/跨机器一致，不能用内置 hash)"""
+    return f"{zlib.crc32(str(ticker).encode()) % buckets:02d}"
+
+
+def dataset_path(output_file):
+    """单文件输出对应的分区目录 (去掉 .parquet 后缀)"""
+    return os.path.splitext(output_file)[0]
+
+
+def is_partitioned(path):
+    return os.path.isdir(path)
+
+
+def open_dataset(root):
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+
+def add_partition_columns(table, market="US", asset_type="Stock", buckets=TICKER_BUCKETS):
+    """给一批数据加上分区列 (Market / Asset_Type 缺失时用默认值)"""
+    n = table.num_rows
+    for name, default in (('Market', market), ('Asset_Type', asset_type)):
+        if name in table.column_names:
+            idx = table.column_names.index(name)
+            table = table.set_column(idx, name, table[name].cast(pa.string()))
+        else:
+            table = table.append_column(name, pa.array([default] * n, type=pa.string()))
+    month = pc.strftime(table['Datetime'], format='%Y-%m')
+    tickers = table['Ticker'].cast(pa.string())
+    # 同一批里代码很少 (逐只写出时只有一只)，按唯一值算一次哈希再映射回去
+    uniques = pc.unique(tickers)
+    codes = pa.array([ticker_bucket(t, buckets) for t in uniques.to_pylist()], type=pa.string())
+    bucket = pc.take(codes, pc.index_in(tickers, value_set=uniques))
+    return table.append_column('Month', month).append_column('Bucket', bucket)
+
+
+def _spill_path(spill_root, bucket):
+    return os.path.join(spill_root, f"bucket-{bucket}.parquet")
+
+
+def write_partitioned(batches, root, market="US", asset_type="Stock", buckets=TICKER_BUCKETS):
+    """
+    把若干 Arrow 表 / RecordBatch (按代码升序) 写成分区目录，返回写出行数。
+    输入是逐只代码到达的，每只代码都会碰到所有月份，直接交给 write_dataset 会让每个分区反复开关文件、
+    碎成几十个 part 文件。所以分两步:
+      1. 按 Bucket 流式落到临时文件 (每桶一个 writer，同时打开的文件数 = 桶数)
+      2. 逐桶读回 (约 1/桶数 的数据量)，按 (Market, Asset_Type, Month) 稳定排序后一次写出，每个分区恰好一个文件
+    先写到临时目录，成功后整体替换旧目录。
+    """
+    tmp_root = root + ".tmp"
+    spill_root = root + ".spill"
+    for d in (tmp_root, spill_root):
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    os.makedirs(spill_root)
+
+    rows = 0
+    schema = None
+    writers = {}
+    try:
+        # 1. 按桶落临时文件 (桶内保持输入的代码 / 时间顺序)
+        for data in batches:
+            table = pa.Table.from_batches([data]) if isinstance(data, pa.RecordBatch) else data
+            if table.num_rows == 0:
+                continue
+            table = add_partition_columns(table, market, asset_type, buckets)
+            if schema is None:
+                order = [c for c in table.column_names if c not in HELPER_COLS]
+                schema = table.schema.with_metadata({**(table.schema.metadata or {}),
+                                                     COLUMN_ORDER_KEY: json.dumps(order).encode()})
+            table = table.cast(schema)
+            rows += table.num_rows
+            for bucket in pc.unique(table['Bucket']).to_pylist():
+                if bucket not in writers:
+                    writers[bucket] = pq.ParquetWriter(_spill_path(spill_root, bucket), schema, compression='snappy')
+                writers[bucket].write_table(table.filter(pc.equal(table['Bucket'], bucket)))
+        for writer in writers.values():
+            writer.close()
+        if schema is None:
+            return 0
+
+        # 2. 逐桶按分区键排序后写出 (sort_indices 是稳定排序，分区内仍按代码 / 时间有序)
+        for bucket in sorted(writers):
+            table = pq.read_table(_spill_path(spill_root, bucket), schema=schema)
+            table = table.take(pc.sort_indices(table, sort_keys=[('Market', 'ascending'), ('Asset_Type', 'ascending'),
+                                                                 ('Month', 'ascending')]))
+            ds.write_dataset(table, tmp_root, schema=schema, format="parquet",
+                             partitioning=PARTITIONING, basename_template="part-{i}.parquet",
+                             existing_data_behavior="overwrite_or_ignore", preserve_order=True,
+                             max_rows_per_group=ROW_GROUP_SIZE, min_rows_per_group=min(ROW_GROUP_SIZE, 16 * 1024),
+                             max_partitions=100_000, max_open_files=100_000)
+            os.remove(_spill_path(spill_root, bucket))
+    finally:
+        for writer in writers.values():
+            if writer.is_open:
+                writer.close()
+        shutil.rmtree(spill_root, ignore_errors=True)
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.replace(tmp_root, root)
+    return rows
+
+
+def dataset_stats(root):
+    """分区目录的 (分区数, 文件数)，CLI 输出用来检查有没有碎文件"""
+    partitions = files = 0
+    for _, _, names in os.walk(root):
+        n = sum(name.endswith(".parquet") for name in names)
+        partitions += n > 0
+        files += n
+    return partitions, files
+
+
+def partition_file(src_file, root=None, market="US", asset_type="Stock", buckets=TICKER_BUCKETS):
+    """把一个单文件输出按行组流式转换成分区目录 (峰值内存约为一个行组)"""
+    root = root or dataset_path(src_file)
+    pf = pq.ParquetFile(src_file)
+    metadata = pf.schema_arrow.metadata or {}
+
+    def batches():
+        for i in range(pf.metadata.num_row_groups):
+            yield pf.read_row_group(i).replace_schema_metadata(metadata)
+
+    return write_partitioned(batches(), root, market, asset_type, buckets)
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def market_filter(tickers=None, start=None, end=None, market=None, asset_type=None, buckets=TICKER_BUCKETS):
+    """
+    组合过滤表达式: 分区列 (Market / Asset_Type / Month / Bucket) 用于目录裁剪，
+    Ticker / Datetime 用于行组统计裁剪。start / end 可以带时区；不带时区视为 UTC。
+    单文件 (非分区) 读取时不要用这个表达式，请直接按 Ticker / Datetime 过滤。
+    """
+    expr = None
+
+    def add(e):
+        nonlocal expr
+        expr = e if expr is None else expr & e
+
+    if market is not None:
+        add(ds.field('Market').isin([market] if isinstance(market, str) else list(market)))
+    if asset_type is not None:
+        add(ds.field('Asset_Type').isin([asset_type] if isinstance(asset_type, str) else list(asset_type)))
+    if tickers is not None:
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        add(ds.field('Bucket').isin(sorted({ticker_bucket(t, buckets) for t in tickers})))
+        add(ds.field('Ticker').isin(tickers))
+    if start is not None:
+        start = _utc(start)
+        add(ds.field('Month') >= start.strftime('%Y-%m'))
+        add(ds.field('Datetime') >= pa.scalar(start.to_pydatetime(), type=pa.timestamp('ns', tz='UTC')))
+    if end is not None:
+        end = _utc(end)
+        add(ds.field('Month') <= end.strftime('%Y-%m'))
+        add(ds.field('Datetime') <= pa.scalar(end.to_pydatetime(), type=pa.timestamp('ns', tz='UTC')))
+    return expr
+
+
+def read_dataset_table(root, columns=None, filters=None):
+    """按列 + 过滤条件读取分区目录，返回 Arrow 表 (不含 Month / Bucket 辅助列，除非显式请求)"""
+    dataset = open_dataset(root)
+    if columns is None:
+        order = (dataset.schema.metadata or {}).get(COLUMN_ORDER_KEY)
+        columns = json.loads(order) if order else [c for c in dataset.schema.names if c not in HELPER_COLS]
+    table = dataset.to_table(columns=columns, filter=filters)
+    # 分区目录按 月份/桶 组织，读回后恢复与单文件一致的 (Ticker, Datetime) 顺序
+    if 'Ticker' in table.column_names and 'Datetime' in table.column_names:
+        keys = pa.table({'Ticker': table['Ticker'].cast(pa.string()), 'Datetime': table['Datetime']})
+        table = table.take(pc.sort_indices(keys, sort_keys=[('Ticker', 'ascending'), ('Datetime', 'ascending')]))
+    return table.replace_schema_metadata(dataset.schema.metadata)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全市场 Parquet <-> Hive 分区数据集")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="把单文件输出转换成分区目录")
+    p_build.add_argument("file", help="单文件 Parquet (如 data_process/output/full_market_data.parquet)")
+    p_build.add_argument("--out", help="分区目录 (默认: 去掉 .parquet 的同名目录)")
+    p_build.add_argument("--market", default="US", help="文件里没有 Market 列时使用的值")
+    p_build.add_argument("--asset-type", default="Stock", help="文件里没有 Asset_Type 列时使用的值")
+    p_build.add_argument("--buckets", type=int, default=TICKER_BUCKETS)
+    args = parser.parse_args()
+
+    root = args.out or dataset_path(args.file)
+    print(f"📦 分区写出: {args.file} -> {root}")
+    n = partition_file(args.file, root, args.market, args.asset_type, args.buckets)
+    partitions, files = dataset_stats(root)
+    print(f"✅ 完成: {n:,} 行, {partitions:,} 个分区, {files:,} 个文件")
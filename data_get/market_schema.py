@@ -0,0 +1,141 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from data_get.market_dataset import is_partitioned, read_dataset_table
+
+# ==================== 全流程统一的紧凑数据类型 ====================
+# 原来全市场 Parquet 和内存里的 DataFrame 用的是 float64 OHLC、float64 成交量 (fillna(0) 之后)、
+# object 字符串代码、各市场各自时区的 datetime64，只有 merge_all_assets.py 把 Ticker 转成了 category。
+# 这里规定一套所有脚本共用的类型:
+#   Datetime                   : timestamp[ns, UTC] (底层就是 int64 的 UTC 纳秒)，交易所本地时区写进元数据 tz
+#   Open / High / Low / Close  : float32
+#   Volume                     : int64 (缺失填 0)
+#   Ticker / Market / Asset_Type : 字典编码 (读回 pandas 为 category)
+#   其他数值列 (技术指标等)      : float32
+# 一行从约 100 字节降到约 36 字节。写出 (MarketParquetWriter / write_market) 和读取 (read_market)
+# 都按这套类型强制转换，旧文件 (float64 / 字符串代码 / 本地时区) 读进来也会被压缩。
+#
+# 用法:
+#   schema = market_schema(['Datetime', 'Ticker', 'Open', ..., 'Volume'], tz='Asia/Hong_Kong')
+#   df = read_market(path, columns=[...])            # 紧凑类型，Datetime 为 UTC
+#   df = read_market(path, local_time=True)          # Datetime 转回元数据里的交易所时区
+#   write_market(df, path, tz='America/New_York')    # 任意 DataFrame -> 紧凑 Parquet
+#   df = read_market(root, filters=market_filter(tickers=['AAPL']))   # Hive 分区目录 (见 market_dataset.py)
+
+TIME_TYPE = pa.timestamp('ns', tz='UTC')
+PRICE_TYPE = pa.float32()
+VOLUME_TYPE = pa.int64()
+LABEL_TYPE = pa.dictionary(pa.int32(), pa.string())
+FEATURE_TYPE = pa.float32()
+
+PRICE_COLS = ['Open', 'High', 'Low', 'Close']
+LABEL_COLS = ['Ticker', 'Market', 'Asset_Type']
+TZ_KEY = b"tz"
+
+
+def column_type(name):
+    """单列的统一类型 (未知的数值列按特征列处理)"""
+    if name == 'Datetime':
+        return TIME_TYPE
+    if name in PRICE_COLS:
+        return PRICE_TYPE
+    if name == 'Volume':
+        return VOLUME_TYPE
+    if name in LABEL_COLS:
+        return LABEL_TYPE
+    return FEATURE_TYPE
+
+
+def market_schema(columns, tz="UTC", types=None):
+    """按列名生成统一的 Arrow schema；tz 是交易所本地时区 (只记在元数据里，数据一律存 UTC)"""
+    types = types or {}
+    fields = [(c, types.get(c) or column_type(c)) for c in columns]
+    return pa.schema(fields, metadata={TZ_KEY: tz.encode()})
+
+
+def schema_timezone(schema, default="UTC"):
+    return (schema.metadata or {}).get(TZ_KEY, default.encode()).decode()
+
+
+def compact_table(table, tz=None):
+    """
+    把任意 OHLCV/特征 Arrow 表转成统一类型 (保留列顺序)。
+    非数值的未知列 (字符串、布尔等) 原样保留；Volume 缺失填 0 后转整数。
+    """
+    fields, columns = [], []
+    for field, col in zip(table.schema, table.columns):
+        if field.name == 'Datetime':
+            target = TIME_TYPE
+            if pa.types.is_timestamp(field.type) and field.type.tz is None:
+                # 无时区的时间视为 UTC (与 csv_reader 的约定一致)
+                col = pc.assume_timezone(col, 'UTC')
+        elif field.name in LABEL_COLS or field.name in PRICE_COLS or field.name == 'Volume':
+            target = column_type(field.name)
+            if field.name == 'Volume':
+                col = pc.fill_null(col, 0)
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            target = FEATURE_TYPE
+        else:
+            target = field.type
+        fields.append(pa.field(field.name, target))
+        columns.append(col if col.type == target else col.cast(target, safe=False))
+    tz = tz or schema_timezone(table.schema)
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata={TZ_KEY: tz.encode()}))
+
+
+def conform_table(table, schema):
+    """按给定 schema 选列并转换类型 (先统一成紧凑类型，再对齐到 schema 里的具体类型)"""
+    return compact_table(table.select(schema.names), tz=schema_timezone(schema)).cast(schema)
+
+
+def compact_frame(df):
+    """pandas 版: 原地把列转成统一类型 (Datetime -> UTC，价格/特征 -> float32，Volume -> int64，标签 -> category)"""
+    for c in df.columns:
+        if c == 'Datetime':
+            df[c] = pd.to_datetime(df[c], utc=True)
+        elif c in PRICE_COLS:
+            df[c] = df[c].astype('float32')
+        elif c == 'Volume':
+            df[c] = df[c].fillna(0).astype('int64')
+        elif c in LABEL_COLS:
+            df[c] = df[c].astype('category')
+        elif pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]):
+            df[c] = df[c].astype('float32')
+    return df
+
+
+def read_market(path, columns=None, filters=None, local_time=False):
+    """
+    读取全市场 / 特征 Parquet 并强制统一类型；文件元数据里的交易所时区放在 df.attrs['tz']。
+    local_time=True 时把 Datetime 转回该时区 (旧文件里存的本地时区也能正确识别)。
+    path 也可以是 Hive 分区目录 (market_dataset.py)，filters 用 market_filter() 生成以裁剪分区。
+    """
+    if is_partitioned(path):
+        table = read_dataset_table(path, columns=columns, filters=filters)
+    else:
+        table = pq.read_table(path, columns=columns, filters=filters)
+    tz = schema_timezone(table.schema, default="")
+    if not tz and 'Datetime' in table.column_names and table.schema.field('Datetime').type.tz:
+        # 旧文件没有 tz 元数据: 以列本身的时区为准
+        tz = table.schema.field('Datetime').type.tz
+    table = compact_table(table, tz=tz or "UTC")
+    df = table.to_pandas()
+    # 分区目录读回的字典按出现顺序排列；统一成按字母序，groupby 等的输出顺序与单文件一致
+    for c in LABEL_COLS:
+        if c in df.columns and not df[c].cat.categories.is_monotonic_increasing:
+            df[c] = df[c].cat.reorder_categories(sorted(df[c].cat.categories))
+    df.attrs['tz'] = tz or "UTC"
+    if local_time and 'Datetime' in df.columns:
+        df['Datetime'] = df['Datetime'].dt.tz_convert(df.attrs['tz'])
+    return df
+
+
+def to_market_table(df, tz="UTC"):
+    """DataFrame -> 统一类型的 Arrow 表 (不带索引)"""
+    return compact_table(pa.Table.from_pandas(df, preserve_index=False), tz=tz)
+
+
+def write_market(df, path, tz="UTC", compression='snappy'):
+    """一次性写出一个紧凑 Parquet (逐只流式写出请用 MarketParquetWriter)"""
+    pq.write_table(to_market_table(df, tz=tz), path, compression=compression)
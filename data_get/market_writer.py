@@ -0,0 +1,145 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_get.market_schema import conform_table
+
+# ==================== 全市场 Parquet 流式写出 ====================
+# 清洗/合并脚本原来把每只代码的表都放进 list，最后 pd.concat + 全局 sort_values 再写出，
+# 峰值内存是整个数据集的数倍。这里改成按代码顺序逐只写:
+#   - 每只代码单独排序 + 前向填充 (finalize_ticker)，结果与全局 sort_values(['Ticker', 'Datetime']) + groupby ffill 相同
+#   - 逐只 append 到 ParquetWriter，每只代码是自己的行组 (超过 ROW_GROUP_SIZE 再拆)
+#   - 先写临时文件，全部成功后原子替换，中途出错不会留下半个文件
+# 调用方按 Ticker 升序逐只写入，输出的行顺序就与原来一致；峰值内存约等于单只代码的数据量。
+#
+# 排序元数据: 写入器检查代码严格递增，并在文件里记录 (Ticker, Datetime) 有序
+#   - 行组级 sorting_columns (Parquet 标准字段)
+#   - schema 元数据 sorted_by = "Ticker,Datetime"
+# 下游 (特征工程等) 用 is_ticker_sorted() 判断后，直接按连续区间切片 (iter_ticker_slices)，
+# 不必再全表 sort_values / groupby。
+#
+# 用法:
+#   with MarketParquetWriter(OUTPUT_FILE, schema) as writer:
+#       for ticker in sorted(tickers):
+#           writer.write(finalize_ticker(load(ticker)))
+
+PRICE_COLS = ['Open', 'High', 'Low', 'Close']
+# 单个行组的最大行数 (1h 线两年约 3500 行，一只代码通常就是一个行组)
+ROW_GROUP_SIZE = 1_000_000
+SORT_KEYS = ('Ticker', 'Datetime')
+SORTED_BY_KEY = b"sorted_by"
+
+
+def finalize_ticker(df, dropna=None):
+    """
+    单只代码的最终清洗: 按时间排序、价格前向填充、成交量缺失填 0。
+    dropna: None 不删行 | "all" 删除仍有空值的行 | 列名列表 (仅按这些列删除)
+    """
+    # 单个来源的 CSV/Parquet 本来就按时间有序，这时跳过排序 (O(n) 检查)
+    if not df['Datetime'].is_monotonic_increasing:
+        df = df.sort_values('Datetime', kind='stable')
+    price_cols = [c for c in PRICE_COLS if c in df.columns]
+    df[price_cols] = df[price_cols].ffill()
+    df['Volume'] = df['Volume'].fillna(0)
+    if dropna == "all":
+        df = df.dropna()
+    elif dropna:
+        df = df.dropna(subset=dropna)
+    return df
+
+
+class MarketParquetWriter:
+    """逐只追加写出的 Parquet 写入器 (线程不安全，只在主进程里用)；代码必须按升序写入"""
+
+    def __init__(self, path, schema, compression='snappy', row_group_size=ROW_GROUP_SIZE):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema.with_metadata({**(schema.metadata or {}),
+                                            SORTED_BY_KEY: ",".join(SORT_KEYS).encode()})
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self.tickers = 0
+        self.last_ticker = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        sorting = [pq.SortingColumn(schema.get_field_index(c)) for c in SORT_KEYS]
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=compression,
+                                       sorting_columns=sorting)
+
+    def _check_order(self, table):
+        """保证 sorted_by 元数据属实: 一次写入一只代码，且代码严格递增"""
+        tickers = table['Ticker'].cast(pa.string()).unique()
+        if len(tickers) != 1:
+            raise ValueError(f"每次只能写入一只代码，收到 {len(tickers)} 只")
+        ticker = tickers[0].as_py()
+        if self.last_ticker is not None and ticker <= self.last_ticker:
+            raise ValueError(f"代码必须按升序写入: {self.last_ticker} -> {ticker}")
+        self.last_ticker = ticker
+
+    def write(self, data):
+        """写入一只代码 (DataFrame 或 Arrow 表)；空表忽略"""
+        if not isinstance(data, pa.Table):
+            data = pa.Table.from_pandas(data[self.schema.names], preserve_index=False)
+        # 统一类型 (float32 价格 / int64 成交量 / 字典编码代码 / UTC 时间)，见 market_schema.py
+        table = conform_table(data, self.schema)
+        if table.num_rows == 0:
+            return 0
+        self._check_order(table)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows += table.num_rows
+        self.tickers += 1
+        return table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """出错时丢弃临时文件，保留旧的输出文件"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def is_ticker_sorted(path):
+    """文件是否由 MarketParquetWriter 写出 (按 Ticker, Datetime 有序)，只读 schema 元数据"""
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadata.get(SORTED_BY_KEY) == ",".join(SORT_KEYS).encode()
+
+
+def ticker_bounds(codes):
+    """连续代码区间的边界 [0, s1, s2, ..., n] (第 i 只代码是 bounds[i]:bounds[i+1])"""
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return np.concatenate(([0], starts, [len(codes)])).astype(np.int64)
+
+
+def iter_ticker_slices(df):
+    """
+    按 Ticker 连续区间切片，逐只 yield (ticker, 子表)，不做 groupby/排序。
+    要求同一只代码的行是连续的 (is_ticker_sorted 的文件满足)。
+    """
+    if df.empty:
+        return
+    codes = df['Ticker'].to_numpy()
+    bounds = ticker_bounds(codes)
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        yield codes[a], df.iloc[a:b]
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from peewee import Model, CharField, IntegerField, DateTimeField, TextField, fn
+
+from data_get.job_ledger import db, open_ledger, LEDGER_FILE, _write_lock
+from data_get.batch_fetch import download_batch
+
+# ==================== 无效代码负缓存 ====================
+# 记录 "请求过但没有数据" 的代码 (退市 / 从未上市 / 号段空号)，避免每次都逐个去试。
+# 与任务账本共用同一个 SQLite 文件 (dead_symbols 表)。
+#
+# 复查计划: 第 n 次连续为空后，下次复查时间 = 最后检查时间 + BASE_TTL * 2^(n-1)，最长 MAX_TTL。
+#   - 未到复查时间的代码直接跳过
+#   - 到期的代码用 bulk_recheck() 批量复查: 一次 yf.download 几十只、只取几天日线，成本远低于逐只拉 2 年小时线
+#   - 复查有数据 -> 从缓存中删除，重新进入正常抓取
+
+HK_MARKET = "hk"
+
+# [配置] 复查间隔
+BASE_TTL = timedelta(days=7)
+MAX_TTL = timedelta(days=90)
+RECHECK_BATCH_SIZE = 50
+RECHECK_WINDOW = {"period": "5d", "interval": "1d"}
+
+
+class DeadSymbol(Model):
+    market = CharField()
+    ticker = CharField()
+    reason = TextField(null=True)
+    misses = IntegerField(default=1)          # 连续为空的次数
+    first_seen = DateTimeField(default=datetime.now)
+    last_checked = DateTimeField(default=datetime.now)
+    next_check = DateTimeField()
+
+    class Meta:
+        database = db
+        table_name = "dead_symbols"
+        indexes = (
+            (("market", "ticker"), True),
+            (("market", "next_check"), False),
+        )
+
+
+def next_check_after(last_checked, misses):
+    ttl = min(BASE_TTL * (2 ** max(misses - 1, 0)), MAX_TTL)
+    return last_checked + ttl
+
+
+class NegativeCache:
+    def __init__(self, market=HK_MARKET, path=LEDGER_FILE):
+        self.market = market
+        open_ledger(path)
+        db.create_tables([DeadSymbol], safe=True)
+
+    def _query(self):
+        return DeadSymbol.select().where(DeadSymbol.market == self.market)
+
+    # ---------- 写入 ----------
+    def mark_dead(self, tickers, reason="empty"):
+        """记录一次 (或一批) 空结果：连续次数 + 1，并按次数推迟下次复查"""
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        now = datetime.now()
+        with _write_lock, db.atomic():
+            for t in tickers:
+                row = self._query().where(DeadSymbol.ticker == t).first()
+                if row is None:
+                    DeadSymbol.create(market=self.market, ticker=t, reason=reason,
+                                      last_checked=now, next_check=next_check_after(now, 1))
+                else:
+                    row.misses += 1
+                    row.reason = reason
+                    row.last_checked = now
+                    row.next_check = next_check_after(now, row.misses)
+                    row.save()
+
+    def mark_alive(self, tickers):
+        """有数据了：从负缓存中移除，返回删除行数"""
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        tickers = list(tickers)
+        removed = 0
+        with _write_lock, db.atomic():
+            for i in range(0, len(tickers), 500):
+                removed += (DeadSymbol.delete()
+                            .where((DeadSymbol.market == self.market) &
+                                   (DeadSymbol.ticker.in_(tickers[i:i + 500])))
+                            .execute())
+        return removed
+
+    # ---------- 查询 ----------
+    def dead_now(self, now=None):
+        """仍在冷却期 (不需要请求) 的代码集合"""
+        now = now or datetime.now()
+        return {r.ticker for r in self._query().where(DeadSymbol.next_check > now).select(DeadSymbol.ticker)}
+
+    def due(self, now=None):
+        """已到复查时间的代码集合"""
+        now = now or datetime.now()
+        return {r.ticker for r in self._query().where(DeadSymbol.next_check <= now).select(DeadSymbol.ticker)}
+
+    def counts(self, now=None):
+        now = now or datetime.now()
+        total = self._query().count()
+        cooling = self._query().where(DeadSymbol.next_check > now).count()
+        return {"total": total, "cooling": cooling, "due": total - cooling,
+                "max_misses": self._query().select(fn.MAX(DeadSymbol.misses)).scalar() or 0}
+
+    # ---------- 批量复查 ----------
+    def bulk_recheck(self, tickers, throttle=None, batch_size=RECHECK_BATCH_SIZE, **window):
+        """
+        批量复查一组代码 (只取几天日线)：有数据的移出缓存，没有的推迟下次复查。
+        返回复活的代码列表。限流等真正的错误不改变缓存状态。
+        """
+        tickers = sorted(tickers)
+        window = window or RECHECK_WINDOW
+        revived, still_dead = [], []
+        for i in range(0, len(tickers), batch_size):
+            batch = tickers[i:i + batch_size]
+            if throttle is not None:
+                throttle.before_request()
+            try:
+                frames, failed = download_batch(batch, **window)
+            except Exception as e:
+                if throttle is not None:
+                    throttle.record_failure(e)
+                continue
+            if throttle is not None:
+                throttle.record_success()
+            revived += list(frames)
+            still_dead += [t for t, msg in failed.items() if not _is_error(msg)]
+        if revived:
+            self.mark_alive(revived)
+        if still_dead:
+            self.mark_dead(still_dead, reason="recheck empty")
+        return revived
+
+
+def _is_error(msg):
+    """download_batch 的失败信息里，限流/网络错误不能当作 "确认无数据" """
+    msg = str(msg)
+    return any(k in msg for k in ("429", "Too Many Requests", "Rate limit", "Timeout", "timed out",
+                                  "Connection", "500", "502", "503"))
@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ==================== 稠密面板存储 (T×N 内存映射) ====================
+# 市场宽度、横截面排名、相关性、visualization_market.py 里的 pivot 都需要“时间 × 代码”对齐的宽表，
+# 以前每次都从长表 Parquet 临时 pivot。这里把每个市场对齐到一条共享的小时时间轴上，落盘为:
+#   <root>/<Market>/
+#       meta.json          : 市场 / 时区 / 字段列表 / 形状 / 来源文件 / 构建时间
+#       index.npy          : int64 UTC 纳秒时间轴 (长度 T，升序)
+#       tickers.npy        : 代码 (长度 N，升序)
+#       valid.npy          : bool T×N，该代码在该时间点有原始行
+#       <Field>.npy        : float32 T×N (无数据为 NaN)，Open/High/Low/Close/Volume + 特征列
+# 读取用 np.load(mmap_mode='r')，零拷贝打开；按时间切片是连续内存 (行优先)，按代码取列是 O(1) 视图。
+# 时间轴默认取该市场所有代码出现过的时间点的并集，也可以由调用方传入 (如交易日历生成的期望网格)；
+# calendar=True 时再并上 data_get/trading_calendar.py 的期望 K 线，全市场都缺的小时也会显式留成 NaN 行。
+#
+# 用法:
+#   python data_get/panel_store.py build data_process/output/full_market_data.parquet
+#   panel = open_panel(panel_path(DATA_FILE), "US")
+#   close = panel.frame('Close', tickers=['AAPL', 'MSFT'], start='2024-03-01')   # 宽表 DataFrame
+#   breadth = panel.breadth()                                                     # 每个时间点的活跃代码数
+
+PANEL_VERSION = 1
+DEFAULT_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+NON_FIELD_COLS = {'Datetime', 'Ticker', 'Market', 'Asset_Type'}
+# [配置] 构建时每批读取的行数
+BATCH_ROWS = 256 * 1024
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_dataset import is_partitioned, open_dataset
+from data_get.market_schema import schema_timezone
+from data_get.trading_calendar import market_grid
+
+
+def panel_path(source):
+    """长表文件 / 分区目录对应的面板目录 (<stem>_panel)"""
+    return os.path.splitext(source.rstrip(os.sep))[0] + "_panel"
+
+
+def _source_schema(source):
+    return open_dataset(source).schema if is_partitioned(source) else pq.read_schema(source)
+
+
+def _iter_batches(source, columns):
+    """按批读取长表 (单文件按行组，分区目录按片段)"""
+    if is_partitioned(source):
+        yield from open_dataset(source).to_batches(columns=columns, batch_size=BATCH_ROWS)
+    else:
+        yield from pq.ParquetFile(source).iter_batches(batch_size=BATCH_ROWS, columns=columns)
+
+
+def _market_of(batch, default_market):
+    if 'Market' in batch.schema.names:
+        return np.asarray(batch['Market'].cast(pa.string()).to_numpy(zero_copy_only=False), dtype=object)
+    return np.full(batch.num_rows, default_market, dtype=object)
+
+
+def _datetimes(batch):
+    return batch['Datetime'].cast(pa.timestamp('ns', tz='UTC')).cast(pa.int64()).to_numpy()
+
+
+def grid_ns(grid):
+    """时间轴 (DatetimeIndex / 时间戳列表，无时区视为 UTC) -> 升序 int64 UTC 纳秒"""
+    grid = pd.DatetimeIndex(grid)
+    grid = grid.tz_localize('UTC') if grid.tz is None else grid.tz_convert('UTC')
+    return np.unique(grid.asi8)
+
+
+def scan_axes(source, default_market="US"):
+    """
+    第一遍: 只读 Datetime / Ticker (/ Market / Asset_Type)，
+    返回 {市场: (时间轴并集, 代码列表, 资产类型列表)} (没有 Asset_Type 列时资产类型为空)
+    """
+    schema = _source_schema(source)
+    columns = ['Datetime', 'Ticker'] + [c for c in ('Market', 'Asset_Type') if c in schema.names]
+    times, tickers, assets = {}, {}, {}
+    for batch in _iter_batches(source, columns):
+        markets = _market_of(batch, default_market)
+        ts = _datetimes(batch)
+        codes = np.asarray(batch['Ticker'].cast(pa.string()).to_numpy(zero_copy_only=False), dtype=object)
+        kinds = (np.asarray(batch['Asset_Type'].cast(pa.string()).to_numpy(zero_copy_only=False), dtype=object)
+                 if 'Asset_Type' in batch.schema.names else None)
+        for market in np.unique(markets):
+            mask = markets == market
+            times.setdefault(market, []).append(np.unique(ts[mask]))
+            tickers.setdefault(market, set()).update(np.unique(codes[mask]).tolist())
+            assets.setdefault(market, set()).update([] if kinds is None else np.unique(kinds[mask]).tolist())
+    return {m: (np.unique(np.concatenate(times[m])), np.array(sorted(tickers[m])), sorted(assets[m])) for m in times}
+
+
+def build_panel(source, root=None, fields=None, default_market="US", grids=None, calendar=False):
+    """
+    把长表 (单文件或分区目录) 转成每个市场一个 T×N 面板目录，返回 {市场: (T, N)}。
+    fields: 要落盘的数值列 (默认 OHLCV + 全部特征列)；grids: 可选 {市场: 时间轴 (DatetimeIndex / int64 纳秒)}，
+    不在时间轴上的行会被丢弃并计数；calendar: 时间轴并上交易日历的期望 K 线 (数据里的行全部保留)。
+    """
+    root = root or panel_path(source)
+    schema = _source_schema(source)
+    tz = schema_timezone(schema)
+    if fields is None:
+        fields = [f for f in schema.names if f not in NON_FIELD_COLS and
+                  (pa.types.is_floating(schema.field(f).type) or pa.types.is_integer(schema.field(f).type))]
+    axes = {}
+    for market, (index, tickers, assets) in scan_axes(source, default_market).items():
+        if calendar:
+            expected = market_grid(market, pd.Timestamp(index[0], tz='UTC'), pd.Timestamp(index[-1], tz='UTC'),
+                                   asset_types=assets or None)
+            index = np.union1d(index, grid_ns(expected))
+        axes[market] = (index, tickers)
+    for market, grid in (grids or {}).items():
+        if market in axes:
+            axes[market] = (grid_ns(grid), axes[market][1])
+
+    tmp_root = root + ".tmp"
+    if os.path.exists(tmp_root):
+        shutil.rmtree(tmp_root)
+
+    # 预先分配内存映射文件 (NaN / False)，第二遍按批直接写入对应格子
+    stores = {}
+    for market, (index, tickers) in axes.items():
+        folder = os.path.join(tmp_root, market)
+        os.makedirs(folder)
+        shape = (len(index), len(tickers))
+        arrays = {}
+        for field in fields:
+            arrays[field] = np.lib.format.open_memmap(os.path.join(folder, f"{field}.npy"), mode='w+',
+                                                      dtype=np.float32, shape=shape)
+            arrays[field][:] = np.nan
+        valid = np.lib.format.open_memmap(os.path.join(folder, "valid.npy"), mode='w+', dtype=np.bool_, shape=shape)
+        valid[:] = False
+        stores[market] = {"index": index, "tickers": tickers, "col": {t: i for i, t in enumerate(tickers)},
+                          "arrays": arrays, "valid": valid, "dropped": 0}
+
+    columns = ['Datetime', 'Ticker'] + (['Market'] if 'Market' in schema.names else []) + fields
+    for batch in _iter_batches(source, columns):
+        markets = _market_of(batch, default_market)
+        ts = _datetimes(batch)
+        codes = np.asarray(batch['Ticker'].cast(pa.string()).to_numpy(zero_copy_only=False), dtype=object)
+        values = {f: batch[f].cast(pa.float32()).to_numpy(zero_copy_only=False) for f in fields}
+        for market in np.unique(markets):
+            store = stores[market]
+            mask = markets == market
+            rows = np.searchsorted(store["index"], ts[mask])
+            rows_clipped = np.minimum(rows, len(store["index"]) - 1)
+            on_grid = store["index"][rows_clipped] == ts[mask]
+            store["dropped"] += int((~on_grid).sum())
+            rows = rows_clipped[on_grid]
+            cols = np.array([store["col"][c] for c in codes[mask]], dtype=np.int64)[on_grid]
+            for f in fields:
+                store["arrays"][f][rows, cols] = values[f][mask][on_grid]
+            store["valid"][rows, cols] = True
+
+    shapes = {}
+    for market, store in stores.items():
+        folder = os.path.join(tmp_root, market)
+        for arr in list(store["arrays"].values()) + [store["valid"]]:
+            arr.flush()
+        np.save(os.path.join(folder, "index.npy"), store["index"])
+        np.save(os.path.join(folder, "tickers.npy"), store["tickers"].astype(str))
+        shape = (len(store["index"]), len(store["tickers"]))
+        meta = {"version": PANEL_VERSION, "market": market, "tz": tz, "fields": fields, "shape": list(shape),
+                "source": os.path.abspath(source), "dropped_rows": store["dropped"],
+                "built_at": datetime.now().isoformat(timespec="seconds")}
+        with open(os.path.join(folder, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        shapes[market] = shape
+        del store["arrays"], store["valid"]
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.replace(tmp_root, root)
+    return shapes
+
+
+def list_markets(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(m for m in os.listdir(root) if os.path.exists(os.path.join(root, m, "meta.json")))
+
+
+class Panel:
+    """一个市场的只读面板；字段数组按需 mmap 打开，不会整体读入内存"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.market = self.meta["market"]
+        self.fields = self.meta["fields"]
+        self.tz = self.meta.get("tz", "UTC")
+        self.index_ns = np.load(os.path.join(folder, "index.npy"), mmap_mode='r')
+        self.tickers = np.load(os.path.join(folder, "tickers.npy"))
+        self.col = {t: i for i, t in enumerate(self.tickers)}
+        self.index = pd.DatetimeIndex(np.asarray(self.index_ns).view('datetime64[ns]'), tz='UTC')
+        self._arrays = {}
+
+    @property
+    def shape(self):
+        return tuple(self.meta["shape"])
+
+    @property
+    def valid(self):
+        return self._load("valid")
+
+    def __getitem__(self, field):
+        if field not in self.fields:
+            raise KeyError(f"面板中没有字段 {field} (可用: {self.fields})")
+        return self._load(field)
+
+    def _load(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.folder, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def rows(self, start=None, end=None):
+        """时间区间 [start, end] 对应的行切片 (二分查找，返回 slice，切数组不复制)"""
+        def ns(ts):
+            ts = pd.Timestamp(ts)
+            ts = ts.tz_localize(self.tz) if ts.tzinfo is None else ts
+            return ts.tz_convert('UTC').value
+        lo = 0 if start is None else int(np.searchsorted(self.index_ns, ns(start), side='left'))
+        hi = len(self.index_ns) if end is None else int(np.searchsorted(self.index_ns, ns(end), side='right'))
+        return slice(lo, hi)
+
+    def cols(self, tickers=None):
+        """代码列表对应的列下标 (None = 全部)；不存在的代码跳过"""
+        if tickers is None:
+            return np.arange(len(self.tickers))
+        return np.array([self.col[t] for t in tickers if t in self.col], dtype=np.int64)
+
+    def frame(self, field, tickers=None, start=None, end=None, local_time=False):
+        """取一块宽表 DataFrame (index=时间, columns=代码)，无数据为 NaN"""
+        rows, cols = self.rows(start, end), self.cols(tickers)
+        block = self[field][rows]
+        data = block if tickers is None else block[:, cols]
+        index = self.index[rows]
+        if local_time:
+            index = index.tz_convert(self.tz)
+        return pd.DataFrame(np.asarray(data), index=index.rename('Datetime'),
+                            columns=pd.Index(self.tickers[cols], name='Ticker'))
+
+    def breadth(self, start=None, end=None):
+        """每个时间点有数据的代码数 (市场宽度)"""
+        rows = self.rows(start, end)
+        return pd.Series(np.asarray(self.valid[rows]).sum(axis=1), index=self.index[rows], name='Active')
+
+
+def open_panel(root, market=None):
+    """打开面板目录下的一个市场 (只有一个市场时可省略 market)"""
+    markets = list_markets(root)
+    if not markets:
+        raise FileNotFoundError(f"找不到面板: {root}")
+    if market is None:
+        if len(markets) > 1:
+            raise ValueError(f"面板包含多个市场 {markets}，请指定 market")
+        market = markets[0]
+    return Panel(os.path.join(root, market))
+
+
+def ensure_panel(source, fields=None, market=None):
+    """打开 source 对应的面板；面板不存在、比源文件旧或缺少所需字段时先重建"""
+    root = panel_path(source)
+    markets = list_markets(root)
+    stale = not markets or any(
+        os.path.getmtime(os.path.join(root, m, "meta.json")) < os.path.getmtime(source) for m in markets)
+    if not stale and fields:
+        stale = not set(fields) <= set(Panel(os.path.join(root, markets[0])).fields)
+    if stale:
+        build_panel(source, root, fields=fields)
+        markets = list_markets(root)
+    return open_panel(root, market if market in markets else markets[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="长表 Parquet -> T×N 内存映射面板")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="构建面板")
+    p_build.add_argument("source", help="长表 Parquet 文件或分区目录")
+    p_build.add_argument("--out", help="面板目录 (默认: <stem>_panel)")
+    p_build.add_argument("--fields", nargs="+", help="只落盘这些字段 (默认 OHLCV + 全部特征)")
+    p_build.add_argument("--market", default="US", help="长表没有 Market 列时使用的市场名")
+    p_build.add_argument("--calendar", action="store_true", help="时间轴并上交易日历的期望 K 线")
+    p_info = sub.add_parser("info", help="查看面板")
+    p_info.add_argument("root", help="面板目录")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        root = args.out or panel_path(args.source)
+        print(f"🧱 构建面板: {args.source} -> {root}")
+        for market, (t, n) in build_panel(args.source, root, args.fields, args.market,
+                                                 calendar=args.calendar).items():
+            print(f"   ✅ {market}: {t:,} 个时间点 × {n:,} 只代码")
+    else:
+        for market in list_markets(args.root):
+            panel = Panel(os.path.join(args.root, market))
+            t, n = panel.shape
+            fill = np.asarray(panel.valid).mean() if t and n else 0
+            print(f"📦 {market}: {t:,} × {n:,} | 字段 {panel.fields} | 填充率 {fill:.1%} | "
+                  f"{panel.index[0]} ~ {panel.index[-1]}")
@@ -1,6 +1,6 @@
 import os
-import shutil
-from datetime import datetime
+import sys
+from urllib.parse import quote
 
 # 配置路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,35 +9,50 @@ PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 BASE_DIR = os.path.join(PROJECT_ROOT, "us_stocks_data")
 PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.job_ledger import (JobLedger, migrate_progress_file, US_STOCK,
+                                 DONE, EMPTY, ERROR, RATE_LIMITED)
+from data_get.sinks import DATASET_SUBDIR
+
 def clean_ghost_entries():
     print("=" * 50)
-    print("🧹 开始执行进度文件清洗 (Sync Check)")
+    print("🧹 开始执行账本清洗 (Sync Check)")
     print("=" * 50)
 
-    # 1. 获取 progress.txt 中的名单
-    if not os.path.exists(PROGRESS_FILE):
-        print("❌ 未找到 progress.txt，无法执行清洗。")
+    # 1. 打开 SQLite 账本 (首次运行自动迁移 progress.txt)
+    ledger = JobLedger(US_STOCK)
+    migrate_progress_file(ledger, BASE_DIR, progress_file=PROGRESS_FILE)
+    if ledger.is_empty():
+        print("❌ 账本为空，且未找到 progress.txt，无法执行清洗。")
         return
     
-    with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-        recorded_tickers = set(line.strip() for line in f if line.strip())
-    
-    print(f"📋 progress.txt 记录数: {len(recorded_tickers)}")
+    counts = ledger.counts()
+    print(f"📋 账本记录数: {sum(counts.values())}")
 
-    # 2. 获取 us_stocks_data 文件夹里的实际 CSV 名单
+    # 2. 账本标记为 DONE 但文件已经不在的 (被手动删除/移动)
     if not os.path.exists(BASE_DIR):
         print("❌ 数据文件夹不存在。")
         return
 
-    files = os.listdir(BASE_DIR)
-    # 提取文件名中的股票代码 (假设文件名格式为 "AAPL_1h.csv")
-    actual_files = set(f.split('_1h.csv')[0] for f in files if f.endswith('.csv'))
+    actual_files = set(os.listdir(BASE_DIR))
+    dataset_dir = os.path.join(BASE_DIR, DATASET_SUBDIR)
+    actual_parts = set(os.listdir(dataset_dir)) if os.path.isdir(dataset_dir) else set()
+
+    def stored(t):
+        # CSV / Parquet / 分区数据集，任一 sink 格式落过盘都算
+        return (f"{t}_1h.csv" in actual_files or f"{t}_1h.parquet" in actual_files
+                or f"Ticker={quote(t, safe='')}" in actual_parts)
+
+    done_tickers = ledger.tickers(DONE)
+    vanished = {t for t in done_tickers if not stored(t)}
     
-    print(f"📂 实际 CSV 文件数:     {len(actual_files)}")
+    print(f"📂 DONE 记录数:         {len(done_tickers)} (其中文件丢失 {len(vanished)})")
 
-    # 3. 找出“幽灵”数据 (在 txt 里，但没 CSV 的)
-    # 这些可能是退市股，也可能是因为断网漏下的
-    ghosts = recorded_tickers - actual_files
+    # 3. 找出"幽灵"数据 (已处理但没 CSV 的)
+    # 这些可能是退市股，也可能是因为断网/限流漏下的
+    no_data = ledger.tickers(EMPTY, ERROR, RATE_LIMITED)
+    ghosts = no_data | vanished
     
     print("-" * 50)
     if not ghosts:
@@ -48,26 +63,16 @@ def clean_ghost_entries():
     print(f"   示例: {list(ghosts)[:10]} ...")
     
     # 4. 执行清洗
-    user_input = input("\n⚠️ 是否要从 progress.txt 中删除这些记录，以便重新抓取它们？(y/n): ")
+    user_input = input("\n⚠️ 是否要把这些记录重置为待抓取 (pending)，以便重新抓取它们？(y/n): ")
     
     if user_input.lower() == 'y':
-        # 备份原文件
-        backup_name = f"progress_backup_{datetime.now().strftime('%Y%m%d%H%M')}.txt"
-        shutil.copy(PROGRESS_FILE, backup_name)
-        print(f"📦 已备份原文件为: {backup_name}")
-
-        # 重写 progress.txt，只保留那些真正有 CSV 的代码
-        # 注意：这里我们选择“只保留有文件的”，这意味着那 900 多个退市股
-        # 在下次运行时会被【重新检测】。这是最安全的做法。
-        with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-            for ticker in sorted(list(actual_files)):
-                f.write(f"{ticker}\n")
-        
-        print(f"✅ 清洗完成！progress.txt 现包含 {len(actual_files)} 行。")
-        print("🚀 现在，你可以再次运行 test.py，它将重新尝试这 {len(ghosts)} 个股票。")
+        # 只改状态，尝试次数/错误信息都保留在账本里，无需备份整个文件
+        updated = ledger.reset(ghosts)
+        print(f"✅ 清洗完成！已重置 {updated} 条记录。")
+        print(f"🚀 现在，你可以再次运行 us_data_get.py，它将重新尝试这 {len(ghosts)} 个股票。")
     
     else:
-        print("🚫 操作已取消，文件未修改。")
+        print("🚫 操作已取消，账本未修改。")
 
 if __name__ == "__main__":
     clean_ghost_entries()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+from datetime import datetime
+import pyarrow.parquet as pq
+
+# ==================== 分片断点续跑 ====================
+# 全市场特征工程一次要跑几十分钟，结果原来只在内存里，中途崩溃就全部重来。
+# 分片模式下把代码按顺序切成若干分片，每个分片算完立刻落盘:
+#   <输出名>_shards/
+#       checkpoint.json     : 版本 / 构建参数 (输入文件签名、特征列等) / 每个分片的代码列表
+#       shard-00000.parquet : 已完成的分片 (先写 .tmp 再原子改名，存在即代表完整)
+# 重启时参数和分片划分都没变，就跳过已存在的分片；任何一项变了就清空目录重新开始。
+# 全部分片完成后由调用方按顺序合并成最终输出，再 clear() 删除分片目录。
+#
+# 用法:
+#   ckpt = ShardCheckpoint(shard_dir(OUTPUT_FILE), params={...}, shards=[[t1, t2], [t3, ...]])
+#   for i in ckpt.pending(): ... ckpt.commit(i, table)      # worker 里也可以直接 commit
+#   for i in range(len(ckpt.shards)): pq.read_table(ckpt.shard_path(i))
+#   ckpt.clear()
+
+CHECKPOINT_VERSION = 1
+
+
+def shard_dir(output_file):
+    """输出文件对应的分片目录 (<stem>_shards)"""
+    return os.path.splitext(output_file)[0] + "_shards"
+
+
+def shard_file(root, index):
+    return os.path.join(root, f"shard-{index:05d}.parquet")
+
+
+def write_shard(root, index, table):
+    """原子写出一个分片 (worker 进程里调用)，返回行数"""
+    path = shard_file(root, index)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression='snappy')
+    os.replace(tmp, path)
+    return table.num_rows
+
+
+class ShardCheckpoint:
+    def __init__(self, root, params, shards):
+        self.root = root
+        self.params = params
+        self.shards = [list(s) for s in shards]
+        self.path = os.path.join(root, "checkpoint.json")
+        self.resumed = self._load()
+        if not self.resumed:
+            self._reset()
+
+    def _load(self):
+        """已有检查点且版本 / 参数 / 分片划分完全一致时返回 True"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return (data.get("version") == CHECKPOINT_VERSION and data.get("params") == self.params
+                and data.get("shards") == self.shards)
+
+    def _reset(self):
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+        data = {"version": CHECKPOINT_VERSION, "params": self.params, "shards": self.shards,
+                "created_at": datetime.now().isoformat(timespec="seconds")}
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def shard_path(self, index):
+        return shard_file(self.root, index)
+
+    def done(self, index):
+        return os.path.exists(self.shard_path(index))
+
+    def pending(self):
+        return [i for i in range(len(self.shards)) if not self.done(i)]
+
+    def commit(self, index, table):
+        return write_shard(self.root, index, table)
+
+    def clear(self):
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
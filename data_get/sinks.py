@@ -0,0 +1,281 @@
+import os
+import time
+from urllib.parse import quote, unquote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from data_get.incremental import last_stored_timestamp, merge_into_csv
+
+# ==================== 落盘 Sink ====================
+# 下载脚本拿到 yfinance 的 DataFrame 后交给 sink 落盘，不同格式共用同一套接口:
+#   sink.path(ticker) / sink.exists(ticker) / sink.last_timestamp(ticker) / sink.write(ticker, df)
+#
+#   "csv"     : 原来的 CSV (可选 "yf" 两层表头布局 或 "flat" 平铺布局)
+#   "parquet" : 每只代码一个带类型的压缩 Parquet 文件 (<stem>.parquet)，增量时合并去重后原子替换
+#   "dataset" : 追加写入按 Ticker 分区的 Parquet 数据集 (<dir>/_dataset/Ticker=XXX/part-*.parquet)，
+#               每次只追加一个小文件，读取时按 Datetime 去重 (后写入的覆盖先写入的)
+#
+# Parquet 直接保存 timestamp/float64/int64，清洗脚本读取时不再需要解析字符串时间和 pd.to_numeric。
+
+SINK_FORMATS = ("csv", "parquet", "dataset")
+DATASET_SUBDIR = "_dataset"
+
+FLAT_COLS = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+PARQUET_COMPRESSION = "zstd"
+
+
+def parquet_schema(tz="UTC"):
+    """落盘 Parquet 的固定 schema (时间戳带时区，物理存储为 UTC)"""
+    return pa.schema([
+        ('Datetime', pa.timestamp('ns', tz=tz)),
+        ('Ticker', pa.string()),
+        ('Open', pa.float64()),
+        ('High', pa.float64()),
+        ('Low', pa.float64()),
+        ('Close', pa.float64()),
+        ('Volume', pa.int64()),
+    ])
+
+
+def to_flat_frame(df, ticker, tz):
+    """把 yfinance 的结果 (Datetime 索引) 转成 Datetime, Ticker, OHLCV 平铺表"""
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if df.index.tz is None:
+        df.index = df.index.tz_localize('UTC')
+    df.index = df.index.tz_convert(tz)
+    df.index.name = 'Datetime'
+    df = df.reset_index()
+    df['Ticker'] = ticker
+    for c in FLAT_COLS:
+        if c not in df.columns:
+            df[c] = None
+    return df[FLAT_COLS]
+
+
+def frame_to_table(flat, tz):
+    """平铺表 -> 带固定 schema 的 Arrow 表 (Volume 四舍五入为整数，NaN 存为 null)"""
+    flat = flat.copy()
+    flat['Datetime'] = pd.to_datetime(flat['Datetime'], utc=True).dt.tz_convert(tz)
+    # 成交量可能带小数 (复权 / 合并数据)，int64 转换会直接报错: 先四舍五入，NaN 保持为 null
+    flat['Volume'] = pd.to_numeric(flat['Volume'], errors='coerce').round().astype('Int64')
+    schema = parquet_schema(tz)
+    table = pa.Table.from_pandas(flat[FLAT_COLS], schema=schema, preserve_index=False)
+    return table.replace_schema_metadata({"source": "yfinance", "timezone": tz})
+
+
+def parquet_last_timestamp(path):
+    """从 Parquet 行组统计信息里取 Datetime 最大值 (不读数据页)；取不到返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        meta = pq.ParquetFile(path).metadata
+    except (OSError, pa.ArrowInvalid):
+        return None
+    col = meta.schema.names.index('Datetime') if 'Datetime' in meta.schema.names else None
+    if col is None:
+        return None
+    latest = None
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            # 没有统计信息就退回到读整列
+            values = pq.read_table(path, columns=['Datetime']).column('Datetime')
+            return pd.Timestamp(pc.max(values).as_py()).tz_convert('UTC') if len(values) else None
+        value = pd.Timestamp(stats.max)
+        value = value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+        latest = value if latest is None else max(latest, value)
+    return latest
+
+
+def read_ticker_parquet(path):
+    """读回单只代码的 Parquet，返回平铺表 (Datetime 为带时区的 datetime)"""
+    return pq.read_table(path).to_pandas()
+
+
+def write_parquet_atomic(table, path):
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+class CsvSink:
+    """原来的 CSV 落盘方式 (合并去重 + 原子写回)"""
+    fmt = "csv"
+
+    def __init__(self, root, tz, layout="flat", stem_fn=None):
+        self.root = root
+        self.tz = tz
+        self.layout = layout
+        self.stem_fn = stem_fn or (lambda t: f"{t}_1h")
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, ticker):
+        return os.path.join(self.root, self.stem_fn(ticker) + ".csv")
+
+    def exists(self, ticker):
+        return os.path.exists(self.path(ticker))
+
+    def size_bytes(self, ticker):
+        return os.path.getsize(self.path(ticker)) if self.exists(ticker) else 0
+
+    def last_timestamp(self, ticker):
+        return last_stored_timestamp(self.path(ticker))
+
+    def write(self, ticker, df):
+        """并入本地文件，返回 (新增行数, 总行数)；空数据不写文件"""
+        if df is None or df.empty:
+            return 0, 0
+        if self.layout == "yf":
+            # 保持与 yf.download 完全相同的 CSV 布局 (Price/Ticker 两层表头)
+            data = df.copy()
+            if isinstance(data.columns, pd.MultiIndex):
+                data.columns = data.columns.get_level_values(0)
+            if data.index.tz is None:
+                data.index = data.index.tz_localize('UTC')
+            data.index = data.index.tz_convert(self.tz)
+            data.index.name = 'Datetime'
+            price_cols = ['Close', 'High', 'Low', 'Open', 'Volume']
+            data = data[price_cols]
+            data.columns = pd.MultiIndex.from_product([price_cols, [ticker]], names=['Price', 'Ticker'])
+            return merge_into_csv(self.path(ticker), data, layout="yf")
+        return merge_into_csv(self.path(ticker), to_flat_frame(df, ticker, self.tz), layout="flat")
+
+
+class ParquetSink(CsvSink):
+    """每只代码一个 Parquet 文件"""
+    fmt = "parquet"
+
+    def path(self, ticker):
+        return os.path.join(self.root, self.stem_fn(ticker) + ".parquet")
+
+    def last_timestamp(self, ticker):
+        return parquet_last_timestamp(self.path(ticker))
+
+    def write(self, ticker, df):
+        if df is None or df.empty:
+            return 0, 0
+        fresh = to_flat_frame(df, ticker, self.tz)
+        path = self.path(ticker)
+        old_len = 0
+        if os.path.exists(path):
+            old = read_ticker_parquet(path)
+            old_len = len(old)
+            fresh = pd.concat([old, fresh], ignore_index=True)
+        fresh['Datetime'] = pd.to_datetime(fresh['Datetime'], utc=True)
+        merged = (fresh.drop_duplicates(subset=['Datetime'], keep='last')
+                  .sort_values('Datetime')
+                  .reset_index(drop=True))
+        write_parquet_atomic(frame_to_table(merged, self.tz), path)
+        return len(merged) - old_len, len(merged)
+
+
+class DatasetSink(CsvSink):
+    """按 Ticker 分区的追加式 Parquet 数据集"""
+    fmt = "dataset"
+
+    def __init__(self, root, tz, layout="flat", stem_fn=None):
+        super().__init__(os.path.join(root, DATASET_SUBDIR), tz, layout, stem_fn)
+
+    def path(self, ticker):
+        # 期货代码带 "="，分区目录名做 URI 编码 (pyarrow 读 hive 分区时会自动解码)
+        return os.path.join(self.root, f"Ticker={quote(ticker, safe='')}")
+
+    def fragments(self, ticker):
+        """该代码的所有片段文件，按写入顺序排列 (文件名是纳秒时间戳)"""
+        folder = self.path(ticker)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.parquet'))
+
+    def exists(self, ticker):
+        return bool(self.fragments(ticker))
+
+    def size_bytes(self, ticker):
+        return sum(os.path.getsize(f) for f in self.fragments(ticker))
+
+    def last_timestamp(self, ticker):
+        stamps = [parquet_last_timestamp(f) for f in self.fragments(ticker)]
+        stamps = [s for s in stamps if s is not None]
+        return max(stamps) if stamps else None
+
+    def write(self, ticker, df):
+        if df is None or df.empty:
+            return 0, 0
+        table = frame_to_table(to_flat_frame(df, ticker, self.tz), self.tz)
+        folder = self.path(ticker)
+        os.makedirs(folder, exist_ok=True)
+        write_parquet_atomic(table, os.path.join(folder, f"part-{time.time_ns():020d}.parquet"))
+        return table.num_rows, None
+
+
+def read_dataset_ticker(folder):
+    """读回数据集里一只代码的全部片段，重叠的 K 线以后写入的为准"""
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.parquet'))
+    if not files:
+        return pd.DataFrame(columns=FLAT_COLS)
+    df = pd.concat([read_ticker_parquet(f) for f in files], ignore_index=True)
+    df = df.drop_duplicates(subset=['Datetime'], keep='last')
+    return df.sort_values('Datetime').reset_index(drop=True)
+
+
+def make_sink(fmt, root, tz, layout="flat", stem_fn=None):
+    """按格式名创建 sink: "csv" | "parquet" | "dataset" """
+    sinks = {"csv": CsvSink, "parquet": ParquetSink, "dataset": DatasetSink}
+    if fmt not in sinks:
+        raise ValueError(f"未知的 sink 格式: {fmt} (可选: {', '.join(SINK_FORMATS)})")
+    return sinks[fmt](root, tz, layout=layout, stem_fn=stem_fn)
+
+
+def parquet_sources(folder):
+    """
+    列出目录下 sink 写出的 Parquet 来源，返回 {ticker: 路径} (单文件 *_1h.parquet 或 _dataset 下的分区目录)。
+    只读第一个行组的 Ticker 列，不加载数据；同一代码两种都有时以数据集为准。
+    """
+    sources = {}
+    if not os.path.isdir(folder):
+        return sources
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith('.parquet'):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            pf = pq.ParquetFile(path)
+            if pf.metadata.num_rows == 0:
+                continue
+            sources[str(pf.read_row_group(0, columns=['Ticker'])['Ticker'][0])] = path
+        except (OSError, pa.ArrowInvalid, KeyError):
+            continue
+
+    dataset_root = os.path.join(folder, DATASET_SUBDIR)
+    if os.path.isdir(dataset_root):
+        for name in sorted(os.listdir(dataset_root)):
+            part_dir = os.path.join(dataset_root, name)
+            if not name.startswith("Ticker=") or not os.path.isdir(part_dir):
+                continue
+            sources[unquote(name[len("Ticker="):])] = part_dir
+    return sources
+
+
+def read_parquet_source(path):
+    """读回 parquet_sources() 给出的一个来源 (文件或分区目录)"""
+    if os.path.isdir(path):
+        return read_dataset_ticker(path)
+    return read_ticker_parquet(path)
+
+
+def iter_parquet_frames(folder):
+    """
+    扫描目录下 sink 写出的 Parquet (单文件 *_1h.parquet + _dataset 分区)，逐只 yield (ticker, 平铺表)。
+    Ticker 取文件里的列 (与下载时的代码一致)，Datetime 已是带时区的时间戳，无需再解析。
+    """
+    for ticker, path in parquet_sources(folder).items():
+        try:
+            df = read_parquet_source(path)
+        except (OSError, pa.ArrowInvalid):
+            continue
+        if not df.empty:
+            yield ticker, df
@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# ==================== 采集遥测 (JSONL) ====================
+# 每次运行写一个 data_get/telemetry/<脚本名>_<时间>.jsonl，每行一个事件:
+#   run_start : 脚本名 / 配置 (并发数等)
+#   fetch     : 一次请求 (单只或一批) —— 延迟、返回行数、数据量、请求前等待、重试次数、状态、错误类型
+#   sleep     : 脚本主动休眠 (礼貌性随机 sleep 等)
+#   run_end   : 总耗时
+#
+# 用法:
+#   tel = Telemetry("hk_data_get", config={"workers": 1})
+#   with tel.fetch(ticker) as rec:
+#       df = ...
+#       rec.update(rows=len(df), nbytes=payload_bytes(df))
+#   tel.sleep(random.uniform(1, 2))
+#   tel.close()
+#
+# 汇总: python data_get/telemetry.py summary [文件 ...]   (默认每个脚本最近一次运行)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+TELEMETRY_DIR = os.path.join(CURRENT_DIR, "telemetry")
+
+OK = "ok"
+EMPTY = "empty"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+
+
+def payload_bytes(df):
+    """返回数据量 (内存中的字节数；yfinance 不暴露原始响应大小，用它近似)"""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+def error_class(error):
+    """异常取类名；yf.download 批量失败只给出文字信息，按内容归类"""
+    if error is None:
+        return None
+    if isinstance(error, BaseException):
+        return type(error).__name__
+    return "RateLimitMessage" if classify_error(error) == RATE_LIMITED else "ErrorMessage"
+
+
+def classify_error(error):
+    msg = str(error)
+    if type(error).__name__ == "YFRateLimitError" or "429" in msg or "Too Many Requests" in msg or "Rate limit" in msg:
+        return RATE_LIMITED
+    return ERROR
+
+
+class FetchRecord:
+    """一次请求的记录；with 块结束时写出"""
+
+    def __init__(self, telemetry, ticker):
+        self.telemetry = telemetry
+        wait = telemetry.wait_fn() if telemetry.wait_fn is not None else 0.0
+        self.fields = {"ticker": ticker, "rows": 0, "bytes": 0, "sleep_s": round(wait, 4), "retries": 0}
+        if isinstance(ticker, (list, tuple)):
+            self.fields.update(ticker=list(ticker)[0] if ticker else None, tickers=list(ticker), n=len(ticker))
+        else:
+            self.fields["n"] = 1
+        self.status = None
+        self.error = None
+
+    def update(self, rows=None, nbytes=None, sleep_s=None, retries=None, status=None, error=None, **extra):
+        if rows is not None:
+            self.fields["rows"] = int(rows)
+        if nbytes is not None:
+            self.fields["bytes"] = int(nbytes)
+        if sleep_s is not None:
+            self.fields["sleep_s"] = round(float(sleep_s), 4)
+        if retries is not None:
+            self.fields["retries"] = int(retries)
+        if status is not None:
+            self.status = status
+        if error is not None:
+            self.error = error
+        self.fields.update(extra)
+
+    def __enter__(self):
+        self.t0 = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        latency = time.monotonic() - self.t0
+        error = exc if exc is not None else self.error
+        status = self.status
+        if status is None:
+            if error is not None:
+                status = classify_error(error)
+            else:
+                status = OK if self.fields["rows"] > 0 else EMPTY
+        self.telemetry.emit("fetch", latency_s=round(latency, 4), status=status,
+                            error_class=error_class(error),
+                            error=str(error)[:200] if error is not None else None,
+                            **self.fields)
+        return False
+
+
+class Telemetry:
+    """
+    wait_fn: 可选，返回本线程这次请求发出前已等待的秒数 (如 FetchEngine.last_wait)，记入 fetch 的 sleep_s
+    enabled=False 时所有方法照常可调，但不写文件 (sleep 仍然会睡)
+    """
+
+    def __init__(self, script, config=None, path=None, enabled=True, wait_fn=None):
+        self.script = script
+        self.enabled = enabled
+        self.wait_fn = wait_fn
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.file = None
+        if enabled:
+            os.makedirs(TELEMETRY_DIR, exist_ok=True)
+            self.path = path or os.path.join(TELEMETRY_DIR, f"{script}_{datetime.now():%Y%m%d_%H%M%S}.jsonl")
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.emit("run_start", config=config or {})
+
+    def emit(self, event, **fields):
+        if self.file is None:
+            return
+        row = {"event": event, "ts": round(time.time(), 4), "script": self.script}
+        row.update(fields)
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def fetch(self, ticker):
+        return FetchRecord(self, ticker)
+
+    def sleep(self, seconds, reason="polite"):
+        """休眠并记录"""
+        if seconds > 0:
+            time.sleep(seconds)
+            self.emit("sleep", seconds=round(seconds, 4), reason=reason)
+
+    def record_sleep(self, seconds, reason):
+        """记录别处已经发生的等待 (例如节流器的退避)"""
+        if seconds > 0.001:
+            self.emit("sleep", seconds=round(seconds, 4), reason=reason)
+
+    def close(self, **fields):
+        self.emit("run_end", wall_s=round(time.monotonic() - self.started, 3), **fields)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# 不记录时的占位 (下载函数的默认参数)
+DISABLED = Telemetry("disabled", enabled=False)
+
+
+# ==================== 汇总 ====================
+
+def load_events(paths):
+    rows = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    row["file"] = os.path.basename(path)
+                    rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def latest_runs(directory=TELEMETRY_DIR):
+    """每个脚本最近一次运行的文件"""
+    latest = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        script = os.path.basename(path).rsplit("_", 2)[0]
+        latest[script] = path
+    return list(latest.values())
+
+
+def summarize_run(events):
+    """单次运行的汇总指标"""
+    fetches = events[events["event"] == "fetch"]
+    start = events[events["event"] == "run_start"]
+    end = events[events["event"] == "run_end"]
+    config = start["config"].iloc[0] if len(start) and isinstance(start["config"].iloc[0], dict) else {}
+    workers = max(int(config.get("workers", 1) or 1), 1)
+
+    if len(end) and pd.notna(end["wall_s"].iloc[0]):
+        wall = float(end["wall_s"].iloc[0])
+    else:
+        wall = float(events["ts"].max() - events["ts"].min())
+
+    # 请求前等待 (节流/令牌桶) + 脚本主动 sleep
+    sleep_total = float(fetches["sleep_s"].fillna(0).sum()) if len(fetches) else 0.0
+    if "seconds" in events:
+        sleep_total += float(events.loc[events["event"] == "sleep", "seconds"].fillna(0).sum())
+
+    lat = fetches["latency_s"].astype(float).to_numpy() if len(fetches) else np.array([])
+    tickers = int(fetches["n"].fillna(1).sum()) if len(fetches) else 0
+    status = fetches["status"].value_counts().to_dict() if len(fetches) else {}
+    errors = (fetches["error_class"].dropna().value_counts().to_dict()
+              if len(fetches) and "error_class" in fetches else {})
+
+    def pct(q):
+        return round(float(np.percentile(lat, q)) * 1000, 1) if len(lat) else None
+
+    return {
+        "file": events["file"].iloc[0],
+        "script": events["script"].iloc[0],
+        "workers": workers,
+        "requests": len(fetches),
+        "tickers": tickers,
+        "ok": status.get(OK, 0),
+        "empty": status.get(EMPTY, 0),
+        "error": status.get(ERROR, 0),
+        "rate_limited": status.get(RATE_LIMITED, 0),
+        "retries": int(fetches["retries"].fillna(0).sum()) if len(fetches) else 0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "wall_s": round(wall, 1),
+        "tickers_per_s": round(tickers / wall, 3) if wall > 0 else None,
+        "rows": int(fetches["rows"].fillna(0).sum()) if len(fetches) else 0,
+        "mb": round(float(fetches["bytes"].fillna(0).sum()) / 1024 / 1024, 2) if len(fetches) else 0.0,
+        # 并发时按 "线程 × 墙钟时间" 计算占比
+        "sleep_fraction": round(sleep_total / (wall * workers), 3) if wall > 0 else None,
+        "error_classes": errors,
+    }
+
+
+def summarize(paths):
+    events = load_events(paths)
+    if events.empty:
+        return pd.DataFrame()
+    return pd.DataFrame([summarize_run(group) for _, group in events.groupby("file", sort=False)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="采集遥测工具")
+    sub = parser.add_subparsers(dest="command")
+    summ = sub.add_parser("summary", help="汇总延迟分位数 / 吞吐量 / 休眠占比")
+    summ.add_argument("files", nargs="*", help="JSONL 文件 (默认每个脚本最近一次运行)")
+    summ.add_argument("--all", action="store_true", help="汇总 telemetry 目录下的全部运行")
+    args = parser.parse_args(sys.argv[1:] or ["summary"])
+
+    if args.files:
+        paths = args.files
+    elif args.all:
+        paths = sorted(glob.glob(os.path.join(TELEMETRY_DIR, "*.jsonl")))
+    else:
+        paths = latest_runs()
+    if not paths:
+        print(f"❌ 没有找到遥测文件: {TELEMETRY_DIR}")
+        sys.exit(1)
+
+    table = summarize(paths)
+    pd.set_option("display.width", 200)
+    print("=" * 60)
+    print("📡 采集遥测汇总")
+    print("=" * 60)
+    for _, row in table.iterrows():
+        print(f"\n[{row['script']}] {row['file']}")
+        print(f"  请求: {row['requests']} 次 / {row['tickers']} 只 | "
+              f"✅{row['ok']} 📭{row['empty']} ❌{row['error']} 🛑{row['rate_limited']} | 重试 {row['retries']}")
+        print(f"  延迟: p50 {row['p50_ms']} ms | p95 {row['p95_ms']} ms | p99 {row['p99_ms']} ms")
+        print(f"  吞吐: {row['tickers_per_s']} 只/秒 | 墙钟 {row['wall_s']} 秒 | "
+              f"{row['rows']:,} 行 / {row['mb']} MB")
+        print(f"  休眠占比: {row['sleep_fraction']:.1%} (并发 {row['workers']})")
+        if row['error_classes']:
+            print(f"  错误类型: {row['error_classes']}")
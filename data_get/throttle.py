@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from collections import deque
+
+# ==================== 自适应限流 + 熔断器 ====================
+# 所有下载脚本共用的一层节流:
+#   1. 滑动窗口统计最近 window_sec 秒的错误率
+#   2. 连续失败时按指数退避 + 全抖动 (full jitter) 等待
+#   3. 触发 429 或错误率超过阈值 -> 熔断器打开，所有 worker 一起暂停
+#   4. 冷却结束后只放行 1 个探测请求 (half-open)：成功立刻恢复全速，失败则冷却时间翻倍
+#
+# 结果可以在任意线程里记录 (例如并发引擎的主线程)：半开状态下只放行了一个请求，
+# 探测发出后记录到的第一个结果就视为探测结果。
+#
+# 用法 (顺序脚本):
+#   throttle.before_request()
+#   try:  ... 请求 ...;  throttle.record_success()
+#   except Exception as e:  throttle.record_failure(e)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_rate_limit_error(error):
+    """判断是否为限流错误 (yfinance 的 YFRateLimitError 或文本里带 429)"""
+    if type(error).__name__ == "YFRateLimitError":
+        return True
+    msg = str(error)
+    return "429" in msg or "Too Many Requests" in msg or "Rate limit" in msg
+
+
+class AdaptiveThrottle:
+    def __init__(self, window_sec=60.0, min_samples=10, error_rate_threshold=0.5,
+                 base_delay=1.0, max_delay=60.0, cooldown=15.0, max_cooldown=600.0):
+        self.window_sec = window_sec
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.initial_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.samples = deque()          # (时间戳, 是否成功)
+        self.prober = None              # 当前负责探测的线程 id
+        self.trips = 0                  # 熔断次数
+        self.sleep_time = 0.0           # 因节流累计等待的秒数
+
+        self.cond = threading.Condition()
+
+    # ---------- 统计 ----------
+    def _trim(self, now):
+        while self.samples and now - self.samples[0][0] > self.window_sec:
+            self.samples.popleft()
+
+    def error_rate(self):
+        with self.cond:
+            self._trim(time.monotonic())
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def backoff_delay(self):
+        """指数退避 + 全抖动: uniform(0, min(max_delay, base * 2^n))"""
+        if self.consecutive_failures == 0:
+            return 0.0
+        cap = min(self.max_delay, self.base_delay * (2 ** (self.consecutive_failures - 1)))
+        return random.uniform(0, cap)
+
+    # ---------- 请求前 ----------
+    def before_request(self):
+        """熔断打开时阻塞；半开状态只放行一个探测请求；连续失败时按退避等待"""
+        me = threading.get_ident()
+        waited_from = time.monotonic()
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.state == OPEN and now >= self.open_until:
+                    self.state = HALF_OPEN
+                    self.prober = None
+
+                if self.state == CLOSED:
+                    break
+                if self.state == HALF_OPEN and self.prober in (None, me):
+                    self.prober = me
+                    break
+
+                timeout = self.open_until - now if self.state == OPEN else 1.0
+                self.cond.wait(timeout=max(timeout, 0.05))
+            delay = self.backoff_delay() if self.state == CLOSED else 0.0
+
+        if delay > 0:
+            time.sleep(delay)
+        waited = time.monotonic() - waited_from
+        if waited > 0.001:
+            with self.cond:
+                self.sleep_time += waited
+        return waited
+
+    # ---------- 请求后 ----------
+    def record_success(self):
+        with self.cond:
+            now = time.monotonic()
+            self.samples.append((now, True))
+            self._trim(now)
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN and self.prober is not None:
+                # 探测成功：立即恢复
+                print("🟢 探测请求成功，解除熔断，恢复全速")
+                self.state = CLOSED
+                self.prober = None
+                self.cooldown = self.initial_cooldown
+                # 清空熔断前的错误样本，避免恢复后立刻被旧错误率再次触发
+                self.samples.clear()
+                self.samples.append((now, True))
+                self.cond.notify_all()
+
+    def record_failure(self, error=None):
+        rate_limited = error is not None and is_rate_limit_error(error)
+        with self.cond:
+            now = time.monotonic()
+            self.samples.append((now, False))
+            self._trim(now)
+            self.consecutive_failures += 1
+
+            if self.state == HALF_OPEN:
+                if self.prober is not None:
+                    # 探测失败：冷却时间翻倍
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open(now, "探测失败")
+                return
+
+            if self.state == CLOSED:
+                errors = sum(1 for _, ok in self.samples if not ok)
+                too_many = (len(self.samples) >= self.min_samples and
+                            errors / len(self.samples) >= self.error_rate_threshold)
+                if rate_limited:
+                    self._open(now, "触发 429 限流")
+                elif too_many:
+                    self._open(now, f"错误率 {errors / len(self.samples):.0%}")
+
+    def record(self, error=None):
+        """error 为 None 记成功，否则记失败"""
+        if error is None:
+            self.record_success()
+        else:
+            self.record_failure(error)
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self.prober = None
+        self.open_until = now + self.cooldown
+        self.trips += 1
+        print(f"🛑 熔断打开 ({reason})，所有线程暂停 {self.cooldown:.0f} 秒后探测...")
+        self.cond.notify_all()
+
+    def report(self):
+        return (f"节流状态: {self.state} | 熔断次数: {self.trips} | "
+                f"窗口错误率: {self.error_rate():.0%} | 累计等待: {self.sleep_time:.0f} 秒")
@@ -0,0 +1,337 @@
+import os
+import sys
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.tseries.holiday import (Holiday, GoodFriday, EasterMonday, USMartinLutherKingJr, USPresidentsDay,
+                                    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday)
+
+# ==================== 交易日历 (美股 / CME 期货 / 港股) ====================
+# 清洗脚本只对已有的行做前向填充，从来不知道“这一小时本来应该有一根 K 线”:
+# 港股午休、美股半日市、期货近 24 小时的交易时段、节假日都混在一起，缺的 K 线看不出来。
+# 这里按交易所规则生成每个市场的期望小时 K 线网格 (UTC 纳秒)，对齐 / 缺口检测 / 面板构建都变成数组连接:
+#   XNYS : 美股 (股票 / ETF)  09:30-16:00 美东，半日市 13:00 收盘
+#   CME  : 美股期货            前一日 18:00 - 当日 17:00 美东 (17:00-18:00 维护)，
+#                              美股假日 13:00 提前收盘，美股半日市 13:15 收盘，元旦 / 耶稣受难日 / 圣诞全天休市
+#   XHKG : 港股 (全部资产)     09:30-12:00 + 13:00-16:00 香港，半日市 (平安夜 / 除夕 / 农历除夕) 只有早市
+# K 线从每个时段的开盘时间起每 freq 一根，最后一根可以不满 (美股 15:30、港股 11:30 是半小时线)，与 yfinance 一致。
+#
+# 用法:
+#   grid = expected_bars("XHKG", "2024-01-01", "2024-03-31")          # DatetimeIndex (UTC)
+#   grid = market_grid("US", start, end)                                # 一个市场下全部日历的并集
+#   report = gap_report(df)                                             # 每只代码的期望 / 实际 / 缺失 K 线数
+#   python data_get/trading_calendar.py gaps data_process/output/full_market_data.parquet
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_schema import read_market
+from data_get.market_dataset import is_partitioned, open_dataset
+
+CALENDARS = {
+    "XNYS": {"tz": "America/New_York", "sessions": [("09:30", "16:00")], "half_close": "13:00"},
+    "CME":  {"tz": "America/New_York", "sessions": [("-06:00", "17:00")], "half_close": "13:15",
+             "holiday_close": "13:00"},
+    "XHKG": {"tz": "Asia/Hong_Kong", "sessions": [("09:30", "12:00"), ("13:00", "16:00")], "half_close": "12:00"},
+}
+
+# [配置] (市场, 资产类型) -> 日历；资产类型为 None 表示该市场的默认日历
+MARKET_CALENDARS = {
+    ("US", "Future"): "CME",
+    ("US", None): "XNYS",
+    ("HK", None): "XHKG",
+}
+
+# [配置] 临时休市 (国丧日、台风 / 黑雨停市等无法按规则推算的日子)，按日历登记
+EXTRA_CLOSED = {
+    "XNYS": ["2018-12-05", "2025-01-09"],
+    "CME": [],
+    "XHKG": [],
+}
+
+# [配置] 港股农历节日的公历日期 (农历新年初一、清明、佛诞、端午、中秋、重阳)。
+# 没有登记的年份只按公历规则放假，这些日子会在缺口报告里显示为缺失，需要时在这里补一行。
+HK_LUNAR_DATES = {
+    2019: ("2019-02-05", "2019-04-05", "2019-05-12", "2019-06-07", "2019-09-13", "2019-10-07"),
+    2020: ("2020-01-25", "2020-04-04", "2020-04-30", "2020-06-25", "2020-10-01", "2020-10-25"),
+    2021: ("2021-02-12", "2021-04-04", "2021-05-19", "2021-06-14", "2021-09-21", "2021-10-14"),
+    2022: ("2022-02-01", "2022-04-05", "2022-05-08", "2022-06-03", "2022-09-10", "2022-10-04"),
+    2023: ("2023-01-22", "2023-04-05", "2023-05-26", "2023-06-22", "2023-09-29", "2023-10-23"),
+    2024: ("2024-02-10", "2024-04-04", "2024-05-15", "2024-06-10", "2024-09-17", "2024-10-11"),
+    2025: ("2025-01-29", "2025-04-04", "2025-05-05", "2025-05-31", "2025-10-06", "2025-10-29"),
+    2026: ("2026-02-17", "2026-04-05", "2026-05-24", "2026-06-19", "2026-09-25", "2026-10-18"),
+    2027: ("2027-02-06", "2027-04-05", "2027-05-13", "2027-06-09", "2027-09-15", "2027-10-08"),
+}
+
+# 纽交所全天休市规则 (元旦落在周六时不补假)
+NYSE_HOLIDAYS = [
+    Holiday("New Year", month=1, day=1, observance=sunday_to_monday),
+    USMartinLutherKingJr,
+    USPresidentsDay,
+    GoodFriday,
+    USMemorialDay,
+    Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+    Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+    USLaborDay,
+    USThanksgivingDay,
+    Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+]
+# CME 全天休市的只有这三个，其余美股假日提前收盘
+CME_CLOSED_HOLIDAYS = ["New Year", "Good Friday", "Christmas"]
+
+
+def _hours(hhmm):
+    """'09:30' / '-06:00' -> 相对交易日 0 点的 Timedelta"""
+    sign = -1 if hhmm.startswith("-") else 1
+    h, m = hhmm.lstrip("-").split(":")
+    return sign * pd.Timedelta(hours=int(h), minutes=int(m))
+
+
+def _weekdays(start, end):
+    return pd.bdate_range(start, end)
+
+
+def _rule_dates(rules, start, end):
+    """pandas Holiday 规则在 [start, end] 内的日期 {名称: DatetimeIndex}"""
+    return {rule.name: rule.dates(start, end) for rule in rules}
+
+
+def _hk_holidays(years):
+    """港股全天休市日 (含补假): 节日按日期依次落位，遇到周日或与前一个假日重叠就顺延到下一个非周日"""
+    days = []
+    for year in years:
+        fixed = [f"{year}-01-01", f"{year}-05-01", f"{year}-07-01", f"{year}-10-01", f"{year}-12-25", f"{year}-12-26"]
+        easter = [GoodFriday.dates(f"{year}-01-01", f"{year}-12-31")[0],
+                  EasterMonday.dates(f"{year}-01-01", f"{year}-12-31")[0]]
+        lunar = []
+        if year in HK_LUNAR_DATES:
+            lny, ching_ming, buddha, tuen_ng, mid_autumn, chung_yeung = map(pd.Timestamp, HK_LUNAR_DATES[year])
+            lunar = [lny, lny + pd.Timedelta(days=1), lny + pd.Timedelta(days=2), ching_ming, buddha, tuen_ng,
+                     mid_autumn + pd.Timedelta(days=1), chung_yeung]
+        days.extend(pd.Timestamp(d) for d in fixed + easter + lunar)
+
+    taken = set()
+    for day in sorted(days):
+        while day.weekday() == 6 or day in taken:
+            day += pd.Timedelta(days=1)
+        taken.add(day)
+    return pd.DatetimeIndex(sorted(taken))
+
+
+def _hk_half_days(years, holidays):
+    """港股半日市: 平安夜、除夕、农历除夕 (落在工作日且不是假日)"""
+    days = []
+    for year in years:
+        days += [pd.Timestamp(f"{year}-12-24"), pd.Timestamp(f"{year}-12-31")]
+        if year in HK_LUNAR_DATES:
+            days.append(pd.Timestamp(HK_LUNAR_DATES[year][0]) - pd.Timedelta(days=1))
+    days = pd.DatetimeIndex(days)
+    return days[(days.weekday < 5) & ~days.isin(holidays)]
+
+
+def _nyse_half_days(years, holidays):
+    """美股半日市: 独立日前一天 (7/3 周一至周四)、感恩节次日、平安夜 (工作日)"""
+    days = []
+    for year in years:
+        july3 = pd.Timestamp(f"{year}-07-03")
+        if july3.weekday() < 4:
+            days.append(july3)
+        days.append(USThanksgivingDay.dates(f"{year}-01-01", f"{year}-12-31")[0] + pd.Timedelta(days=1))
+        days.append(pd.Timestamp(f"{year}-12-24"))
+    days = pd.DatetimeIndex(days)
+    return days[(days.weekday < 5) & ~days.isin(holidays)]
+
+
+@lru_cache(maxsize=64)
+def _special_days(calendar, first_year, last_year):
+    """某日历在若干整年内的 (全天休市日, 半日市, 假日提前收盘日)；按年缓存，逐只代码调用时不重复推算"""
+    years = range(first_year, last_year + 1)
+    extra = pd.DatetimeIndex(EXTRA_CLOSED.get(calendar, []))
+    early = pd.DatetimeIndex([])
+    if calendar == "XHKG":
+        holidays = _hk_holidays(years).union(extra)
+        half = _hk_half_days(years, holidays)
+    else:
+        rules = _rule_dates(NYSE_HOLIDAYS, f"{first_year}-01-01", f"{last_year}-12-31")
+        nyse = pd.DatetimeIndex(sorted(d for dates in rules.values() for d in dates)).union(extra)
+        half = _nyse_half_days(years, nyse)
+        holidays = nyse
+        if calendar == "CME":
+            holidays = pd.DatetimeIndex(sorted(d for n in CME_CLOSED_HOLIDAYS for d in rules[n]))
+            early = nyse.difference(holidays)
+    return holidays, half, early
+
+
+def session_table(calendar, start, end):
+    """
+    [start, end] 内每个交易日一行: index=交易日 (无时区日期)，列 close=当日收盘相对 0 点的 Timedelta。
+    休市日不在表里；半日市 / 假日提前收盘体现在 close 上。
+    """
+    spec = CALENDARS[calendar]
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    # 假日规则按整年算，避免跨年的补假被区间截掉
+    holidays, half, early = _special_days(calendar, start.year - 1, end.year + 1)
+    close = pd.Series(_hours(spec["sessions"][-1][1]), index=_weekdays(start, end))
+    if len(early):
+        close[close.index.isin(early)] = _hours(spec["holiday_close"])
+    close[close.index.isin(half)] = _hours(spec["half_close"])
+    close = close[~close.index.isin(holidays)]
+    return pd.DataFrame({"close": close})
+
+
+def trading_days(calendar, start, end):
+    """[start, end] 内的交易日 (无时区日期)"""
+    return session_table(calendar, start, end).index
+
+
+def _bar_offsets(calendar, freq):
+    """整天的 K 线起点 (相对交易日 0 点)，每个时段从开盘起每 freq 一根"""
+    freq = pd.Timedelta(freq)
+    offsets = []
+    for open_, close in CALENDARS[calendar]["sessions"]:
+        open_, close = _hours(open_), _hours(close)
+        n = int(np.ceil((close - open_) / freq))
+        offsets.extend(open_ + freq * k for k in range(n))
+    return pd.TimedeltaIndex(offsets)
+
+
+def expected_bars(calendar, start, end, freq="1h"):
+    """
+    [start, end] 内的期望 K 线起点 (UTC DatetimeIndex，升序)。
+    start / end 不带时区时按该交易所本地时间理解；计算是 交易日 × 时段 的广播，没有逐日循环。
+    """
+    tz = CALENDARS[calendar]["tz"]
+    start, end = _local(start, tz), _local(end, tz)
+    # 期货的交易日从前一天 18:00 开始，多取一天以覆盖 start 当晚的夜盘
+    table = session_table(calendar, start.tz_localize(None), end.tz_localize(None) + pd.Timedelta(days=1))
+    offsets = _bar_offsets(calendar, freq)
+    days = table.index.values.astype("datetime64[ns]")
+    stamps = days[:, None] + offsets.values[None, :]
+    keep = offsets.values[None, :] < table["close"].values[:, None]
+    local = pd.DatetimeIndex(stamps[keep]).tz_localize(tz, ambiguous=False, nonexistent="shift_forward")
+    grid = local.tz_convert("UTC")
+    return grid[(grid >= start) & (grid <= end)]
+
+
+def _local(ts, tz):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(tz) if ts.tzinfo is None else ts.tz_convert(tz)
+
+
+def calendar_for(market, asset_type=None):
+    """(市场, 资产类型) 对应的日历名"""
+    name = MARKET_CALENDARS.get((market, asset_type)) or MARKET_CALENDARS.get((market, None))
+    if name is None:
+        raise KeyError(f"没有为市场 {market} / {asset_type} 登记交易日历 (见 MARKET_CALENDARS)")
+    return name
+
+
+def market_grid(market, start, end, asset_types=None, freq="1h"):
+    """一个市场下若干资产类型的期望 K 线并集 (如 US 的股票 + 期货)"""
+    names = {calendar_for(market, a) for a in (asset_types or [None])}
+    grid = pd.DatetimeIndex([], tz="UTC")
+    for name in sorted(names):
+        grid = grid.union(expected_bars(name, start, end, freq))
+    return grid
+
+
+def align_to_grid(df, grid):
+    """
+    单只代码的 DataFrame (Datetime 为 UTC) 对齐到期望网格: 在首尾 K 线之间补上缺失的 K 线 (价格为空，由调用方前向填充)。
+    网格外的行原样保留。
+    """
+    if df.empty:
+        return df
+    times = df['Datetime']
+    inside = grid[(grid >= times.iloc[0]) & (grid <= times.iloc[-1])]
+    missing = inside[~inside.isin(times)]
+    if len(missing) == 0:
+        return df
+    filler = pd.DataFrame({'Datetime': missing})
+    out = pd.concat([df, filler], ignore_index=True).sort_values('Datetime', kind='stable')
+    for c in df.columns:
+        if c != 'Datetime' and not pd.api.types.is_numeric_dtype(df[c]):
+            out[c] = out[c].ffill()
+    return out.reset_index(drop=True)
+
+
+def _calendar_column(df, default):
+    """每一行对应的日历名 (有 Market / Asset_Type 列时逐行判断，否则全部用默认日历)"""
+    if 'Market' not in df.columns:
+        return pd.Series(default, index=df.index)
+    asset = df['Asset_Type'].astype(str) if 'Asset_Type' in df.columns else pd.Series(None, index=df.index)
+    pairs = pd.DataFrame({'m': df['Market'].astype(str), 'a': asset}).drop_duplicates()
+    mapping = {(m, a): calendar_for(m, a) for m, a in pairs.itertuples(index=False)}
+    keys = pd.MultiIndex.from_arrays([df['Market'].astype(str), asset])
+    return pd.Series([mapping[k] for k in keys], index=df.index)
+
+
+def gap_report(df, default_calendar="XNYS", freq="1h"):
+    """
+    每只代码的缺口统计: 首尾 K 线之间期望多少根、实际落在网格上的有多少、缺多少、网格外 (盘前盘后 / 休市日) 多少。
+    df 需要 Datetime (UTC) + Ticker (+ Market / Asset_Type)；每个日历只生成一次网格，逐行 searchsorted 定位。
+    """
+    calendars = _calendar_column(df, default_calendar)
+    reports = []
+    for name in calendars.unique():
+        part = df[calendars.values == name]
+        ts = part['Datetime'].dt.tz_convert('UTC')
+        grid = expected_bars(name, ts.min(), ts.max(), freq).as_unit('ns').asi8
+        values = ts.dt.as_unit('ns').astype('int64').values
+        pos = np.searchsorted(grid, values)
+        on_grid = (pos < len(grid)) & (grid[np.minimum(pos, len(grid) - 1)] == values)
+        frame = pd.DataFrame({'Ticker': part['Ticker'].astype(str).values, 'pos': np.where(on_grid, pos, -1),
+                              'on_grid': on_grid})
+        hits = frame[frame['on_grid']].drop_duplicates(['Ticker', 'pos'])
+        stats = hits.groupby('Ticker')['pos'].agg(['min', 'max', 'count'])
+        total = frame.groupby('Ticker').agg(rows=('on_grid', 'size'), on_grid=('on_grid', 'sum'))
+        report = total.join(stats, how='left')
+        report['expected'] = (report['max'] - report['min'] + 1).fillna(0).astype('int64')
+        report['present'] = report['count'].fillna(0).astype('int64')
+        report['missing'] = report['expected'] - report['present']
+        report['off_grid'] = report['rows'] - report['on_grid']
+        report['coverage'] = (report['present'] / report['expected'].where(report['expected'] > 0)).fillna(0.0)
+        report['calendar'] = name
+        reports.append(report[['calendar', 'rows', 'expected', 'present', 'missing', 'off_grid', 'coverage']])
+    if not reports:
+        return pd.DataFrame(columns=['calendar', 'rows', 'expected', 'present', 'missing', 'off_grid', 'coverage'])
+    return pd.concat(reports).sort_index()
+
+
+def missing_bars(times, calendar, freq="1h"):
+    """一只代码首尾之间缺失的期望 K 线 (UTC DatetimeIndex)"""
+    times = pd.DatetimeIndex(times).tz_convert('UTC')
+    if len(times) == 0:
+        return pd.DatetimeIndex([], tz="UTC")
+    grid = expected_bars(calendar, times.min(), times.max(), freq)
+    return grid[~grid.isin(times)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="交易日历: 期望 K 线网格 / 缺口检测")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_grid = sub.add_parser("grid", help="打印期望 K 线 (交易所本地时间)")
+    p_grid.add_argument("calendar", choices=sorted(CALENDARS))
+    p_grid.add_argument("start")
+    p_grid.add_argument("end")
+    p_grid.add_argument("--freq", default="1h")
+    p_gaps = sub.add_parser("gaps", help="全市场 Parquet 的缺口报告")
+    p_gaps.add_argument("file", help="长表 Parquet 文件或分区目录")
+    p_gaps.add_argument("--calendar", default="XNYS", choices=sorted(CALENDARS), help="文件里没有 Market 列时使用的日历")
+    p_gaps.add_argument("--top", type=int, default=20, help="列出缺失最多的代码数")
+    args = parser.parse_args()
+
+    if args.command == "grid":
+        grid = expected_bars(args.calendar, args.start, args.end, args.freq).tz_convert(CALENDARS[args.calendar]["tz"])
+        for day, bars in pd.Series(grid, index=grid.date).groupby(level=0):
+            print(f"{day} ({len(bars)}): " + " ".join(b.strftime('%H:%M') for b in bars))
+        print(f"📅 共 {len(grid):,} 根期望 K 线")
+    else:
+        names = open_dataset(args.file).schema.names if is_partitioned(args.file) else pq.read_schema(args.file).names
+        df = read_market(args.file, columns=[c for c in ['Datetime', 'Ticker', 'Market', 'Asset_Type'] if c in names])
+        report = gap_report(df, default_calendar=args.calendar)
+        print(f"🔍 {len(report):,} 只代码 | 期望 {report['expected'].sum():,} 根 | 缺失 {report['missing'].sum():,} 根 "
+              f"| 网格外 {report['off_grid'].sum():,} 行 | 平均覆盖率 {report['coverage'].mean():.1%}")
+        print(report.sort_values('missing', ascending=False).head(args.top).to_string())
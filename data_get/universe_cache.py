@@ -0,0 +1,238 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import pandas as pd
+import requests
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.endpoints import sec_tickers_url, hkex_list_url, us_etf_list_url, proxy_kwargs
+
+# ==================== 股票池名单缓存 ====================
+# SEC 美股代码表 / HKEX 证券名单 / 美股 ETF 名单 共用的本地缓存:
+#   1. 解析后的名单存成 Parquet 快照 (<name>.parquet)，旁边的 <name>.json 记录 ETag / Last-Modified / 抓取时间
+#   2. 快照未过期 (TTL 内) -> 直接读本地，不联网、不解析 Excel
+#   3. 过期 -> 带 If-None-Match / If-Modified-Since 发条件请求；304 只刷新抓取时间
+#   4. 网络失败 -> 退回使用旧快照 (哪怕已过期)，只有从未成功过才抛异常
+# 地址来自 endpoints.py (可用环境变量指向本地替身服务器)；地址变了旧快照作废。
+
+CACHE_DIR = os.path.join(CURRENT_DIR, "universe_cache")
+
+SEC_HEADERS = {
+    'User-Agent': 'MscProject Research (kevin_kou_student@example.com)',
+    'Accept-Encoding': 'gzip, deflate',
+    'Host': 'www.sec.gov'
+}
+
+# [配置] 各名单的有效期 (秒)，过期后才会发条件请求
+TTL = {
+    "sec_tickers": 24 * 3600,
+    "hkex_securities": 24 * 3600,
+    "us_etf_symbols": 7 * 24 * 3600,
+}
+
+
+# ==================== 通用缓存逻辑 ====================
+
+def _paths(name):
+    return os.path.join(CACHE_DIR, f"{name}.parquet"), os.path.join(CACHE_DIR, f"{name}.json")
+
+
+def load_meta(name):
+    _, meta_path = _paths(name)
+    if not os.path.exists(meta_path):
+        return {}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_meta(name, meta):
+    _, meta_path = _paths(name)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def _save_snapshot(name, df):
+    snap_path, _ = _paths(name)
+    tmp_path = snap_path + ".tmp"
+    df.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, snap_path)
+
+
+def fetch_cached(name, url, parse_fn, ttl=None, get_fn=None, force=False, **request_kwargs):
+    """
+    返回名单的 DataFrame (优先读本地快照)。
+    - parse_fn(response) -> DataFrame，只有真正下载到新内容 (200) 时才会调用
+    - get_fn(url, **kwargs) -> Response，默认 requests.get (可传入带代理的 session.get)
+    - force=True 忽略 TTL，仍然会发条件请求 (服务器没变化时照样返回 304)
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    snap_path, _ = _paths(name)
+    meta = load_meta(name)
+    ttl = TTL.get(name, 24 * 3600) if ttl is None else ttl
+    # 快照必须来自同一个地址 (切换到替身服务器/切回真实地址时不能混用)
+    has_snapshot = os.path.exists(snap_path) and meta.get("url", url) == url
+    if not has_snapshot:
+        meta = {}
+
+    # 1. TTL 内直接读快照
+    age = time.time() - meta.get("checked_at", 0)
+    if has_snapshot and not force and age < ttl:
+        return pd.read_parquet(snap_path)
+
+    # 2. 条件请求
+    headers = dict(request_kwargs.pop("headers", None) or {})
+    if has_snapshot:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    request_kwargs.setdefault("timeout", 30)
+    request_kwargs.update(proxy_kwargs(url))
+    get_fn = get_fn or requests.get
+
+    try:
+        resp = get_fn(url, headers=headers, **request_kwargs)
+        if resp.status_code == 304 and has_snapshot:
+            meta["checked_at"] = time.time()
+            _save_meta(name, meta)
+            print(f"♻️ [{name}] 服务器未更新 (304)，使用本地快照")
+            return pd.read_parquet(snap_path)
+        resp.raise_for_status()
+        df = parse_fn(resp)
+    except Exception as e:
+        if has_snapshot:
+            print(f"⚠️ [{name}] 刷新失败 ({e})，使用旧快照 (已缓存 {age / 3600:.1f} 小时)")
+            return pd.read_parquet(snap_path)
+        raise
+
+    _save_snapshot(name, df)
+    _save_meta(name, {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+        "checked_at": time.time(),
+        "rows": len(df),
+    })
+    print(f"💾 [{name}] 已下载并缓存 {len(df)} 行")
+    return df
+
+
+# ==================== 各名单的解析 ====================
+
+def _parse_sec(resp):
+    data = resp.json()
+    df = pd.DataFrame(list(data.values()))
+    df['ticker'] = df['ticker'].astype(str)
+    df['title'] = df['title'].astype(str)
+    return df[['cik_str', 'ticker', 'title']]
+
+
+def _parse_hkex(resp):
+    """HKEX 名单前两行是说明，第 3 行才是表头；偶尔返回的其实是 CSV"""
+    try:
+        df = pd.read_excel(io.BytesIO(resp.content), header=2, engine='openpyxl')
+    except Exception:
+        df = pd.read_csv(io.BytesIO(resp.content), header=2)
+    if 'Stock Code' not in df.columns or 'Category' not in df.columns:
+        raise ValueError(f"官方名单格式有变，列名: {df.columns.tolist()}")
+    # Excel 里混着数字和文本，统一存成字符串，Parquet 才能写入
+    df = df.dropna(subset=['Stock Code']).astype(str)
+    df.columns = [str(c) for c in df.columns]
+    return df.reset_index(drop=True)
+
+
+def _parse_etf(resp):
+    df = pd.read_csv(io.StringIO(resp.text))
+    return df[['symbol']].dropna().astype(str)
+
+
+def load_sec_frame(session=None, force=False):
+    """SEC 代码表 (cik_str, ticker, title)。SEC 返回 403 时换一种 SSL 验证方式再试一次"""
+    http = session or requests
+
+    def get_fn(url, **kwargs):
+        resp = http.get(url, **kwargs)
+        if resp.status_code == 403:
+            print("警告: SEC 返回 403，尝试切换 SSL 验证模式...")
+            kwargs["verify"] = True
+            resp = http.get(url, **kwargs)
+        return resp
+
+    return fetch_cached("sec_tickers", sec_tickers_url(), _parse_sec, get_fn=get_fn,
+                        force=force, headers=SEC_HEADERS)
+
+
+def load_hkex_frame(force=False):
+    """HKEX 全部证券名单 (所有列均为字符串)"""
+    return fetch_cached("hkex_securities", hkex_list_url(), _parse_hkex, verify=False, force=force)
+
+
+# ==================== 对外接口 ====================
+
+def get_sec_tickers(session=None, force=False):
+    """SEC 全量美股代码 (排序去重后的列表)"""
+    df = load_sec_frame(session=session, force=force)
+    return sorted(set(df['ticker']))
+
+
+def hk_codes(df, category):
+    """从 HKEX 名单里取出某个 Category 的代码，格式化为 0001.HK"""
+    codes = df.loc[df['Category'] == category, 'Stock Code'].str.extract(r'(\d+)')[0].dropna()
+    return (codes.str.zfill(4) + ".HK").unique().tolist()
+
+
+def get_hk_equity_tickers(force=False):
+    """HKEX 正股 (Category == 'Equity')"""
+    return hk_codes(load_hkex_frame(force=force), 'Equity')
+
+
+def get_us_etf_symbols(force=False):
+    df = fetch_cached("us_etf_symbols", us_etf_list_url(), _parse_etf, force=force)
+    return df['symbol'].unique().tolist()
+
+
+def cache_status():
+    """每个名单的缓存状态: 行数 / 缓存时长 / ETag"""
+    rows = []
+    for name in TTL:
+        meta = load_meta(name)
+        snap_path, _ = _paths(name)
+        rows.append({
+            "name": name,
+            "rows": meta.get("rows"),
+            "age_h": round((time.time() - meta["checked_at"]) / 3600, 1) if "checked_at" in meta else None,
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+            "cached": os.path.exists(snap_path),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="股票池名单缓存")
+    parser.add_argument("--refresh", action="store_true", help="忽略 TTL，向服务器发条件请求刷新所有名单")
+    args = parser.parse_args()
+
+    if args.refresh:
+        for loader in (load_sec_frame, load_hkex_frame):
+            try:
+                loader(force=True)
+            except Exception as e:
+                print(f"❌ 刷新失败: {e}")
+        try:
+            get_us_etf_symbols(force=True)
+        except Exception as e:
+            print(f"❌ 刷新失败: {e}")
+    print(cache_status().to_string(index=False))
@@ -1,9 +1,9 @@
-import yfinance as yf
-import pandas as pd
 import time
 import os
+import sys
+import argparse
+from functools import partial
 import requests
-import random
 import urllib3
 from datetime import datetime
 
@@ -15,13 +15,49 @@ PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 
 # 动态定位到根目录下的 us_stocks_data
 BASE_DIR = os.path.join(PROJECT_ROOT, "us_stocks_data")
-# progress.txt 就在当前 data_get 文件夹里
+# progress.txt 就在当前 data_get 文件夹里 (旧版进度文件，仅用于首次迁移到 SQLite 账本)
 PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
 LOG_FILE = os.path.join(CURRENT_DIR, "scrape_log.txt")
 REPORT_INTERVAL = 50
 # [配置] 代理地址 (保持你的 10808 端口)
 PROXY_URL = 'http://127.0.0.1:10808'
 
+# [配置] 并发抓取 (可用命令行 --workers / --rate / --batch-size 覆盖)
+MAX_WORKERS = 4          # 同时在途的下载线程数
+RATE_PER_SEC = 2.0       # 全局令牌桶速率 (请求/秒)
+BURST = 4                # 令牌桶突发容量
+HOST_BUDGETS = {
+    # Yahoo 图表接口的单 Host 预算
+    "query2.finance.yahoo.com": {"rate": 2.0, "burst": 4, "max_in_flight": 4},
+}
+# [配置] 批量模式：每次 yf.download 的代码数 (1 = 单只模式，默认)。Yahoo 没有多代码图表接口，
+#        yf.download 内部仍是逐只请求，批量省不了请求数；且批次在 _DOWNLOAD_LOCK 下串行，
+#        benchmark/bench_acquisition.py 里吞吐量低于单只并发模式，所以只作为 --batch-size 的可选项
+BATCH_SIZE = 1
+# [配置] 落盘格式: "csv" (原布局) | "parquet" (每只一个带类型的 Parquet) | "dataset" (按代码分区追加)
+SINK_FORMAT = "csv"
+# [配置] 自适应节流：429 或错误率过高时熔断，冷却后单个探测请求成功即恢复
+THROTTLE_CONFIG = {
+    "window_sec": 60,            # 错误率统计窗口 (秒)
+    "min_samples": 10,           # 窗口内至少这么多样本才按错误率熔断
+    "error_rate_threshold": 0.5, # 错误率阈值
+    "base_delay": 1.0,           # 连续失败时的退避基数 (秒)
+    "max_delay": 60,             # 单次退避上限 (秒)
+    "cooldown": 15,              # 首次熔断冷却时间 (秒)，探测失败则翻倍
+    "max_cooldown": 600,         # 冷却时间上限 (秒)
+}
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.fetch_engine import FetchEngine, YAHOO_HOST
+from data_get.throttle import AdaptiveThrottle
+from data_get.batch_fetch import fetch_resilient, fetch_single, is_rate_limit_message
+from data_get.incremental import refresh_start
+from data_get.sinks import make_sink, SINK_FORMATS
+from data_get.universe_cache import get_sec_tickers as fetch_sec_tickers
+from data_get.job_ledger import JobLedger, migrate_progress_file, US_STOCK, DONE, EMPTY, ERROR, RATE_LIMITED
+from data_get.telemetry import Telemetry, DISABLED, payload_bytes
+
 # ==================== 2. 网络环境初始化 ====================
 # 忽略 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -36,11 +72,6 @@ sec_session = requests.Session()
 # 显式给 SEC Session 设置代理，确保万无一失
 sec_session.proxies = {'http': PROXY_URL, 'https': PROXY_URL}
 sec_session.verify = False 
-SEC_HEADERS = {
-    'User-Agent': 'MscProject Research (kevin_kou_student@example.com)',
-    'Accept-Encoding': 'gzip, deflate',
-    'Host': 'www.sec.gov'
-}
 
 # ==================== 3. 核心功能函数 ====================
 
@@ -50,21 +81,11 @@ def init_workspace():
     print(f"工作目录已就绪: {os.path.abspath(BASE_DIR)}")
 
 def get_sec_tickers():
-    """从 SEC 获取全量美股代码"""
-    url = "https://www.sec.gov/files/company_tickers.json"
-    print(f"正在连接 SEC 官网获取股票名单 (代理: {PROXY_URL})...")
+    """从 SEC 获取全量美股代码 (本地 Parquet 快照 + ETag 条件请求，见 universe_cache.py)"""
+    print(f"正在读取 SEC 股票名单 (代理: {PROXY_URL})...")
     
     try:
-        response = sec_session.get(url, headers=SEC_HEADERS, timeout=30)
-        
-        if response.status_code == 403:
-            print("警告: SEC 返回 403，尝试切换 SSL 验证模式...")
-            response = sec_session.get(url, headers=SEC_HEADERS, timeout=30, verify=True)
-
-        response.raise_for_status()
-        
-        data = response.json()
-        tickers = sorted(list(set([item['ticker'] for item in data.values()])))
+        tickers = fetch_sec_tickers(session=sec_session)
         print(f"✅ 成功获取 {len(tickers)} 只美股代码！")
         return tickers
 
@@ -73,83 +94,169 @@ def get_sec_tickers():
         print("启动备用方案：仅测试核心科技股...")
         return ["AAPL", "NVDA", "TSLA", "MSFT", "AMZN", "GOOGL", "META"]
 
-def load_progress():
-    if os.path.exists(PROGRESS_FILE):
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            return set(line.strip() for line in f)
-    return set()
+def load_progress(ledger):
+    """从 SQLite 账本读取已处理 (有数据/空数据) 的代码；首次运行自动迁移 progress.txt"""
+    migrate_progress_file(ledger, BASE_DIR, progress_file=PROGRESS_FILE)
+    return ledger.processed_tickers()
+
+def save_progress(ledger, sink, ticker, duration):
+    """记录成功的一次抓取：有文件记 DONE (含最后 K 线/文件大小)，否则记 EMPTY"""
+    if sink.exists(ticker):
+        ledger.record(ticker, DONE,
+                      last_bar=sink.last_timestamp(ticker),
+                      size_bytes=sink.size_bytes(ticker),
+                      duration=duration)
+    else:
+        ledger.record(ticker, EMPTY, duration=duration)
+
+def save_failure(ledger, ticker, err, duration):
+    status = RATE_LIMITED if is_rate_limit_message(err) else ERROR
+    ledger.record(ticker, status, duration=duration, error=err)
+
+def get_sink(fmt=SINK_FORMAT):
+    """统一转为纽约时间落盘；CSV 保持与 yf.download 相同的两层表头布局"""
+    return make_sink(fmt, BASE_DIR, "America/New_York", layout="yf")
+
+def save_ticker_data(sink, ticker, data):
+    """并入本地文件 (去重 + 原子写回)，返回新增行数 (空数据不写文件)"""
+    added, _ = sink.write(ticker, data)
+    return added
 
-def save_progress(ticker):
-    with open(PROGRESS_FILE, 'a', encoding='utf-8') as f:
-        f.write(f"{ticker}\n")
+def refresh_start_for(sink, ticker):
+    """增量起点：本地最后一根 K 线往前留一点重叠；没有本地文件返回 None (全量)"""
+    return refresh_start(sink.last_timestamp(ticker))
 
-def run_scraper():
+def download_ticker(ticker, sink, refresh=False, telemetry=DISABLED):
+    """
+    单只模式：用 Ticker.history(raise_errors=True) 代替 yf.download
+    - yf.download 在旧版 yfinance 里用模块级全局变量收集结果，多线程同时调用会互相覆盖
+    - raise_errors=True 时 429 等错误会直接抛出，而不是被吞掉只打印
+    """
+    t0 = time.monotonic()
+    start = refresh_start_for(sink, ticker) if refresh else None
+    with telemetry.fetch(ticker) as rec:
+        data = fetch_single(ticker, period="730d", interval="1h", auto_adjust=True, start=start)
+        rec.update(rows=len(data), nbytes=payload_bytes(data))
+    rows = save_ticker_data(sink, ticker, data)
+    return [(ticker, rows, None, time.monotonic() - t0)]
+
+def download_ticker_batch(batch, sink, refresh=False, telemetry=DISABLED):
+    """批量模式：一次 yf.download 多只，失败成员自动拆成更小的批次重试"""
+    t0 = time.monotonic()
+    start = None
+    if refresh:
+        # 同一批共用最早的起点；有任何一只没有本地文件就整批全量
+        starts = [refresh_start_for(sink, t) for t in batch]
+        start = None if any(s is None for s in starts) else min(starts)
+
+    stats = {}
+    with telemetry.fetch(batch) as rec:
+        results, errors = fetch_resilient(
+            batch,
+            batch_size=len(batch),
+            period="730d",
+            interval="1h",
+            auto_adjust=True,
+            start=start,
+            stats=stats
+        )
+        rows = sum(len(df) for df in results.values())
+        rec.update(rows=rows, nbytes=sum(payload_bytes(df) for df in results.values()),
+                   retries=stats.get("retries", 0), failed=len(errors),
+                   error=next(iter(errors.values())) if errors else None,
+                   status="ok" if rows else None)
+    saved = [(t, save_ticker_data(sink, t, df)) for t, df in results.items()]
+    # 批内耗时平摊到每只代码
+    per_ticker = (time.monotonic() - t0) / max(1, len(batch))
+    outcomes = [(t, rows, None, per_ticker) for t, rows in saved]
+    outcomes += [(t, None, e, per_ticker) for t, e in errors.items()]
+    return outcomes
+
+def run_scraper(max_workers=MAX_WORKERS, rate_per_sec=RATE_PER_SEC, batch_size=BATCH_SIZE, refresh=False,
+                sink_format=SINK_FORMAT, telemetry=True):
     init_workspace()
+    sink = get_sink(sink_format)
     
     # 1. 获取名单
     all_tickers = get_sec_tickers()
 
-    # 2. 计算剩余任务
-    finished_tickers = load_progress()
-    remaining_tickers = [t for t in all_tickers if t not in finished_tickers]
+    # 2. 计算剩余任务 (SQLite 账本)
+    ledger = JobLedger(US_STOCK)
+    finished_tickers = load_progress(ledger)
+    if refresh:
+        # 增量刷新：已有 CSV 的股票只补最新的几根 K 线，未处理过的照常全量下载
+        remaining_tickers = [t for t in all_tickers
+                             if t not in finished_tickers or sink.exists(t)]
+    else:
+        remaining_tickers = [t for t in all_tickers if t not in finished_tickers]
     
     total = len(all_tickers)
     done_count = len(finished_tickers)
     
     print("=" * 60)
     print(f"🚀 任务启动 | 总数: {total} | 待处理: {len(remaining_tickers)}")
+    print(f"⚙️ 并发: {max_workers} 线程 | 限速: {rate_per_sec} req/s | 批大小: {batch_size} | 增量刷新: {refresh} | 落盘: {sink.fmt}")
     print("=" * 60)
 
-    start_time = time.time()
+    engine = FetchEngine(
+        max_workers=max_workers,
+        rate_per_sec=rate_per_sec,
+        burst=BURST,
+        host_budgets=HOST_BUDGETS,
+        throttle=AdaptiveThrottle(**THROTTLE_CONFIG)
+    )
     session_done = 0
+    # 遥测: 每次请求的延迟/行数/等待/重试写入 data_get/telemetry/*.jsonl (汇总: python data_get/telemetry.py summary)
+    tel = Telemetry("us_data_get", enabled=telemetry, wait_fn=engine.last_wait,
+                    config={"workers": max_workers, "rate": rate_per_sec, "batch_size": batch_size,
+                            "refresh": refresh, "sink": sink.fmt})
+
+    # 批量模式下每个任务是一批代码，消耗的令牌数 = 批内代码数 (yfinance 内部仍按代码逐个请求图表接口)
+    if batch_size > 1:
+        items = [remaining_tickers[i:i + batch_size] for i in range(0, len(remaining_tickers), batch_size)]
+        fetch_fn, cost_fn = partial(download_ticker_batch, sink=sink, refresh=refresh, telemetry=tel), len
+    else:
+        items = remaining_tickers
+        fetch_fn, cost_fn = partial(download_ticker, sink=sink, refresh=refresh, telemetry=tel), None
 
-    # 3. 开始循环抓取
-    for ticker in remaining_tickers:
-        try:
-            # =================================================================
-            # 最终修复：
-            # 1. 移除 proxy 参数 (解决 unexpected keyword argument 'proxy' 报错)
-            # 2. 移除 session 参数 (解决 curl_cffi 报错)
-            # 3. 依赖 os.environ 全局代理设置
-            # =================================================================
-            data = yf.download(
-                ticker, 
-                interval="1h", 
-                period="730d", 
-                auto_adjust=True, 
-                progress=False
-            )
-            
-            if not data.empty:
-                # 统一转为纽约时间
-                data.index = data.index.tz_convert('America/New_York')
-                file_path = os.path.join(BASE_DIR, f"{ticker}_1h.csv")
-                data.to_csv(file_path)
-            
-            # 标记为完成
-            save_progress(ticker)
+    # 3. 并发抓取 (结果在主线程按完成顺序返回)
+    for item, outcomes, error in engine.run(items, fetch_fn, host=YAHOO_HOST, cost_fn=cost_fn):
+        if error is not None:
+            members = item if isinstance(item, list) else [item]
+            outcomes = [(t, None, error, None) for t in members]
+
+        for ticker, rows, err, duration in outcomes:
+            # 每个结果都喂给节流器：429 立即熔断，其他错误按窗口错误率判断
+            engine.throttle.record(err)
+            if err is not None:
+                err_msg = str(err)
+                print(f"⚠️ {ticker} 失败: {err_msg}")
+                save_failure(ledger, ticker, err_msg, duration)
+                continue
+
+            # 标记为完成 (空数据也算处理过)
+            save_progress(ledger, sink, ticker, duration)
             session_done += 1
 
             # --- 定时报告 ---
             if session_done % REPORT_INTERVAL == 0:
                 cur_total_done = done_count + session_done
                 percent = (cur_total_done / total) * 100
-                elapsed_min = (time.time() - start_time) / 60
-                print(f"📊 [报告] 进度: {percent:.2f}% | 本次耗时: {elapsed_min:.1f}分")
-
-            # 随机休眠
-            time.sleep(random.uniform(1.0, 2.0))
-
-        except Exception as e:
-            err_msg = str(e)
-            print(f"⚠️ {ticker} 失败: {err_msg}")
-            
-            if "429" in err_msg:
-                print("🛑 触发频率限制，强制休息 10 分钟...")
-                time.sleep(600)
-            continue
+                print(f"📊 [报告] 进度: {percent:.2f}% | {engine.report()}")
 
-    print("\n🎉 所有任务执行完毕！")
+    tel.close(requests=engine.requests, wait_s=round(engine.wait_time, 2))
+    print(f"\n📈 {engine.report()}")
+    print(f"📒 账本状态: {ledger.counts()}")
+    print("🎉 所有任务执行完毕！")
 
 if __name__ == "__main__":
-    run_scraper()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SEC 全量美股 1h 数据抓取")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="并发线程数")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SEC, help="全局限速 (请求/秒)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每次 yf.download 的代码数 (1 = 单只模式)")
+    parser.add_argument("--refresh", action="store_true", help="增量刷新已有文件 (只下载最后一根 K 线之后的数据)")
+    parser.add_argument("--sink", choices=SINK_FORMATS, default=SINK_FORMAT, help="落盘格式")
+    parser.add_argument("--no-telemetry", action="store_true", help="不写遥测 JSONL")
+    args = parser.parse_args()
+    run_scraper(max_workers=args.workers, rate_per_sec=args.rate, batch_size=args.batch_size, refresh=args.refresh,
+                sink_format=args.sink, telemetry=not args.no_telemetry)
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import sys
 import argparse
 from datetime import datetime, time
 import pytz
@@ -8,22 +9,48 @@ import pytz
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_script_dir)
 
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_get.market_schema import read_market
+from data_get.market_dataset import is_partitioned, market_filter
+from data_process.lazy_features import lazy_features, RAW_FILE
+
 # 输入文件：特征数据库
 DATA_FILE = os.path.join(project_root, "data_process", "output", "engineered_features_final.parquet")
 # 输出目录：严格指定为 data_process/output
 EXPORT_DIR = os.path.join(project_root, "data_process", "output")
+# [配置] 按需计算模式: 不读特征库，直接从原始 OHLCV (RAW_FILE) 现算指定指标 (可用 --lazy 打开，见 data_process/lazy_features.py)
+LAZY = False
 
 if not os.path.exists(EXPORT_DIR):
     os.makedirs(EXPORT_DIR)
 
 # ==================== 2. 核心查询类 (Pro版) ====================
 class USStockQueryTool:
-    def __init__(self, file_path):
+    def __init__(self, file_path, lazy=LAZY, raw_file=RAW_FILE):
+        self.lazy = lazy
+        self.raw_file = raw_file
+        if lazy:
+            # 按需计算: 查询时只读该代码的 OHLCV 切片 + 预热期
+            if not os.path.exists(raw_file):
+                raise FileNotFoundError(f"找不到原始数据: {raw_file}")
+            print(f"📂 [美股精细化查询] 按需计算模式，原始数据: {raw_file}")
+            self.path, self.df = raw_file, None
+            return
+
         print(f"📂 [美股精细化查询] 正在加载数据库: {file_path} ...")
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到特征数据库: {file_path}")
         
-        self.df = pd.read_parquet(file_path)
+        self.path = file_path
+        self.df = None
+        if is_partitioned(file_path):
+            # Hive 分区目录: 不整体加载，查询时按代码/时间下推过滤
+            print("✅ 分区数据集模式：按需读取。")
+            return
+
+        # 统一紧凑类型读取 (float32 / category)，内存不到原来的一半
+        self.df = read_market(file_path)
         print(f"✅ 数据库加载完成！共 {len(self.df):,} 条记录。")
         
         # 强制转换为美东时间
@@ -32,6 +59,23 @@ class USStockQueryTool:
         else:
              self.df['Datetime'] = self.df['Datetime'].dt.tz_convert('America/New_York')
 
+    def load_ticker(self, ticker, start=None, end=None):
+        """取一只代码的数据 (美东时间)；分区目录只读该代码所在的桶和月份"""
+        if self.df is not None:
+            return self.df[self.df['Ticker'] == ticker].copy()
+        df = read_market(self.path, filters=market_filter(tickers=[ticker], start=start, end=end))
+        df['Datetime'] = df['Datetime'].dt.tz_convert('America/New_York')
+        return df
+
+    def load_lazy(self, ticker, start, end, features=None):
+        """从原始 OHLCV 现算一只代码在 [start, end] 内的指标 (美东时间)，自动多读所需的预热 K 线"""
+        df = lazy_features(self.raw_file, ticker, start, end, features)
+        df['Datetime'] = df['Datetime'].dt.tz_convert('America/New_York')
+        needed = df.attrs['needed']
+        print(f"   🧮 按需计算 {len(features) if features else '全套'} 个指标 | 预热 K 线: {df.attrs['warmup']}"
+              + (" (含累计型指标，读取全部历史)" if needed is None else f" / 需要 {needed}"))
+        return df
+
     def parse_input_time(self, date_str, is_end_time=False):
         """
         智能解析时间字符串。
@@ -71,7 +115,7 @@ class USStockQueryTool:
 
         return None, False
 
-    def query(self, ticker, start_str, end_str):
+    def query(self, ticker, start_str, end_str, features=None):
         ticker = ticker.strip().upper()
         if ticker == "VIX": ticker = "^VIX"
 
@@ -88,8 +132,15 @@ class USStockQueryTool:
         if is_default_start and is_default_end:
             print("   ℹ️ (已自动应用美股交易时段: 09:30 - 16:00)")
 
-        # 2. 筛选数据
-        stock_df = self.df[self.df['Ticker'] == ticker].copy()
+        # 2. 筛选数据 (按需计算模式: 只读区间 + 预热期的原始数据并现算指标)
+        if self.lazy or features:
+            try:
+                stock_df = self.load_lazy(ticker, start_date, end_date, features)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return
+        else:
+            stock_df = self.load_ticker(ticker, start_date, end_date)
         if stock_df.empty:
             print(f"❌ 数据库中没有 {ticker} 的记录。")
             return
@@ -107,7 +158,7 @@ class USStockQueryTool:
         print("="*80)
         
         base_cols = ['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume']
-        tech_cols = [c for c in result_df.columns if c not in base_cols and c != 'Ticker']
+        tech_cols = [c for c in result_df.columns if c not in base_cols and c not in ('Ticker', 'Market', 'Asset_Type')]
         
         # 检查 NaN
         nan_cols = result_df[tech_cols].isnull().sum()
@@ -136,7 +187,11 @@ class USStockQueryTool:
 
 # ==================== 3. 交互入口 ====================
 if __name__ == "__main__":
-    tool = USStockQueryTool(DATA_FILE)
+    parser = argparse.ArgumentParser(description="美股指标精细查询器")
+    parser.add_argument("--lazy", action="store_true", default=LAZY, help="按需计算模式: 从原始 OHLCV 现算指标")
+    parser.add_argument("--raw", default=RAW_FILE, help="按需计算模式的原始数据 (Parquet 或 Hive 分区目录)")
+    args = parser.parse_args()
+    tool = USStockQueryTool(DATA_FILE, lazy=args.lazy, raw_file=args.raw)
     
     while True:
         print("\n" + "-"*50)
@@ -150,5 +205,8 @@ if __name__ == "__main__":
             
         start = input("开始时间: ").strip()
         end = input("结束时间: ").strip()
+        features = None
+        if tool.lazy:
+            features = input("指标 (空格分隔，如 RSI_7 SMA_200；回车=全套): ").split() or None
         
-        tool.query(ticker, start, end)
\ No newline at end of file
+        tool.query(ticker, start, end, features=features)
\ No newline at end of file
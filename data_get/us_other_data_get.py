@@ -1,10 +1,8 @@
-import yfinance as yf
 import pandas as pd
 import os
+import sys
 import time
 import random
-import requests
-import io
 from tqdm import tqdm
 
 # ==================== 1. 配置区域 ====================
@@ -27,9 +25,29 @@ for d in DIRS.values():
 # [新增] 失败日志文件
 FAILED_LOG_FILE = os.path.join(CURRENT_DIR, "us_mining_failed.csv")
 
-# 进度文件 (用于去重)
+# 旧版进度文件 (仅用于首次迁移到 SQLite 账本)
 PROGRESS_FILE = os.path.join(CURRENT_DIR, "progress.txt")
 
+# [配置] 批量模式：每次 yf.download 的代码数 (1 = 逐只下载)
+BATCH_SIZE = 25
+# [配置] 落盘格式: "csv" | "parquet" | "dataset" (见 data_get/sinks.py)
+SINK_FORMAT = "csv"
+# [配置] 采集遥测 (data_get/telemetry/*.jsonl，汇总: python data_get/telemetry.py summary)
+TELEMETRY = True
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.batch_fetch import fetch_resilient, is_rate_limit_message
+from data_get.throttle import AdaptiveThrottle
+from data_get.sinks import make_sink
+from data_get.universe_cache import get_us_etf_symbols
+from data_get.telemetry import Telemetry, DISABLED, payload_bytes
+from data_get.job_ledger import (JobLedger, migrate_progress_file, US_STOCK, US_ETF, US_FUTURE,
+                                 DONE, EMPTY, ERROR, RATE_LIMITED)
+
+# 自适应节流 (429 / 错误率过高时熔断，冷却后探测恢复)
+throttle = AdaptiveThrottle()
+
 # ==================== 2. 环境初始化 ====================
 os.environ['HTTP_PROXY'] = PROXY_URL
 os.environ['HTTPS_PROXY'] = PROXY_URL
@@ -37,23 +55,20 @@ os.environ['HTTPS_PROXY'] = PROXY_URL
 # ==================== 3. 获取目标清单 ====================
 
 def get_existing_tickers():
-    if not os.path.exists(PROGRESS_FILE):
-        return set()
-    with open(PROGRESS_FILE, 'r') as f:
-        existing = {line.strip() for line in f if line.strip()}
-    print(f"📋 现有库存(Progress): {len(existing)} 只")
+    """个股抓取时已经处理过的代码 (有数据/空数据)，避免 ETF 名单里重复下载"""
+    stock_ledger = JobLedger(US_STOCK)
+    migrate_progress_file(stock_ledger, US_DATA_ROOT, progress_file=PROGRESS_FILE)
+    existing = stock_ledger.processed_tickers()
+    print(f"📋 现有库存(账本): {len(existing)} 只")
     return existing
 
 def get_us_etf_list():
     print("\n📡 正在获取美股 ETF 名单...")
-    url = "https://raw.githubusercontent.com/rreichel3/US-Stock-Symbols/main/etf/etf_symbols_list.csv"
     try:
-        resp = requests.get(url, timeout=30)
-        if resp.status_code == 200:
-            df = pd.read_csv(io.StringIO(resp.text))
-            tickers = df['symbol'].dropna().unique().tolist()
-            print(f"✅ 获取成功: {len(tickers)} 只")
-            return tickers
+        # 本地缓存 + 条件请求 (见 universe_cache.py)
+        tickers = get_us_etf_symbols()
+        print(f"✅ 获取成功: {len(tickers)} 只")
+        return tickers
     except Exception as e:
         print(f"❌ 获取失败: {e}")
     
@@ -73,14 +88,28 @@ def get_futures_list():
 
 # ==================== 4. 下载核心逻辑 (带日志) ====================
 
-def download_batch(category_name, tickers, save_dir, existing_set):
-    # 过滤逻辑
+def ticker_stem(ticker):
+    # 期货文件名特殊处理 (= -> _)
+    return ticker.replace('=', '_') + "_1h"
+
+def get_sink(save_dir):
+    return make_sink(SINK_FORMAT, save_dir, 'America/New_York', stem_fn=ticker_stem)
+
+def save_ticker_frame(df, ticker, sink):
+    """处理并保存单只代码 (统一转为纽约时间)，成功返回 True"""
+    if df.dropna(how='all').empty:
+        return False
+    sink.write(ticker, df)
+    return True
+
+def download_batch(category_name, tickers, save_dir, existing_set, ledger, telemetry=DISABLED):
+    sink = get_sink(save_dir)
+    # 过滤逻辑 (本类别账本里已处理过的也跳过)
+    done_set = ledger.processed_tickers()
     targets = []
     for t in tickers:
-        if t in existing_set: continue
-        # 期货文件名特殊处理 (= -> _)
-        fname = t.replace('=', '_') + "_1h.csv"
-        if os.path.exists(os.path.join(save_dir, fname)): continue
+        if t in existing_set or t in done_set: continue
+        if sink.exists(t): continue
         targets.append(t)
         
     print(f"\n🚀 [{category_name}] 任务: {len(targets)} / {len(tickers)}")
@@ -91,53 +120,58 @@ def download_batch(category_name, tickers, save_dir, existing_set):
     success_count = 0
     failed_list = [] # [新增] 收集失败记录
     
-    pbar = tqdm(targets, unit="code")
+    batches = [targets[i:i + BATCH_SIZE] for i in range(0, len(targets), BATCH_SIZE)]
+    pbar = tqdm(total=len(targets), unit="code")
     
-    for ticker in pbar:
-        try:
-            pbar.set_description(f"⬇️ {category_name}: {ticker}")
-            
-            # 下载
-            df = yf.download(ticker, period="2y", interval="1h", progress=False)
-            
+    for batch in batches:
+        pbar.set_description(f"⬇️ {category_name}: {batch[0]} 等 {len(batch)} 只")
+        waited = throttle.before_request()
+        t0 = time.monotonic()
+        stats = {}
+        with telemetry.fetch(batch) as rec:
+            rec.update(sleep_s=waited, dataset=category_name)
+            try:
+                # 批量下载 (失败成员自动拆分重试)
+                results, errors = fetch_resilient(batch, batch_size=len(batch), period="2y", interval="1h",
+                                                  stats=stats)
+            except Exception as e:
+                results, errors = {}, {t: e for t in batch}
+            rows = sum(len(df) for df in results.values())
+            rec.update(rows=rows, nbytes=sum(payload_bytes(df) for df in results.values()),
+                       retries=stats.get("retries", 0), failed=len(errors),
+                       error=next(iter(errors.values())) if errors else None,
+                       status="ok" if rows else None)
+        per_ticker = (time.monotonic() - t0) / len(batch)
+
+        for _ in results:
+            throttle.record_success()
+        for err in errors.values():
+            throttle.record_failure(err)
+
+        for ticker, df in results.items():
             if df.empty:
                 # [记录] 空数据
                 failed_list.append({"Category": category_name, "Ticker": ticker, "Reason": "Empty Data"})
-                continue
-
-            # 处理
-            if df.index.tz is None:
-                df.index = df.index.tz_localize('UTC')
-            df.index = df.index.tz_convert('America/New_York')
-
-            df.reset_index(inplace=True)
-            df['Ticker'] = ticker
-            
-            # 保存文件名处理
-            safe_filename = ticker.replace('=', '_') + "_1h.csv"
-            file_path = os.path.join(save_dir, safe_filename)
-            
-            # 列处理
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            
-            cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
-            save_df = df[[c for c in cols if c in df.columns]]
-            
-            if not save_df.empty:
-                save_df.to_csv(file_path, index=False)
+                ledger.record(ticker, EMPTY, duration=per_ticker)
+            elif save_ticker_frame(df, ticker, sink):
                 success_count += 1
+                ledger.record(ticker, DONE, last_bar=df.index.max(),
+                              size_bytes=sink.size_bytes(ticker), duration=per_ticker)
             else:
                 failed_list.append({"Category": category_name, "Ticker": ticker, "Reason": "No Columns"})
+                ledger.record(ticker, EMPTY, duration=per_ticker, error="No Columns")
 
-            time.sleep(random.uniform(0.5, 1.5))
-
-        except Exception as e:
+        for ticker, err in errors.items():
             # [记录] 报错
-            err_msg = str(e)[:100]
+            err_msg = str(err)[:100]
             failed_list.append({"Category": category_name, "Ticker": ticker, "Reason": err_msg})
-            time.sleep(1)
+            status = RATE_LIMITED if is_rate_limit_message(err_msg) else ERROR
+            ledger.record(ticker, status, duration=per_ticker, error=err_msg)
+
+        pbar.update(len(batch))
+        telemetry.sleep(random.uniform(0.5, 1.5))
 
+    pbar.close()
     print(f"🏁 [{category_name}] 完成: ✅成功 {success_count} | ❌失败 {len(failed_list)}")
     return failed_list
 
@@ -153,13 +187,15 @@ def main():
     future_list = get_futures_list()
     
     all_failures = []
+    tel = Telemetry("us_other_data_get", enabled=TELEMETRY, config={"workers": 1, "batch_size": BATCH_SIZE})
     
     # 执行并收集失败记录
-    fails_fut = download_batch("Futures", future_list, DIRS["FUTURE"], existing)
+    fails_fut = download_batch("Futures", future_list, DIRS["FUTURE"], existing, JobLedger(US_FUTURE), tel)
     all_failures.extend(fails_fut)
     
-    fails_etf = download_batch("ETFs", etf_list, DIRS["ETF"], existing)
+    fails_etf = download_batch("ETFs", etf_list, DIRS["ETF"], existing, JobLedger(US_ETF), tel)
     all_failures.extend(fails_etf)
+    tel.close(breaker_trips=throttle.trips)
     
     # [新增] 保存失败日志
     if all_failures:
@@ -1,5 +1,9 @@
-import pandas as pd
+import pyarrow as pa
 import os
+import sys
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import warnings
 
@@ -17,95 +21,169 @@ OUTPUT_FILE = os.path.join(OUTPUT_DIR, "full_market_data.parquet")
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def run_data_processing():
+# [配置] 并行读取 CSV 的进程数 (1 = 单进程顺序读取，可用 --workers 覆盖)
+WORKERS = os.cpu_count() or 1
+# [配置] 额外写出 Hive 分区目录 (去掉 .parquet 的同名目录，见 data_get/market_dataset.py；可用 --partitioned 打开)
+PARTITIONED = False
+# [配置] 每个分片的代码数 (分片越小，主进程里同时驻留的数据越少；太小则跨进程传输次数变多)
+TICKERS_PER_SHARD = 16
+
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_get.sinks import parquet_sources, read_parquet_source
+from data_get.csv_reader import read_ohlcv_csv
+from data_get.market_writer import MarketParquetWriter, finalize_ticker
+from data_get.build_manifest import BuildManifest, open_previous
+from data_get.market_schema import market_schema, conform_table
+from data_get.market_dataset import partition_file, dataset_path, dataset_stats
+
+TARGET_COLS = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+# worker 返回给主进程 / 最终写出的 Arrow 表结构 (统一紧凑类型，见 data_get/market_schema.py)
+SHARD_SCHEMA = market_schema(TARGET_COLS, tz='America/New_York')
+
+def clean_csv_file(file_path, ticker):
+    """
+    读取并清洗单个 CSV，返回 SHARD_SCHEMA 结构的 Arrow 表；无有效数据返回 None。
+    表头布局 (yf 三层表头 / 标准表头) 先嗅探再按固定类型解析，见 data_get/csv_reader.py
+    """
+    table = read_ohlcv_csv(file_path)
+    if table is None: return None
+
+    # 标记代码
+    ticker_col = pa.array([ticker] * table.num_rows, type=pa.string())
+    table = table.add_column(1, 'Ticker', ticker_col)
+    return conform_table(table, SHARD_SCHEMA)
+
+def load_parquet_file(path):
+    """下载脚本直接写出的 Parquet：类型已经正确，无需解析字符串/元数据行"""
+    df = read_parquet_source(path)
+    if df.empty: return None
+    return conform_table(pa.Table.from_pandas(df[TARGET_COLS], preserve_index=False), SHARD_SCHEMA)
+
+def clean_ticker(ticker, sources):
+    """
+    读取一只代码的全部来源，排序 + 前向填充后返回 (Arrow 表, {来源路径: 有效行数})；
+    无有效数据时表为 None
+    """
+    tables, file_rows = [], {}
+    for kind, path in sources:
+        try:
+            table = load_parquet_file(path) if kind == "parquet" else clean_csv_file(path, ticker)
+        except Exception:
+            table = None
+        file_rows[path] = 0 if table is None else table.num_rows
+        if table is not None:
+            tables.append(table)
+    if not tables:
+        return None, file_rows
+    df = finalize_ticker(pa.concat_tables(tables).to_pandas())
+    return conform_table(pa.Table.from_pandas(df, preserve_index=False), SHARD_SCHEMA), file_rows
+
+def clean_shard(jobs):
+    """
+    worker 进程：清洗一组 (代码, 来源列表)，按代码顺序返回 [(代码, Arrow 表或 None, 各文件行数)]。
+    Arrow 表按列式缓冲区序列化，比逐个回传 DataFrame 的 pickle 开销小得多。
+    """
+    return [(ticker, *clean_ticker(ticker, sources)) for ticker, sources in jobs]
+
+def iter_clean_shards(jobs, workers=WORKERS):
+    """
+    把代码列表切成分片交给进程池并行清洗，按提交顺序逐个 yield 分片结果 (workers=1 时在本进程顺序执行)。
+    在途分片数限制为 workers 的 2 倍，主进程写得慢时不会把整个市场堆在内存里。
+    """
+    if not jobs:
+        return
+    shards = [jobs[i:i + TICKERS_PER_SHARD] for i in range(0, len(jobs), TICKERS_PER_SHARD)]
+    workers = max(1, min(int(workers), len(shards)))
+    if workers == 1:
+        for shard in shards:
+            yield clean_shard(shard)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(clean_shard, shard))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def run_data_processing(workers=WORKERS, full=False, partitioned=PARTITIONED):
+    # 0. 下载脚本直接写出的 Parquet 优先，同名 CSV 跳过
+    sources = {ticker: [("parquet", path)] for ticker, path in parquet_sources(SOURCE_DIR).items()}
+    if sources:
+        print(f"⚡ 直接读取 {len(sources)} 只 Parquet 数据 (同名 CSV 将被跳过)")
+    parquet_tickers = set(sources)
+
     all_files = [f for f in os.listdir(SOURCE_DIR) if f.lower().endswith('.csv')]
     print(f"📂 数据源: {SOURCE_DIR}")
     print(f"🔍 扫描到 {len(all_files)} 个 CSV 文件。")
 
-    if not all_files:
+    for filename in all_files:
+        ticker = filename.replace('_1h.csv', '').replace('_1H.csv', '')
+        if ticker in parquet_tickers: continue
+        sources.setdefault(ticker, []).append(("csv", os.path.join(SOURCE_DIR, filename)))
+
+    if not sources:
         print("❌ 未找到文件，请检查路径。")
         return
 
-    # 1. 批量读取与清洗
-    all_aligned_data = []
-    print(f"🚀 开始清洗与读取 (Batch Processing)...")
-
-    for filename in tqdm(all_files):
-        try:
-            file_path = os.path.join(SOURCE_DIR, filename)
-            ticker = filename.replace('_1h.csv', '').replace('_1H.csv', '')
-            
-            # 读取 CSV
-            df = pd.read_csv(file_path)
-            if df.empty: continue
-
-            # --- 核心修复逻辑：剔除垃圾行 ---
-            # 如果第一行包含 'Ticker'，说明是元数据行，切片删除前2行
-            if 'Ticker' in str(df.iloc[0, 0]):
-                df = df.iloc[2:].copy()
-                # 强制重命名第一列
-                df.rename(columns={df.columns[0]: 'Datetime'}, inplace=True)
-            
-            # 确保 Datetime 列名存在 (防止某些文件第一列不叫 Ticker 也不叫 Price)
-            if 'Datetime' not in df.columns and 'Date' in df.columns:
-                df.rename(columns={'Date': 'Datetime'}, inplace=True)
-            
-            # --- 类型强制转换 ---
-            # 1. 时间列清洗
-            df['Datetime'] = pd.to_datetime(df['Datetime'], utc=True, errors='coerce')
-            df = df.dropna(subset=['Datetime']) # 删掉时间解析失败的行
-
-            # 2. 数值列清洗 (转为 float)
-            num_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-            for c in num_cols:
-                if c in df.columns:
-                    df[c] = pd.to_numeric(df[c], errors='coerce')
-            
-            if df.empty: continue
-
-            # 标记代码
-            df['Ticker'] = ticker
-            
-            # 选取标准列
-            target_cols = ['Datetime', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
-            # 补全缺失列
-            for c in target_cols:
-                if c not in df.columns: df[c] = None
-            
-            all_aligned_data.append(df[target_cols])
-
-        except Exception as e:
-            continue
-
-    if not all_aligned_data:
+    # 1. 对照清单: 只重新解析新增 / 内容变化的文件，其余代码从旧输出按行组原样拷贝
+    manifest = BuildManifest(OUTPUT_FILE, params={"schema": SHARD_SCHEMA.to_string()})
+    plan = manifest.plan({t: [path for _, path in entries] for t, entries in sources.items()}, full=full)
+    previous = open_previous(plan, OUTPUT_FILE)
+    dirty = plan.dirty if previous else set(sources)
+    print(f"🧾 增量清单: {plan.summary() if previous else f'全部重建 {len(dirty)} 只'}")
+
+    # 2. 按代码顺序 (多进程) 清洗，每只代码单独排序 + 前向填充，逐只写入 ParquetWriter
+    #    输出顺序与全局 sort_values(['Ticker', 'Datetime']) 相同，峰值内存约为在途分片的数据量
+    jobs = sorted((t, s) for t, s in sources.items() if t in dirty)
+    reused = deque(sorted(set(sources) - dirty))
+    print(f"🚀 开始清洗与写出 (Streaming, {workers} 进程, {len(jobs)} 只)...")
+    try:
+        with MarketParquetWriter(OUTPUT_FILE, SHARD_SCHEMA) as writer:
+            with tqdm(total=len(sources), unit="ticker") as pbar:
+                def copy_reused(upto=None):
+                    # 旧输出里代码 < upto 的未变化代码先写出，保持整体升序
+                    while reused and (upto is None or reused[0] < upto):
+                        previous.copy_to(writer, reused.popleft())
+                        pbar.update(1)
+
+                for results in iter_clean_shards(jobs, workers):
+                    for ticker, table, file_rows in results:
+                        copy_reused(ticker)
+                        if table is not None:
+                            writer.write(table)
+                        for path, rows in file_rows.items():
+                            manifest.record(path, rows)
+                        pbar.update(1)
+                copy_reused()
+            if writer.rows == 0:
+                writer.abort()
+    finally:
+        if previous:
+            previous.close()
+
+    if writer.rows == 0:
         print("❌ 错误：有效数据集为空！")
         return
 
-    # 2. 合并大数据
-    print(f"\n📦 正在合并 {len(all_aligned_data)} 个有效文件...")
-    final_df = pd.concat(all_aligned_data, ignore_index=True)
-    
-    # 释放内存
-    del all_aligned_data
-
-    # 3. 最终清洗 (修复报错的关键步骤)
-    print("🧹 正在执行最终排序与填充...")
-    final_df = final_df.sort_values(['Ticker', 'Datetime'])
-    
-    # 价格列：使用 GroupBy + ffill (前向填充，延续上一个价格)
-    price_cols = ['Open', 'High', 'Low', 'Close']
-    final_df[price_cols] = final_df.groupby('Ticker')[price_cols].ffill()
-    
-    # 成交量：直接全局填充 0 (不需要 GroupBy，缺失就是没量)
-    # 【修复点】：这里去掉了 .groupby('Ticker')，解决了 AttributeError
-    final_df['Volume'] = final_df['Volume'].fillna(0)
-
-    # 4. 保存
-    print(f"💾 正在保存至: {OUTPUT_FILE}")
-    final_df.to_parquet(OUTPUT_FILE, engine='pyarrow', compression='snappy')
-    
-    print(f"✨ 成功！最终数据集形状: {final_df.shape}")
-    print(f"   (包含 {final_df['Ticker'].nunique()} 只股票)")
+    manifest.save()
+    print(f"💾 已保存至: {OUTPUT_FILE}")
+    print(f"✨ 成功！最终数据集形状: ({writer.rows}, {len(TARGET_COLS)})")
+    print(f"   (包含 {writer.tickers} 只股票)")
+
+    if partitioned:
+        root = dataset_path(OUTPUT_FILE)
+        partition_file(OUTPUT_FILE, root, market="US", asset_type="Stock")
+        partitions, files = dataset_stats(root)
+        print(f"🗂️ 分区目录已更新: {root} ({partitions:,} 个分区, {files:,} 个文件)")
 
 if __name__ == "__main__":
-    run_data_processing()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="美股 1h 数据清洗与合并")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="并行清洗的进程数 (1 = 顺序读取)")
+    parser.add_argument("--full", action="store_true", help="忽略清单，全部重新解析")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED, help="额外写出 Hive 分区目录")
+    args = parser.parse_args()
+    run_data_processing(workers=args.workers, full=args.full, partitioned=args.partitioned)
\ No newline at end of file
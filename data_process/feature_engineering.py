@@ -1,7 +1,10 @@
 import pandas as pd
-import numpy as np
 import os
+import sys
+import argparse
 import warnings
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 
 # 忽略计算过程中可能出现的除零警告
@@ -16,131 +19,141 @@ INPUT_FILE = os.path.join(project_root, "data_process", "full_market_data.parque
 # 输出配置
 OUTPUT_DIR = os.path.join(project_root, "data_process", "output")
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "engineered_features_final.parquet")
+# [配置] 额外写出 Hive 分区目录 (去掉 .parquet 的同名目录，见 data_get/market_dataset.py；可用 --partitioned 打开)
+PARTITIONED = False
+# [配置] 分片模式: 代码分片交给进程池，每个分片算完立刻落盘，重启时跳过已完成的分片
+#        (见 data_get/shard_checkpoint.py；可用 --sharded 打开)
+SHARDED = False
+# [配置] 分片模式的进程数 / 每个分片的代码数
+WORKERS = os.cpu_count() or 1
+TICKERS_PER_SHARD = 250
 
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_get.market_writer import is_ticker_sorted, iter_ticker_slices, ticker_bounds, MarketParquetWriter
+from data_process.indicator_engine import indicator_columns, compute_indicators, FEATURE_COLS
+from data_get.market_schema import read_market, write_market, compact_frame, to_market_table
+from data_get.market_dataset import write_partitioned, dataset_path, is_partitioned, market_filter, dataset_stats
+from data_get.build_manifest import file_signature
+from data_get.shard_checkpoint import ShardCheckpoint, shard_dir, write_shard
+
+# [配置] 逐只代码循环计算 (旧路径，可用 --loop 打开，用来与向量化引擎对账)
+LOOP = False
+# [配置] 要计算的特征 (None = 全套 FEATURE_COLS)；窗口写在名字里，如 ['RSI_7', 'SMA_200', 'BB_PctB_50_2.5']
+#        (可用 --features 指定，见 indicator_engine.INDICATORS)
+FEATURES = None
+
+# 指标在 float64 下计算 (单只代码临时升精度)，结果再压回 float32，避免累计误差
+CALC_DTYPES = {'Open': 'float64', 'High': 'float64', 'Low': 'float64', 'Close': 'float64', 'Volume': 'float64'}
+
 # ==================== 2. 核心特征计算函数 (带详细备注) ====================
-def compute_technical_indicators(df):
+# 指标公式 (带详细备注) 在 indicator_engine.indicator_columns 里，单只代码和全市场宽表共用同一份
+def compute_technical_indicators(df, features=None):
     """
-    为单只股票计算全套技术指标。
+    为单只股票计算技术指标 (默认全套 FEATURE_COLS)。
     输入: 包含 OHLCV 的 DataFrame (必须包含 Datetime, Open, High, Low, Close, Volume)
     """
-    # [数据预处理] 必须按时间排序，否则滑窗计算(Rolling)会错乱
-    df = df.sort_values('Datetime')
-    
-    # 防止除以零的微小常数
-    epsilon = 1e-9
-
-    # -------------------------------------------------------
-    # A. 基础收益与风险 (Ref: PDF Page 2)
-    # -------------------------------------------------------
-    # 1. Log Return (对数收益率): l_t = ln(P_t / P_{t-1})
-    # 作用: 具有可加性，分布更正态，AI 模型首选。
-    df['Log_Return'] = np.log(df['Close'] / df['Close'].shift(1))
-    
-    # 2. Historical Volatility (历史波动率): std(Log_Return, 20)
-    # 作用: 衡量过去 20 天的风险/不确定性。
-    df['Vol_20'] = df['Log_Return'].rolling(window=20).std()
-
-    # -------------------------------------------------------
-    # B. 趋势指标 (Trend - Ref: PDF Page 2 SMA/EMA)
-    # -------------------------------------------------------
-    # 3. SMA (简单移动平均): 20日(短期) 和 50日(中期)
-    df['SMA_20'] = df['Close'].rolling(window=20).mean()
-    df['SMA_50'] = df['Close'].rolling(window=50).mean()
-    
-    # 4. EMA (指数移动平均): 对近期价格权重更高
-    df['EMA_12'] = df['Close'].ewm(span=12, adjust=False).mean()
-    df['EMA_26'] = df['Close'].ewm(span=26, adjust=False).mean()
-    
-    # 5. Bias (乖离率): (Price - SMA) / SMA
-    # 作用: 衡量价格偏离均线的程度。正值过大=超买，负值过大=超卖。
-    df['Bias_20'] = (df['Close'] - df['SMA_20']) / (df['SMA_20'] + epsilon)
-
-    # -------------------------------------------------------
-    # C. 动量指标 (Momentum - Ref: PDF Page 13 Feature Vector)
-    # -------------------------------------------------------
-    # 6. RSI (相对强弱指数): 衡量多空力量对比 (0-100)
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0))
-    loss = (-delta.where(delta < 0, 0))
-    # 使用 Wilder 平滑法计算平均涨跌
-    avg_gain = gain.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    rs = avg_gain / (avg_loss + epsilon)
-    df['RSI_14'] = 100 - (100 / (1 + rs))
-
-    # 7. MACD (异同移动平均): 趋势+动量的双重指标
-    # DIF (快线) = EMA_12 - EMA_26
-    df['MACD'] = df['EMA_12'] - df['EMA_26']
-    # DEA (信号线) = DIF 的 9日 EMA
-    df['MACD_Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    # Histogram (能量柱) = DIF - DEA (正值代表多头主导)
-    df['MACD_Hist'] = df['MACD'] - df['MACD_Signal']
-
-    # 8. ROC (变动率): (P_t - P_{t-n}) / P_{t-n}
-    # 作用: 纯粹的价格动量速度。
-    df['ROC_10'] = df['Close'].pct_change(periods=10) * 100
-
-    # -------------------------------------------------------
-    # D. 波动通道指标 (Volatility Channels)
-    # -------------------------------------------------------
-    # 9. Bollinger Bands (布林带): SMA_20 +/- 2倍标准差
-    bb_mid = df['Close'].rolling(window=20).mean()
-    bb_std = df['Close'].rolling(window=20).std()
-    
-    df['BB_Upper'] = bb_mid + 2 * bb_std
-    df['BB_Lower'] = bb_mid - 2 * bb_std
-    # %B 指标: 价格在布林带中的相对位置 (>1 突破上轨, <0 跌破下轨)
-    df['BB_PctB'] = (df['Close'] - df['BB_Lower']) / (df['BB_Upper'] - df['BB_Lower'] + epsilon)
-    # Band Width: 带宽，衡量波动率挤压 (Squeeze)
-    df['BB_Width'] = (df['BB_Upper'] - df['BB_Lower']) / (bb_mid + epsilon)
-
-    # 10. ATR (真实波幅): 衡量日内波动的绝对值
-    # TR = max(H-L, |H-PreClose|, |L-PreClose|)
-    prev_close = df['Close'].shift(1)
-    tr1 = df['High'] - df['Low']
-    tr2 = (df['High'] - prev_close).abs()
-    tr3 = (df['Low'] - prev_close).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    df['ATR_14'] = tr.rolling(window=14).mean()
-
-    # -------------------------------------------------------
-    # E. 振荡指标 (Oscillators)
-    # -------------------------------------------------------
-    # 11. Stochastic (KDJ的K和D): 价格在 N 天极值范围内的位置
-    low_14 = df['Low'].rolling(window=14).min()
-    high_14 = df['High'].rolling(window=14).max()
-    
-    # %K 线
-    df['Stoch_K'] = 100 * ((df['Close'] - low_14) / (high_14 - low_14 + epsilon))
-    # %D 线 (%K 的 3日均线)
-    df['Stoch_D'] = df['Stoch_K'].rolling(window=3).mean()
-
-    # -------------------------------------------------------
-    # F. 成交量特征 (Volume)
-    # -------------------------------------------------------
-    # 12. Volume Change (量比变化)
-    df['Vol_Change'] = df['Volume'].pct_change().fillna(0).replace([np.inf, -np.inf], 0)
-    
-    # 13. OBV (能量潮): 价格涨累加成交量，价格跌减去成交量
-    obv_direction = np.where(df['Close'] > df['Close'].shift(1), 1, -1)
-    obv_direction[0] = 0 
-    df['OBV'] = (obv_direction * df['Volume']).cumsum()
-
-    # -------------------------------------------------------
-    # G. 滞后特征 (Lagged Features - Ref: PDF Labels)
-    # -------------------------------------------------------
-    # 14. Lags (滞后项): 让模型“看到”过去几天的状态
-    df['Log_Return_Lag1'] = df['Log_Return'].shift(1) # 昨天的收益
-    df['Log_Return_Lag2'] = df['Log_Return'].shift(2) # 前天的收益
-    df['Log_Return_Lag3'] = df['Log_Return'].shift(3) 
-
+    # [数据预处理] 必须按时间排序，否则滑窗计算(Rolling)会错乱 (已有序时跳过)
+    if not df['Datetime'].is_monotonic_increasing:
+        df = df.sort_values('Datetime')
+    out = indicator_columns(df['Open'], df['High'], df['Low'], df['Close'], df['Volume'], features=features)
+    for name, values in out.items():
+        df[name] = values
     return df
 
-# ==================== 3. 主程序 (手动循环版) ====================
-def run_feature_engineering():
+# ==================== 3. 分片模式 (多进程 + 断点续跑) ====================
+def engineer_shard(input_file, root, index, tickers, sorted_input, features=None):
+    """worker 进程：读取一个分片的代码，计算特征并去掉预热期空值后原子写出分片，返回 (分片号, 原始行数, 保留行数)"""
+    if is_partitioned(input_file):
+        df = read_market(input_file, filters=market_filter(tickers=tickers))
+    else:
+        df = read_market(input_file, filters=[('Ticker', 'in', tickers)])
+    tz = df.attrs['tz']
+    if not sorted_input:
+        df = df.sort_values(['Ticker', 'Datetime'], kind='stable', ignore_index=True)
+    total = len(df)
+    df = compute_indicators(df, features=features).dropna().reset_index(drop=True)
+    return index, total, write_shard(root, index, to_market_table(df, tz=tz))
+
+
+def iter_shard_tickers(table):
+    """分片表按代码连续区间逐只切片 (MarketParquetWriter 一次写一只)"""
+    bounds = ticker_bounds(table['Ticker'].cast('string').to_numpy(zero_copy_only=False))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        yield table.slice(int(a), int(b - a))
+
+
+def run_sharded(workers=WORKERS, partitioned=PARTITIONED, features=FEATURES):
+    # 1. 代码按升序切成固定分片；输入文件 / 特征列 / 分片划分不变时沿用上次的检查点
+    tickers = sorted(str(t) for t in read_market(INPUT_FILE, columns=['Ticker'])['Ticker'].unique())
+    shards = [tickers[i:i + TICKERS_PER_SHARD] for i in range(0, len(tickers), TICKERS_PER_SHARD)]
+    features = list(FEATURE_COLS if features is None else features)
+    params = {"input": os.path.abspath(INPUT_FILE), "signature": list(file_signature(INPUT_FILE)),
+              "features": features}
+    ckpt = ShardCheckpoint(shard_dir(OUTPUT_FILE), params, shards)
+    pending = ckpt.pending()
+    print(f"🧩 分片模式: {len(tickers)} 只代码 -> {len(shards)} 个分片 | 待计算 {len(pending)} 个"
+          f"{' (断点续跑)' if ckpt.resumed and len(pending) < len(shards) else ''}")
+    print(f"   分片目录: {ckpt.root}")
+
+    # 2. 待计算的分片交给进程池，每个分片算完由 worker 直接落盘
+    sorted_input = is_ticker_sorted(INPUT_FILE)
+    stats = {}
+    jobs = [(INPUT_FILE, ckpt.root, i, shards[i], sorted_input, features) for i in pending]
+    workers = max(1, min(int(workers), len(jobs) or 1))
+    with tqdm(total=len(jobs), desc="Processing Shards") as pbar:
+        if workers == 1:
+            for job in jobs:
+                index, total, rows = engineer_shard(*job)
+                stats[index] = (total, rows)
+                pbar.update(1)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(engineer_shard, *job) for job in jobs]
+                for future in as_completed(futures):
+                    index, total, rows = future.result()
+                    stats[index] = (total, rows)
+                    pbar.update(1)
+    if stats:
+        total = sum(t for t, _ in stats.values())
+        print(f"🧹 本次计算 {total:,} 行，删除预热期 {total - sum(r for _, r in stats.values()):,} 行")
+
+    # 3. 按分片顺序流式合并成最终输出 (逐只写出，带 Ticker 有序元数据)
+    print(f"\n📦 正在合并分片 -> {OUTPUT_FILE}")
+    with MarketParquetWriter(OUTPUT_FILE, pq.read_schema(ckpt.shard_path(0))) as writer:
+        for i in range(len(shards)):
+            for part in iter_shard_tickers(pq.read_table(ckpt.shard_path(i))):
+                writer.write(part)
+        if writer.rows == 0:
+            writer.abort()
+    if writer.rows == 0:
+        print("❌ 错误：全部分片为空！")
+        return
+    print(f"💾 已保存: {writer.rows:,} 行 | {writer.tickers:,} 只代码")
+
+    if partitioned:
+        root = dataset_path(OUTPUT_FILE)
+        write_partitioned((pq.read_table(ckpt.shard_path(i)) for i in range(len(shards))), root)
+        partitions, files = dataset_stats(root)
+        print(f"🗂️ 分区目录已更新: {root} ({partitions:,} 个分区, {files:,} 个文件)")
+    ckpt.clear()
+
+    print("="*50)
+    print("✨ 完成！前 3 行预览:")
+    preview = pq.ParquetFile(OUTPUT_FILE).read_row_group(0).slice(0, 3).to_pandas()
+    print(preview[['Datetime', 'Ticker', 'Close'] + preview_cols(features)].to_string())
+
+
+def preview_cols(features):
+    """预览用的指标列: 默认 RSI_14 + BB_PctB，自定义特征时取前两个"""
+    cols = [c for c in ['RSI_14', 'BB_PctB'] if c in features]
+    return cols or list(features[:2])
+
+# ==================== 4. 主程序 (向量化引擎 / 手动循环) ====================
+def run_feature_engineering(partitioned=PARTITIONED, loop=LOOP, sharded=SHARDED, workers=WORKERS, features=FEATURES):
     print("="*50)
     print("🚀 高级特征工程启动 (Annotated Version)")
     print("="*50)
@@ -149,22 +162,42 @@ def run_feature_engineering():
         print(f"❌ 找不到输入文件: {INPUT_FILE}")
         return
 
+    features = list(FEATURE_COLS if features is None else features)
+    print(f"🧮 特征: {len(features)} 个{' (自定义)' if features != FEATURE_COLS else ''}")
+
+    if sharded:
+        return run_sharded(workers=workers, partitioned=partitioned, features=features)
+
     print(f"📂 正在读取原始数据: {INPUT_FILE}")
-    df = pd.read_parquet(INPUT_FILE)
+    # 统一紧凑类型读取 (float32 价格 / int64 成交量 / category 代码)，见 data_get/market_schema.py
+    df = read_market(INPUT_FILE)
+    tz = df.attrs['tz']
     print(f"📊 原始数据量: {len(df):,} 行 | 股票数: {df['Ticker'].nunique()}")
 
-    print("\n⚙️ 正在计算特征 (使用手动循环，稳定无报错)...")
-    
-    # 弃用 progress_apply，改用原生循环以避免 pandas 版本冲突
-    grouped = df.groupby('Ticker')
-    results = []
-    
-    for ticker, group in tqdm(grouped, desc="Processing Tickers"):
-        res = compute_technical_indicators(group)
-        results.append(res)
-    
-    print("\n📦 正在合并结果...")
-    df_engineered = pd.concat(results)
+    if loop:
+        print("\n⚙️ 正在计算特征 (逐只代码循环)...")
+        # 清洗脚本写出的文件已按 (Ticker, Datetime) 有序：直接按连续区间切片，省掉全表 groupby
+        if is_ticker_sorted(INPUT_FILE):
+            grouped = iter_ticker_slices(df)
+            total = df['Ticker'].nunique()
+        else:
+            grouped = df.groupby('Ticker', observed=True)
+            total = grouped.ngroups
+        results = []
+
+        for ticker, group in tqdm(grouped, total=total, desc="Processing Tickers"):
+            res = compute_technical_indicators(group.astype(CALC_DTYPES), features=features)
+            results.append(compact_frame(res))
+
+        print("\n📦 正在合并结果...")
+        df_engineered = pd.concat(results)
+    else:
+        print("\n⚙️ 正在计算特征 (全市场向量化引擎，见 indicator_engine.py)...")
+        # 引擎要求同一只代码的行连续且按时间有序；清洗脚本写出的文件已满足，否则先排一次序
+        if not is_ticker_sorted(INPUT_FILE):
+            df = df.sort_values(['Ticker', 'Datetime'], kind='stable', ignore_index=True)
+        with tqdm(total=df['Ticker'].nunique(), desc="Processing Tickers") as pbar:
+            df_engineered = compute_indicators(df, progress=pbar.update, features=features)
 
     # 清洗预热期的空值 (因为计算MA50需要前50天数据)
     print("🧹 清洗空值 (Dropna)...")
@@ -176,19 +209,32 @@ def run_feature_engineering():
     df_engineered.reset_index(drop=True, inplace=True)
 
     # 完整性检查
-    required_cols = ['Ticker', 'Datetime', 'Close', 'RSI_14', 'BB_PctB']
+    required_cols = ['Ticker', 'Datetime', 'Close'] + features
     if all(col in df_engineered.columns for col in required_cols):
         print("✅ 特征完整性检查通过。")
     else:
         print(f"❌ 警告: 缺失列 -> {[c for c in required_cols if c not in df_engineered.columns]}")
 
     print(f"\n💾 保存至: {OUTPUT_FILE}")
-    df_engineered.to_parquet(OUTPUT_FILE, engine='pyarrow', compression='snappy')
+    write_market(df_engineered, OUTPUT_FILE, tz=tz)
+    if partitioned:
+        root = dataset_path(OUTPUT_FILE)
+        write_partitioned([to_market_table(df_engineered, tz=tz)], root)
+        partitions, files = dataset_stats(root)
+        print(f"🗂️ 分区目录已更新: {root} ({partitions:,} 个分区, {files:,} 个文件)")
     
     print("="*50)
     print("✨ 完成！前 3 行预览:")
-    cols_to_show = ['Datetime', 'Ticker', 'Close', 'RSI_14', 'BB_PctB']
+    cols_to_show = ['Datetime', 'Ticker', 'Close'] + preview_cols(features)
     print(df_engineered[cols_to_show].head(3).to_string())
 
 if __name__ == "__main__":
-    run_feature_engineering()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="全市场技术指标特征工程")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED, help="额外写出 Hive 分区目录")
+    parser.add_argument("--loop", action="store_true", default=LOOP, help="逐只代码循环计算 (旧路径，用于对账)")
+    parser.add_argument("--sharded", action="store_true", default=SHARDED, help="分片模式: 多进程 + 每个分片落盘，可断点续跑")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="分片模式的进程数")
+    parser.add_argument("--features", nargs="+", default=FEATURES, help="要计算的特征 (如 RSI_7 SMA_200)，默认全套 FEATURE_COLS")
+    args = parser.parse_args()
+    run_feature_engineering(partitioned=args.partitioned, loop=args.loop, sharded=args.sharded, workers=args.workers,
+                            features=args.features)
\ No newline at end of file
@@ -0,0 +1,538 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+from data_get.market_writer import ticker_bounds
+
+# ==================== 全市场向量化指标引擎 ====================
+# feature_engineering.py 原来对每只代码单独跑一遍 compute_technical_indicators()，
+# 9000 只代码 = 9000 条 pandas 流水线 × 每条约 20 次 rolling/ewm，外加最后的 pd.concat。
+# 这里把整段长表 (同一只代码的行连续、按时间升序) 当成一条序列，一次调用算完所有代码，
+# 只在“跨代码”的地方做分组边界处理 (SegmentOps):
+#   - rolling : 自定义窗口边界，窗口起点不早于本代码第一行 (不满窗口的输出 NaN，同 min_periods=窗口)；
+#               窗口与上一个窗口不重叠时 pandas 内核会重置累加状态，所以每只代码的结果与单独计算逐位一致
+#   - ewm     : groupby().ewm()，同一个 Cython 内核按代码区间一次扫完
+#   - shift   : 整体平移后把本代码前 k 行置 NaN；cumsum 用 groupby().cumsum()
+# 同一份公式 (indicator_columns) 也能用在单只代码 (SeriesOps，feature_engineering 的逐只路径) 和
+# 时间对齐的宽表上 (DataFrame 每列一只代码，如 data_get/panel_store.py 的 T×N 面板；停牌的 NaN 洞按缺失行参与计算)。
+# 按代码把长表切成不超过 CHUNK_ROWS 行的块依次计算，峰值内存可控。
+# 指标本身在 INDICATORS 注册表里声明，按请求的特征建去重的计算图 (见下方“指标注册表 + 计算图”)。
+#
+# 用法:
+#   df = compute_indicators(df)                 # 长表 (按 Ticker, Datetime 有序)，原地追加指标列 (float32)
+#   df = compute_indicators(df, features=['RSI_7', 'SMA_200'])   # 只算指定特征 (窗口写在名字里)
+#   out = indicator_columns(o, h, l, c, v)      # Series / 宽表 DataFrame (每列一只代码)
+#   n = warmup_bars(['SMA_50'])                 # 按需计算时要多读的前序 K 线数 (见 lazy_features.py)
+
+# [配置] 每块的最大行数 (float64 中间结果约 30 列 × 8 字节/行)
+CHUNK_ROWS = 2_000_000
+
+FEATURE_COLS = ['Log_Return', 'Vol_20', 'SMA_20', 'SMA_50', 'EMA_12', 'EMA_26', 'Bias_20', 'RSI_14',
+                'MACD', 'MACD_Signal', 'MACD_Hist', 'ROC_10', 'BB_Upper', 'BB_Lower', 'BB_PctB', 'BB_Width',
+                'ATR_14', 'Stoch_K', 'Stoch_D', 'Vol_Change', 'OBV',
+                'Log_Return_Lag1', 'Log_Return_Lag2', 'Log_Return_Lag3']
+INPUT_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# 防止除以零的微小常数
+EPSILON = 1e-9
+# [配置] 按需计算时 EWM 的预热长度: 截断掉的历史权重 (1-alpha)^k 低于该值即可 (float32 输出精度量级)
+EWM_TOLERANCE = 1e-7
+
+
+class SeriesOps:
+    """单只代码 (Series) 或每列一只代码的宽表 (DataFrame) 的时序算子: 直接用 pandas 原生方法"""
+
+    def rolling(self, x, window):
+        return x.rolling(window=window)
+
+    def ewm_mean(self, x, **kwargs):
+        return x.ewm(**kwargs).mean()
+
+    def shift(self, x, periods):
+        return x.shift(periods)
+
+    def cumsum(self, x):
+        return x.cumsum()
+
+    def not_first(self, x):
+        """与 x 同形状的 0/1 数组，每只代码的第一行为 0"""
+        mask = (np.arange(len(x)) > 0).astype(np.float64)
+        return np.broadcast_to(mask[:, None] if x.ndim == 2 else mask, x.shape)
+
+
+class _SegmentIndexer(BaseIndexer):
+    """固定长度窗口，但起点截断在所在代码的第一行 (group_start: 每行所属代码的起始行号)"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.group_start).astype(np.int64)
+        return start, end
+
+
+class SegmentOps:
+    """多只代码首尾相接的长序列 (RangeIndex) 的时序算子，bounds 为代码区间边界 [0, s1, ..., n]"""
+
+    def __init__(self, bounds):
+        lengths = np.diff(bounds)
+        self.codes = np.repeat(np.arange(len(lengths)), lengths)
+        self.group_start = np.repeat(bounds[:-1], lengths).astype(np.int64)
+        self.pos = np.arange(bounds[-1]) - self.group_start
+
+    def rolling(self, x, window):
+        return x.rolling(_SegmentIndexer(window_size=window, group_start=self.group_start), min_periods=window)
+
+    def ewm_mean(self, x, **kwargs):
+        res = x.groupby(self.codes, sort=False).ewm(**kwargs).mean()
+        return pd.Series(res.to_numpy(), index=x.index)
+
+    def shift(self, x, periods):
+        return x.shift(periods).where(self.pos >= periods)
+
+    def cumsum(self, x):
+        return x.groupby(self.codes, sort=False).cumsum()
+
+    def not_first(self, x):
+        return (self.pos > 0).astype(np.float64)
+
+
+# ==================== 指标注册表 + 计算图 ====================
+# 每个指标族只声明“由哪些输入、用什么参数算出来”，planner 把请求的特征展开成一张计算图:
+#   - 相同 (算子, 输入, 参数) 的节点只建一次: shift(Close, 1) 被 Log_Return / RSI / ATR / OBV 共用，
+#     布林带中轨就是 SMA_20 节点，MACD 直接复用 EMA_12 / EMA_26
+#   - 只计算请求的特征及其依赖，没请求的指标不花任何时间；中间结果在最后一次使用后立即释放
+#   - 窗口写在名字里: 'RSI_7'、'SMA_200'、'BB_Upper_50_2.5'、'MACD_Signal_5_35_5'，不写则用默认值
+# 时序算子 (shift / rolling / ewm / cumsum) 交给 ops 执行，所以同一张图可以跑在单只代码、宽表、
+# 长表 (SegmentOps) 和增量状态 (online_indicators.StreamOps) 上。
+
+
+class IndicatorGraph:
+    """去重的计算图: 节点 = (算子, 输入节点, 参数)，按创建顺序即拓扑序"""
+
+    def __init__(self):
+        self.nodes = []
+        self.index = {}
+
+    def _node(self, op, inputs=(), **params):
+        key = (op, tuple(inputs), tuple(sorted(params.items())))
+        if key not in self.index:
+            self.index[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self.index[key]
+
+    def col(self, name):
+        return self._node('col', name=name)
+
+    def shift(self, x, periods):
+        return self._node('shift', (x,), periods=periods)
+
+    def rolling(self, x, window, how):
+        return self._node('rolling', (x,), window=window, how=how)
+
+    def ewm(self, x, **kwargs):
+        return self._node('ewm', (x,), **kwargs)
+
+    def cumsum(self, x):
+        return self._node('cumsum', (x,))
+
+    def not_first(self, x):
+        return self._node('not_first', (x,))
+
+    def map(self, fn, *inputs, **params):
+        """逐元素运算: fn 为模块级函数 (按函数对象去重)"""
+        return self._node(fn, inputs, **params)
+
+
+# ---------- 逐元素运算 ----------
+def _log_ratio(a, b):
+    return np.log(a / b)
+
+
+def _sub(a, b):
+    return a - b
+
+
+def _bias(close, sma):
+    return (close - sma) / (sma + EPSILON)
+
+
+def _gain(delta):
+    return delta.where(delta > 0, 0)
+
+
+def _loss(delta):
+    return -delta.where(delta < 0, 0)
+
+
+def _rsi(avg_gain, avg_loss):
+    rs = avg_gain / (avg_loss + EPSILON)
+    return 100 - (100 / (1 + rs))
+
+
+def _roc(close, past):
+    return (close / past - 1) * 100
+
+
+def _band_upper(mid, std, k):
+    return mid + k * std
+
+
+def _band_lower(mid, std, k):
+    return mid - k * std
+
+
+def _pct_b(close, upper, lower):
+    return (close - lower) / (upper - lower + EPSILON)
+
+
+def _band_width(upper, lower, mid):
+    return (upper - lower) / (mid + EPSILON)
+
+
+def _true_range(high, low, prev_close):
+    # TR = max(H-L, |H-PreClose|, |L-PreClose|)，逐元素取最大 (忽略 NaN，等价于 concat(...).max(axis=1))
+    tr1 = high - low
+    tr2 = (high - prev_close).abs()
+    tr3 = (low - prev_close).abs()
+    return np.fmax(np.fmax(tr1, tr2), tr3)
+
+
+def _stoch_k(close, low_n, high_n):
+    return 100 * ((close - low_n) / (high_n - low_n + EPSILON))
+
+
+def _vol_change(volume, prev_volume):
+    return (volume / prev_volume - 1).fillna(0).replace([np.inf, -np.inf], 0)
+
+
+def _obv_flow(close, prev_close, not_first, volume):
+    # 价格涨记 +成交量，跌记 -成交量 (第一根 K 线方向记 0)
+    return ((close > prev_close) * 2.0 - 1.0) * not_first * volume
+
+
+# ---------- 指标族 (带详细备注) ----------
+def _prev_close(g):
+    return g.shift(g.col('Close'), 1)
+
+
+# A. 基础收益与风险 (Ref: PDF Page 2)
+def _log_return_node(g):
+    # 1. Log Return (对数收益率): l_t = ln(P_t / P_{t-1})
+    # 作用: 具有可加性，分布更正态，AI 模型首选。
+    return g.map(_log_ratio, g.col('Close'), _prev_close(g))
+
+
+def _volatility_node(g, window):
+    # 2. Historical Volatility (历史波动率): std(Log_Return, N)
+    # 作用: 衡量过去 N 根 K 线的风险/不确定性。
+    return g.rolling(_log_return_node(g), window, 'std')
+
+
+# B. 趋势指标 (Trend - Ref: PDF Page 2 SMA/EMA)
+def _sma_node(g, window):
+    # 3. SMA (简单移动平均): 20(短期) / 50(中期) / 200(长期)
+    return g.rolling(g.col('Close'), window, 'mean')
+
+
+def _ema_node(g, span):
+    # 4. EMA (指数移动平均): 对近期价格权重更高
+    return g.ewm(g.col('Close'), span=span, adjust=False)
+
+
+def _bias_node(g, window):
+    # 5. Bias (乖离率): (Price - SMA) / SMA
+    # 作用: 衡量价格偏离均线的程度。正值过大=超买，负值过大=超卖。
+    return g.map(_bias, g.col('Close'), _sma_node(g, window))
+
+
+# C. 动量指标 (Momentum - Ref: PDF Page 13 Feature Vector)
+def _rsi_node(g, window):
+    # 6. RSI (相对强弱指数): 衡量多空力量对比 (0-100)，涨跌幅用 Wilder 平滑法 (alpha = 1/N)
+    delta = g.map(_sub, g.col('Close'), _prev_close(g))
+    avg_gain = g.ewm(g.map(_gain, delta), alpha=1 / window, min_periods=window, adjust=False)
+    avg_loss = g.ewm(g.map(_loss, delta), alpha=1 / window, min_periods=window, adjust=False)
+    return g.map(_rsi, avg_gain, avg_loss)
+
+
+def _macd_node(g, fast, slow):
+    # 7. MACD (异同移动平均): 趋势+动量的双重指标
+    # DIF (快线) = EMA_fast - EMA_slow
+    return g.map(_sub, _ema_node(g, fast), _ema_node(g, slow))
+
+
+def _macd_signal_node(g, fast, slow, signal):
+    # DEA (信号线) = DIF 的 N 日 EMA
+    return g.ewm(_macd_node(g, fast, slow), span=signal, adjust=False)
+
+
+def _macd_hist_node(g, fast, slow, signal):
+    # Histogram (能量柱) = DIF - DEA (正值代表多头主导)
+    return g.map(_sub, _macd_node(g, fast, slow), _macd_signal_node(g, fast, slow, signal))
+
+
+def _roc_node(g, window):
+    # 8. ROC (变动率): (P_t - P_{t-n}) / P_{t-n} (与 pct_change 相同的算式)
+    # 作用: 纯粹的价格动量速度。
+    return g.map(_roc, g.col('Close'), g.shift(g.col('Close'), window))
+
+
+# D. 波动通道指标 (Volatility Channels)
+def _bollinger(g, window, k):
+    # 9. Bollinger Bands (布林带): SMA +/- k 倍标准差 (中轨就是 SMA 节点)
+    mid = _sma_node(g, window)
+    std = g.rolling(g.col('Close'), window, 'std')
+    return mid, g.map(_band_upper, mid, std, k=k), g.map(_band_lower, mid, std, k=k)
+
+
+def _bb_upper_node(g, window, k):
+    return _bollinger(g, window, k)[1]
+
+
+def _bb_lower_node(g, window, k):
+    return _bollinger(g, window, k)[2]
+
+
+def _bb_pctb_node(g, window, k):
+    # %B 指标: 价格在布林带中的相对位置 (>1 突破上轨, <0 跌破下轨)
+    _, upper, lower = _bollinger(g, window, k)
+    return g.map(_pct_b, g.col('Close'), upper, lower)
+
+
+def _bb_width_node(g, window, k):
+    # Band Width: 带宽，衡量波动率挤压 (Squeeze)
+    mid, upper, lower = _bollinger(g, window, k)
+    return g.map(_band_width, upper, lower, mid)
+
+
+def _atr_node(g, window):
+    # 10. ATR (真实波幅): 衡量日内波动的绝对值，TR 的 N 日均值
+    tr = g.map(_true_range, g.col('High'), g.col('Low'), _prev_close(g))
+    return g.rolling(tr, window, 'mean')
+
+
+# E. 振荡指标 (Oscillators)
+def _stoch_k_node(g, window):
+    # 11. Stochastic (KDJ的K和D): 价格在 N 天极值范围内的位置
+    low_n = g.rolling(g.col('Low'), window, 'min')
+    high_n = g.rolling(g.col('High'), window, 'max')
+    return g.map(_stoch_k, g.col('Close'), low_n, high_n)
+
+
+def _stoch_d_node(g, window, smooth):
+    # %D 线 (%K 的 3 日均线)
+    return g.rolling(_stoch_k_node(g, window), smooth, 'mean')
+
+
+# F. 成交量特征 (Volume)
+def _vol_change_node(g):
+    # 12. Volume Change (量比变化)
+    return g.map(_vol_change, g.col('Volume'), g.shift(g.col('Volume'), 1))
+
+
+def _obv_node(g):
+    # 13. OBV (能量潮): 价格涨累加成交量，价格跌减去成交量
+    close = g.col('Close')
+    flow = g.map(_obv_flow, close, _prev_close(g), g.not_first(close), g.col('Volume'))
+    return g.cumsum(flow)
+
+
+# G. 滞后特征 (Lagged Features - Ref: PDF Labels)
+def _log_return_lag_node(g, lag):
+    # 14. Lags (滞后项): 让模型“看到”过去几根 K 线的状态
+    return g.shift(_log_return_node(g), lag)
+
+
+# 指标族: 名字前缀 -> (参数默认值, 构造函数)。特征名 = 前缀 [+ _参数1 [_参数2 ...]]
+INDICATORS = {
+    'Log_Return': ((), _log_return_node),
+    'Vol': ((20,), _volatility_node),
+    'SMA': ((20,), _sma_node),
+    'EMA': ((12,), _ema_node),
+    'Bias': ((20,), _bias_node),
+    'RSI': ((14,), _rsi_node),
+    'MACD': ((12, 26), _macd_node),
+    'MACD_Signal': ((12, 26, 9), _macd_signal_node),
+    'MACD_Hist': ((12, 26, 9), _macd_hist_node),
+    'ROC': ((10,), _roc_node),
+    'BB_Upper': ((20, 2.0), _bb_upper_node),
+    'BB_Lower': ((20, 2.0), _bb_lower_node),
+    'BB_PctB': ((20, 2.0), _bb_pctb_node),
+    'BB_Width': ((20, 2.0), _bb_width_node),
+    'ATR': ((14,), _atr_node),
+    'Stoch_K': ((14,), _stoch_k_node),
+    'Stoch_D': ((14, 3), _stoch_d_node),
+    'Vol_Change': ((), _vol_change_node),
+    'OBV': ((), _obv_node),
+    'Log_Return_Lag': ((1,), _log_return_lag_node),
+}
+
+
+def _param(name, text, default):
+    """单个参数: 默认值是 float 的位置 (布林带倍数 k) 接受正数，其余 (窗口 / 周期 / 滞后) 必须是正整数"""
+    if isinstance(default, float):
+        if float(text) <= 0:
+            raise ValueError(f"指标 {name} 参数 {text} 必须是正数")
+        return float(text)
+    if not text.isdigit() or int(text) <= 0:
+        raise ValueError(f"指标 {name} 参数 {text} 必须是正整数")
+    return int(text)
+
+
+def parse_feature(name):
+    """
+    特征名 -> (指标族, 参数)。最长前缀优先 ('Vol_Change' 不会被当成 'Vol')；
+    缺省的参数用默认值: 'RSI_7' -> ('RSI', (7,))，'MACD_Signal' -> ('MACD_Signal', (12, 26, 9))，
+    'Log_Return_Lag3' -> ('Log_Return_Lag', (3,))，'BB_Upper_50_2.5' -> ('BB_Upper', (50, 2.5))
+    窗口 / 周期 / 滞后必须是正整数，只有布林带倍数 k 可以是小数，不合法的参数在这里直接报错
+    """
+    for family in sorted(INDICATORS, key=len, reverse=True):
+        if not name.startswith(family):
+            continue
+        defaults = INDICATORS[family][0]
+        rest = name[len(family):]
+        if not rest:
+            return family, defaults
+        parts = (rest[1:] if rest.startswith('_') else rest).split('_')
+        if not all(p.replace('.', '', 1).isdigit() for p in parts):
+            continue
+        if len(parts) > len(defaults):
+            raise ValueError(f"指标 {name} 参数过多 ({family} 最多 {len(defaults)} 个)")
+        return family, tuple(_param(name, p, d) for p, d in zip(parts, defaults)) + defaults[len(parts):]
+    raise ValueError(f"未知指标: {name} (可用: {', '.join(INDICATORS)})")
+
+
+def _ewm_lookback(alpha=None, span=None, min_periods=0, **kwargs):
+    """EWM 需要的前序 K 线数: 满足 min_periods，且截断历史的残余权重低于 EWM_TOLERANCE"""
+    alpha = alpha if alpha is not None else 2 / (span + 1)
+    return max(min_periods - 1, int(np.ceil(np.log(EWM_TOLERANCE) / np.log1p(-alpha))))
+
+
+class IndicatorPlan:
+    """
+    请求的特征展开后的计算图 + 每个节点最后一次被使用的位置 (用于及时释放中间结果)
+    + 每个节点的回看长度 (需要多少根前序 K 线，None = 依赖全部历史，如 cumsum)
+    """
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.graph = IndicatorGraph()
+        self.outputs = {}
+        for name in self.features:
+            family, params = parse_feature(name)
+            self.outputs[name] = INDICATORS[family][1](self.graph, *params)
+        self.last_use = {}
+        self.lookback = []
+        for i, (op, inputs, params) in enumerate(self.graph.nodes):
+            for j in inputs:
+                self.last_use[j] = i
+            self.lookback.append(self._lookback(op, [self.lookback[j] for j in inputs], dict(params)))
+
+    @staticmethod
+    def _lookback(op, inputs, params):
+        if op == 'col':
+            return 0
+        if any(lb is None for lb in inputs) or op == 'cumsum':
+            return None
+        base = max(inputs)
+        if op == 'shift':
+            return base + params['periods']
+        if op == 'rolling':
+            return base + params['window'] - 1
+        if op == 'ewm':
+            return base + _ewm_lookback(**params)
+        if op == 'not_first':
+            return base + 1
+        return base
+
+    def evaluate(self, columns, ops):
+        """columns: {输入列名: Series / DataFrame}，按节点顺序执行，返回 {特征名: 结果}"""
+        keep = set(self.outputs.values())
+        values = {}
+        for i, (op, inputs, params) in enumerate(self.graph.nodes):
+            args = [values[j] for j in inputs]
+            params = dict(params)
+            if op == 'col':
+                values[i] = columns[params['name']]
+            elif op == 'shift':
+                values[i] = ops.shift(args[0], params['periods'])
+            elif op == 'rolling':
+                values[i] = getattr(ops.rolling(args[0], params['window']), params['how'])()
+            elif op == 'ewm':
+                values[i] = ops.ewm_mean(args[0], **params)
+            elif op == 'cumsum':
+                values[i] = ops.cumsum(args[0])
+            elif op == 'not_first':
+                values[i] = ops.not_first(args[0])
+            else:
+                values[i] = op(*args, **params)
+            for j in inputs:
+                if self.last_use[j] == i and j not in keep:
+                    del values[j]
+        return {name: values[self.outputs[name]] for name in self.features}
+
+
+@lru_cache(maxsize=None)
+def indicator_plan(features=None):
+    """按特征列表 (tuple) 缓存计算图；None 为默认的 FEATURE_COLS"""
+    return IndicatorPlan(FEATURE_COLS if features is None else features)
+
+
+def warmup_bars(features=None):
+    """
+    计算 features 在某根 K 线上的值需要的前序 K 线数 (SMA_50 -> 49, Log_Return_Lag3 -> 4)；
+    EWM 类按 EWM_TOLERANCE 截断；含累计型指标 (OBV) 时返回 None，表示需要该代码的全部历史。
+    """
+    plan = indicator_plan(None if features is None else tuple(features))
+    lookbacks = [plan.lookback[i] for i in plan.outputs.values()]
+    return None if any(lb is None for lb in lookbacks) else max(lookbacks, default=0)
+
+
+def indicator_columns(open_, high, low, close, volume, ops=None, features=None):
+    """
+    计算技术指标。输入是同形状的 Series (单只代码) 或 DataFrame (每列一只代码，行按时间)，
+    返回 {指标名: 同形状结果}，顺序与 features 一致 (默认 FEATURE_COLS)。
+    ops: 时序算子 (默认 SeriesOps；多只代码拼接的长序列用 SegmentOps)
+    features: 要计算的特征名列表，可带窗口参数，如 ['RSI_7', 'SMA_200']
+    """
+    plan = indicator_plan(None if features is None else tuple(features))
+    columns = {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}
+    return plan.evaluate(columns, ops or SeriesOps())
+
+
+def _chunks(bounds, max_rows=CHUNK_ROWS):
+    """按代码把长表切成不超过 max_rows 行的连续块 (单只代码超长时独占一块)，返回代码下标区间 [(i, j), ...]"""
+    chunks, first = [], 0
+    for k in range(1, len(bounds)):
+        if k - 1 > first and bounds[k] - bounds[first] > max_rows:
+            chunks.append((first, k - 1))
+            first = k - 1
+    if len(bounds) > 1:
+        chunks.append((first, len(bounds) - 1))
+    return chunks
+
+
+def compute_indicators(df, bounds=None, chunk_rows=CHUNK_ROWS, progress=None, features=None):
+    """
+    长表 (同一只代码的行连续且按时间升序) 一次性计算指标，原地追加特征列 (float32) 并返回 df。
+    bounds: 代码区间边界 (market_writer.ticker_bounds)；不传则按 Ticker 列计算。
+    progress: 可选回调 progress(完成的代码数)，用于进度条。
+    features: 要计算的特征名列表 (见 parse_feature)，默认 FEATURE_COLS。
+    """
+    if bounds is None:
+        bounds = ticker_bounds(df['Ticker'].to_numpy())
+    features = list(FEATURE_COLS if features is None else features)
+    results = {c: np.full(len(df), np.nan, dtype=np.float32) for c in features}
+
+    for i, j in _chunks(bounds, chunk_rows):
+        lo, hi = int(bounds[i]), int(bounds[j])
+        # 指标在 float64 下计算，结果再压回 float32 (同逐只路径的 CALC_DTYPES)
+        cols = {c: pd.Series(df[c].to_numpy(dtype=np.float64)[lo:hi]) for c in INPUT_COLS}
+        out = indicator_columns(cols['Open'], cols['High'], cols['Low'], cols['Close'], cols['Volume'],
+                                ops=SegmentOps(bounds[i:j + 1] - lo), features=features)
+        for c in features:
+            results[c][lo:hi] = out[c].to_numpy()
+        if progress:
+            progress(j - i)
+
+    for c in features:
+        df[c] = results[c]
+    return df
@@ -0,0 +1,298 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+import warnings
+
+# 忽略警告
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# ==================== 统一数据入库引擎 ====================
+# clean_and_align.py (美股)、HK_data/clean_and_aligh_hk.py (港股) 和 HK_data/merge_all_assets.py (港股全资产)
+# 各自扫一遍目录、各有一套路径/时区/代码后缀规则，美股 ETF / 期货目录从来没有被合并过。
+# 这里用一张来源登记表 (SOURCE_REGISTRY) 描述所有数据目录，一次并行扫描写出一个统一的带类型数据集:
+#   - 每个来源: 目录 / 市场 / 时区 / 资产类型 / 代码命名规则
+#   - 输出多出 Market、Asset_Type 两列，Datetime 统一存 UTC (各市场时区记在文件元数据 market_tz 里)
+#   - 按代码升序逐只写出 (MarketParquetWriter)，配合清单 (build_manifest.py) 只重新解析变化的文件
+#
+# 用法:
+#   python data_process/ingest_engine.py                    # 全部来源 -> output/unified_market_data.parquet
+#   python data_process/ingest_engine.py --markets HK       # 只入库港股来源
+#   python data_process/ingest_engine.py --workers 4 --full
+#   python data_process/ingest_engine.py --partitioned      # 另写 output/unified_market_data/ 分区目录
+#   python data_process/ingest_engine.py --align-sessions   # 按交易日历补齐缺失的 K 线 (data_get/trading_calendar.py)
+
+# --- 动态获取项目根目录 ---
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_script_dir)
+MSC_PROJECT_ROOT = os.path.dirname(project_root)
+
+US_DATA_ROOT = os.path.join(project_root, "us_stocks_data")
+STOCK_DATA_ROOT = os.path.join(MSC_PROJECT_ROOT, "STOCK DATA")
+OUTPUT_DIR = os.path.join(project_root, "data_process", "output")
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "unified_market_data.parquet")
+
+# [配置] 来源登记表: 新增一个数据目录只需要加一行
+#   naming: 文件名 (去掉 _1h 后缀) -> 代码 的规则，见 NAMING_RULES
+SOURCE_REGISTRY = [
+    {"dir": US_DATA_ROOT,                                    "market": "US", "tz": "America/New_York", "asset_type": "Stock",  "naming": "plain"},
+    {"dir": os.path.join(US_DATA_ROOT, "us_etf_1h"),         "market": "US", "tz": "America/New_York", "asset_type": "ETF",    "naming": "plain"},
+    {"dir": os.path.join(US_DATA_ROOT, "us_future_1h"),      "market": "US", "tz": "America/New_York", "asset_type": "Future", "naming": "future"},
+    {"dir": os.path.join(STOCK_DATA_ROOT, "hk_1h"),          "market": "HK", "tz": "Asia/Hong_Kong",   "asset_type": "Stock",  "naming": "hk"},
+    {"dir": os.path.join(STOCK_DATA_ROOT, "hk_etf_1h"),      "market": "HK", "tz": "Asia/Hong_Kong",   "asset_type": "ETF",    "naming": "hk"},
+    {"dir": os.path.join(STOCK_DATA_ROOT, "hk_reit_1h"),     "market": "HK", "tz": "Asia/Hong_Kong",   "asset_type": "REIT",   "naming": "hk"},
+    {"dir": os.path.join(STOCK_DATA_ROOT, "hk_bond_1h"),     "market": "HK", "tz": "Asia/Hong_Kong",   "asset_type": "Bond",   "naming": "hk"},
+]
+
+# [配置] 并行解析的进程数 / 每个分片的代码数 (同 clean_and_align.py)
+WORKERS = os.cpu_count() or 1
+TICKERS_PER_SHARD = 16
+# [配置] 额外写出 Hive 分区目录 (去掉 .parquet 的同名目录，见 data_get/market_dataset.py；可用 --partitioned 打开)
+PARTITIONED = False
+# [配置] 前向填充后仍没有收盘价的行删除 (同 merge_all_assets.py)
+DROPNA = ['Close']
+# [配置] 按交易日历补齐缺失的 K 线 (首尾之间期望有、数据里没有的小时，价格前向填充、成交量记 0；
+#        见 data_get/trading_calendar.py，可用 --align-sessions 打开)
+ALIGN_SESSIONS = False
+
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_get.sinks import parquet_sources, read_parquet_source
+from data_get.csv_reader import read_ohlcv_csv, OHLCV_SCHEMA
+from data_get.market_writer import MarketParquetWriter, finalize_ticker
+from data_get.build_manifest import BuildManifest, open_previous
+from data_get.market_schema import market_schema, conform_table
+from data_get.market_dataset import partition_file, dataset_path, dataset_stats
+from data_get.trading_calendar import calendar_for, expected_bars, align_to_grid
+
+# 文件名 stem (已去掉 _1h) -> 代码
+NAMING_RULES = {
+    "plain":  lambda stem: stem,
+    # 期货文件名里的 = 存成了 _ (ES=F -> ES_F_1h.csv)
+    "future": lambda stem: stem[:-2] + "=F" if stem.endswith("_F") else stem,
+    "hk":     lambda stem: stem if stem.endswith(".HK") else stem + ".HK",
+}
+
+PRICE_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+TARGET_COLS = ['Datetime', 'Ticker', 'Market', 'Asset_Type'] + PRICE_COLS
+# 统一紧凑类型 (见 data_get/market_schema.py)；多市场混合，tz 元数据为 UTC，各市场时区另记在 market_tz
+OUTPUT_SCHEMA = market_schema(TARGET_COLS)
+MARKET_TZ_KEY = b"market_tz"
+
+
+def market_timezones(registry=SOURCE_REGISTRY):
+    """{市场: 时区}，同一市场的来源必须用同一个时区"""
+    zones = {}
+    for source in registry:
+        if zones.setdefault(source["market"], source["tz"]) != source["tz"]:
+            raise ValueError(f"市场 {source['market']} 登记了两个时区: {zones[source['market']]} / {source['tz']}")
+    return zones
+
+
+def output_schema(registry=SOURCE_REGISTRY):
+    """输出表结构 + 各市场时区元数据 (读回后可按 Market 转换到交易所本地时间)"""
+    return OUTPUT_SCHEMA.with_metadata({**OUTPUT_SCHEMA.metadata, MARKET_TZ_KEY: json.dumps(market_timezones(registry)).encode()})
+
+
+def read_market_timezones(path):
+    """读出统一数据集里记录的 {市场: 时区}"""
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(MARKET_TZ_KEY, b"{}"))
+
+
+def file_stem(filename):
+    stem = filename[:-len('.csv')]
+    for suffix in ('_1h', '_1H'):
+        if stem.endswith(suffix):
+            return stem[:-len(suffix)]
+    return stem
+
+
+def collect_sources(registry=SOURCE_REGISTRY):
+    """
+    按登记表列出全部来源 (不读数据)，返回 {ticker: {"market", "asset_type", "paths"}}。
+    同一目录下 Parquet 优先、同名 CSV 跳过；同一代码出现在多个目录时，以登记表里靠前的来源标签为准，数据合并去重。
+    """
+    sources = {}
+    for source in registry:
+        folder = source["dir"]
+        if not os.path.isdir(folder):
+            print(f"⚠️ 跳过不存在的目录: {folder}")
+            continue
+        name_fn = NAMING_RULES[source["naming"]]
+        found = {ticker: [path] for ticker, path in parquet_sources(folder).items()}
+        parquet_tickers = set(found)
+        csv_files = [f for f in os.listdir(folder) if f.lower().endswith('.csv')]
+        for filename in csv_files:
+            ticker = name_fn(file_stem(filename))
+            if ticker in parquet_tickers: continue
+            found.setdefault(ticker, []).append(os.path.join(folder, filename))
+        print(f"📂 [{source['market']}/{source['asset_type']}] {folder}: {len(csv_files)} 个 CSV, {len(parquet_tickers)} 个 Parquet")
+
+        for ticker, paths in found.items():
+            entry = sources.setdefault(ticker, {"market": source["market"], "asset_type": source["asset_type"], "paths": []})
+            entry["paths"].extend(paths)
+    return sources
+
+
+def load_source(path):
+    """读取一个来源为 Arrow 表 (Datetime UTC + OHLCV float64)；无有效数据返回 None"""
+    if path.lower().endswith('.csv'):
+        return read_ohlcv_csv(path)
+    df = read_parquet_source(path)
+    if df.empty: return None
+    df['Datetime'] = df['Datetime'].dt.tz_convert('UTC')
+    for c in PRICE_COLS:
+        if c not in df.columns: df[c] = None
+    return pa.Table.from_pandas(df[OHLCV_SCHEMA.names], preserve_index=False).cast(OHLCV_SCHEMA)
+
+
+def ingest_ticker(ticker, entry, align=ALIGN_SESSIONS):
+    """
+    读取一只代码的全部来源，去重 + 排序 (+ 按交易日历补齐) + 前向填充后返回 (Arrow 表, {来源路径: 有效行数})；
+    无有效数据时表为 None
+    """
+    tables, file_rows = [], {}
+    for path in entry["paths"]:
+        try:
+            table = load_source(path)
+        except Exception:
+            table = None
+        file_rows[path] = 0 if table is None else table.num_rows
+        if table is not None:
+            tables.append(table)
+    if not tables:
+        return None, file_rows
+
+    # 同一时间点多来源/重复行只保留第一条 (同 merge_all_assets.py)
+    df = pa.concat_tables(tables).to_pandas().drop_duplicates(subset=['Datetime'])
+    if align:
+        df = df.sort_values('Datetime', kind='stable')
+        calendar = calendar_for(entry["market"], entry["asset_type"])
+        df = align_to_grid(df, expected_bars(calendar, df['Datetime'].iloc[0], df['Datetime'].iloc[-1]))
+    df['Ticker'] = ticker
+    df['Market'] = entry["market"]
+    df['Asset_Type'] = entry["asset_type"]
+    df = finalize_ticker(df, dropna=DROPNA)
+    return conform_table(pa.Table.from_pandas(df[TARGET_COLS], preserve_index=False), OUTPUT_SCHEMA), file_rows
+
+
+def ingest_shard(jobs, align=ALIGN_SESSIONS):
+    """worker 进程：按代码顺序返回 [(代码, Arrow 表或 None, 各文件行数)]"""
+    return [(ticker, *ingest_ticker(ticker, entry, align)) for ticker, entry in jobs]
+
+
+def iter_ingest_shards(jobs, workers=WORKERS, align=ALIGN_SESSIONS):
+    """分片交给进程池并行解析，按提交顺序 yield 结果；在途分片数限制为 workers 的 2 倍"""
+    if not jobs:
+        return
+    shards = [jobs[i:i + TICKERS_PER_SHARD] for i in range(0, len(jobs), TICKERS_PER_SHARD)]
+    workers = max(1, min(int(workers), len(shards)))
+    if workers == 1:
+        for shard in shards:
+            yield ingest_shard(shard, align)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(ingest_shard, shard, align))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_ingest(registry=SOURCE_REGISTRY, output_file=OUTPUT_FILE, workers=WORKERS, full=False, partitioned=PARTITIONED,
+               align=ALIGN_SESSIONS):
+    print("=" * 50)
+    print("🌐 统一数据入库 (US + HK, 单次并行扫描)")
+    print("=" * 50)
+
+    # 1. 按登记表列出全部来源
+    sources = collect_sources(registry)
+    if not sources:
+        print("❌ 未找到任何来源，请检查 SOURCE_REGISTRY 路径。")
+        return
+
+    # 2. 对照清单: 只重新解析新增 / 内容变化的文件 (登记表变化 = 标签可能变了，整体重建)
+    schema = output_schema(registry)
+    params = {"schema": schema.to_string(), "registry": registry, "dropna": DROPNA, "align_sessions": align}
+    manifest = BuildManifest(output_file, params=params)
+    plan = manifest.plan({t: e["paths"] for t, e in sources.items()}, full=full)
+    previous = open_previous(plan, output_file)
+    dirty = plan.dirty if previous else set(sources)
+    print(f"🧾 增量清单: {plan.summary() if previous else f'全部重建 {len(dirty)} 只'}")
+
+    # 3. 按代码升序并行解析，逐只写出
+    jobs = [(t, sources[t]) for t in sorted(dirty)]
+    reused = deque(sorted(set(sources) - dirty))
+    counts = {}
+    print(f"🚀 开始入库 (Streaming, {workers} 进程, {len(jobs)} 只)...")
+    try:
+        with MarketParquetWriter(output_file, schema) as writer:
+            with tqdm(total=len(sources), unit="ticker") as pbar:
+                def count(ticker):
+                    key = (sources[ticker]["market"], sources[ticker]["asset_type"])
+                    counts[key] = counts.get(key, 0) + 1
+
+                def copy_reused(upto=None):
+                    # 代码 < upto 的未变化代码先从旧输出拷贝，保持整体升序
+                    while reused and (upto is None or reused[0] < upto):
+                        ticker = reused.popleft()
+                        if previous.copy_to(writer, ticker):
+                            count(ticker)
+                        pbar.update(1)
+
+                for results in iter_ingest_shards(jobs, workers, align):
+                    for ticker, table, file_rows in results:
+                        copy_reused(ticker)
+                        if table is not None and writer.write(table):
+                            count(ticker)
+                        for path, rows in file_rows.items():
+                            manifest.record(path, rows)
+                        pbar.update(1)
+                copy_reused()
+            if writer.rows == 0:
+                writer.abort()
+    finally:
+        if previous:
+            previous.close()
+
+    if writer.rows == 0:
+        print("❌ 错误：有效数据集为空！")
+        return
+
+    manifest.save()
+    print(f"💾 已保存至: {output_file}")
+    print(f"📊 总行数: {writer.rows:,} | 代码数: {writer.tickers:,}")
+    print("   具体分布:")
+    dist = pd.Series(counts, name='Ticker').rename_axis(['Market', 'Asset_Type']).sort_index()
+    print(dist.to_string())
+
+    if partitioned:
+        root = dataset_path(output_file)
+        partition_file(output_file, root)
+        partitions, files = dataset_stats(root)
+        print(f"🗂️ 分区目录已更新: {root} ({partitions:,} 个分区, {files:,} 个文件)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统一数据入库: 按来源登记表一次扫描全部市场")
+    parser.add_argument("--markets", nargs="+", help="只入库这些市场 (默认全部，如 US HK)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="输出 Parquet 路径")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="并行解析的进程数 (1 = 顺序读取)")
+    parser.add_argument("--full", action="store_true", help="忽略清单，全部重新解析")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED, help="额外写出 Hive 分区目录")
+    parser.add_argument("--align-sessions", action="store_true", default=ALIGN_SESSIONS, help="按交易日历补齐缺失的 K 线")
+    args = parser.parse_args()
+
+    registry = [s for s in SOURCE_REGISTRY if not args.markets or s["market"] in args.markets]
+    run_ingest(registry, output_file=args.output, workers=args.workers, full=args.full,
+               partitioned=args.partitioned, align=args.align_sessions)
@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
 import os
+import sys
 
 # --- 路径配置 ---
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,6 +12,10 @@ if "data_process" in current_script_dir:
 RAW_FILE = os.path.join(PROJECT_ROOT, "data_process", "full_market_data.parquet")
 PROCESSED_FILE = os.path.join(PROJECT_ROOT, "output", "engineered_features.parquet")
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_schema import read_market
+
 def run_investigation():
     print("="*50)
     print("🕵️‍♂️ 开始调查数据丢失原因 (Data Investigation)")
@@ -24,12 +28,12 @@ def run_investigation():
 
     print("📂 读取原始数据名单 (Full Market Data)...")
     # 只读 Ticker 列以节省内存
-    df_raw = pd.read_parquet(RAW_FILE, columns=['Ticker', 'Datetime'])
+    df_raw = read_market(RAW_FILE, columns=['Ticker', 'Datetime'])
     raw_tickers = set(df_raw['Ticker'].unique())
     print(f"   - 原始股票数: {len(raw_tickers)}")
 
     print("📂 读取特征数据名单 (Engineered Features)...")
-    df_proc = pd.read_parquet(PROCESSED_FILE, columns=['Ticker'])
+    df_proc = read_market(PROCESSED_FILE, columns=['Ticker'])
     proc_tickers = set(df_proc['Ticker'].unique())
     print(f"   - 幸存股票数: {len(proc_tickers)}")
 
@@ -0,0 +1,81 @@
+import os
+import sys
+import pandas as pd
+
+# ==================== 按需 (惰性) 指标计算 ====================
+# 查询工具原来只能读 engineered_features_final.parquet 里预先算好的列，而且那份文件 dropna 掉了
+# 每只代码的预热期。这里直接从原始 OHLCV 现算:
+#   1. warmup_bars(features) 给出要多读的前序 K 线数 (SMA_50 -> 49；EWM 按 EWM_TOLERANCE 截断；
+#      OBV 这类累计型指标依赖全部历史)
+#   2. 先只读该代码在 start 之前的 Datetime 列，定位第 N 根前序 K 线的时间
+#   3. 再按 (代码, 时间) 过滤读 OHLCV 切片 (单文件按行组统计裁剪，分区目录按桶 / 月份裁剪)，
+#      用 compute_indicators 计算后裁掉预热部分
+# 任意指标 (RSI_7、SMA_200 ...) 都可以直接查询，不需要为全市场落盘。
+#
+# 用法:
+#   df = lazy_features(RAW_FILE, 'AAPL', '2025-01-01', '2025-03-31', ['RSI_7', 'SMA_200'])
+#   df.attrs['warmup']   # 实际读到的预热 K 线数
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_script_dir)
+
+# 原始数据：清洗合并后的统一市场数据 (或同名 Hive 分区目录)
+RAW_FILE = os.path.join(project_root, "data_process", "full_market_data.parquet")
+
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_process.indicator_engine import compute_indicators, warmup_bars, FEATURE_COLS, INPUT_COLS
+from data_get.market_schema import read_market
+from data_get.market_dataset import is_partitioned, market_filter
+
+
+def _utc(ts):
+    """时间 -> UTC Timestamp (不带时区视为 UTC，同 market_filter)"""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def read_ticker(path, ticker, columns, start=None, end=None, before=False):
+    """
+    读取一只代码的若干列，start <= Datetime <= end (不传为不限)；before=True 时改为 Datetime < end。
+    """
+    if is_partitioned(path):
+        df = read_market(path, columns=columns, filters=market_filter(tickers=[ticker], start=start, end=end))
+    else:
+        filters = [('Ticker', '==', ticker)]
+        if start is not None:
+            filters.append(('Datetime', '>=', start.to_pydatetime()))
+        if end is not None:
+            filters.append(('Datetime', '<' if before else '<=', end.to_pydatetime()))
+        df = read_market(path, columns=columns, filters=filters)
+    if before and end is not None:
+        df = df[df['Datetime'] < end]
+    return df.sort_values('Datetime', kind='stable', ignore_index=True)
+
+
+def lazy_features(path, ticker, start, end, features=None):
+    """
+    按需计算一只代码在 [start, end] 内的指标 (features 默认全套 FEATURE_COLS)。
+    返回 Datetime (UTC) / Ticker / OHLCV / 指标列，不 dropna；历史不足时开头几行为 NaN。
+    df.attrs: 'tz' 交易所时区，'warmup' 实际读到的预热 K 线数，'needed' 需要的预热数 (None = 全部历史)
+    """
+    features = list(FEATURE_COLS if features is None else features)
+    needed = warmup_bars(features)
+    start, end = _utc(start), _utc(end)
+
+    # 1. 定位预热起点: 只读 start 之前的时间列
+    if needed == 0:
+        since = start
+    else:
+        history = read_ticker(path, ticker, ['Datetime'], end=start, before=True)['Datetime']
+        since = None if needed is None or len(history) < needed else history.iloc[-needed]
+
+    # 2. 读 OHLCV 切片 (含预热期) 并计算
+    df = read_ticker(path, ticker, ['Datetime', 'Ticker'] + INPUT_COLS, start=since, end=end)
+    tz = df.attrs.get('tz', 'UTC')
+    in_range = (df['Datetime'] >= start).to_numpy()
+    if len(df):
+        df = compute_indicators(df, features=features)
+    df = df[in_range].reset_index(drop=True)
+    df.attrs.update(tz=tz, warmup=int(len(in_range) - in_range.sum()), needed=needed)
+    return df
@@ -0,0 +1,580 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# ==================== 在线 (增量) 指标引擎 ====================
+# 每天只新增几根 K 线，却要把每只代码两年的历史整段重算一遍。
+# 这里给每只代码保存指标的中间状态，新 K 线到来时每只代码只做 O(窗口) 的更新:
+#   - rolling mean / std : 环形缓冲 (最近 N 个值) + 与 pandas Cython 内核相同的 Kahan 累加和 / Welford 状态
+#   - rolling min / max  : 直接在环形缓冲上取极值
+#   - ewm (EMA / Wilder) : 当前加权值 + 旧权重，递推式与 pandas ewm 内核相同
+#   - shift / cumsum     : 最近 k 个值 / 累计和 (OBV)
+# 公式不重写: indicator_columns 换上 StreamOps 后，每一步只算“本步有新 K 线的代码”各一行，
+# 同一步的所有代码在一次向量化调用里完成。状态更新逐位照抄 pandas 的运算顺序，
+# 所以结果与批量路径 (compute_indicators) 逐位一致，warmup --check 会对账。
+#
+# 状态按 indicator_columns 计算图里时序算子的执行顺序编号 (slot)，公式改动后对不上会报错，需要重新 warmup。
+# 要算哪些特征在 warmup 时决定 (--features，默认 FEATURE_COLS)，记在状态文件里，update 沿用。
+#
+# 用法:
+#   python data_process/online_indicators.py warmup [--check] [--features RSI_7 SMA_200]   # 从全量历史建立状态
+#   python data_process/online_indicators.py update             # 只处理状态之后的新 K 线，写出新特征行
+#   state = IndicatorState.load(STATE_FILE); out = state.update(new_bars); state.save(STATE_FILE)
+
+# ==================== 路径配置 ====================
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_script_dir)
+
+INPUT_FILE = os.path.join(project_root, "data_process", "full_market_data.parquet")
+OUTPUT_DIR = os.path.join(project_root, "data_process", "output")
+# 每只代码的指标状态 (warmup 生成，update 读写)
+STATE_FILE = os.path.join(OUTPUT_DIR, "indicator_state.npz")
+# update 本次新算出的特征行
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "online_features.parquet")
+
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_process.indicator_engine import indicator_columns, compute_indicators, FEATURE_COLS, INPUT_COLS
+from data_get.market_schema import read_market, write_market
+from data_get.market_dataset import is_partitioned, market_filter
+
+STATE_VERSION = 2
+# pandas roll_var: 移出旧值后平方和相对移出前跌到 1000·eps 以下 (灾难性抵消) 时，用窗口里剩下的值重算
+VAR_RECOMPUTE = 1000 * np.finfo(np.float64).eps
+# 还没处理过任何 K 线的代码的 last_time
+NEVER = np.iinfo(np.int64).min
+# [配置] update 读取时按 last_time 分组的最大组数 (每组一个 Ticker in ... & Datetime > ... 条件)
+CUTOFF_GROUPS = 32
+
+
+# ==================== 1. 单个调用点的状态 (第 0 维 = 代码) ====================
+class _Slot:
+    kind = None
+
+    def __init__(self, n=0, **params):
+        self.params = params
+        self.data = {name: np.full((n,) + shape, fill, dtype=dtype)
+                     for name, (fill, dtype, shape) in self.fields().items()}
+
+    def fields(self):
+        """{数组名: (初始值, dtype, 每只代码的形状)}"""
+        return {}
+
+    def grow(self, n):
+        for name, (fill, dtype, shape) in self.fields().items():
+            self.data[name] = np.concatenate([self.data[name], np.full((n,) + shape, fill, dtype=dtype)])
+
+
+class _Window(_Slot):
+    """环形缓冲: buf[行, count % 窗口] 是 窗口 步之前写入的值 (不满窗口时仍是初始的 NaN)"""
+
+    def fields(self):
+        return {'buf': (np.nan, np.float64, (self.params['window'],)), 'count': (0, np.int64, ())}
+
+    def _oldest(self, rows):
+        pos = self.data['count'][rows] % self.params['window']
+        return pos, self.data['buf'][rows, pos]
+
+    def _store(self, rows, pos, x):
+        self.data['buf'][rows, pos] = x
+        self.data['count'][rows] += 1
+
+
+class _RollingMean(_Window):
+    """pandas roll_mean: Kahan 累加 (加 / 减各一个补偿项)，外加负数个数与连续相同值的修正"""
+    kind = "mean"
+
+    def fields(self):
+        return {**super().fields(), 'nobs': (0, np.int64, ()), 'sum': (0.0, np.float64, ()),
+                'neg': (0, np.int64, ()), 'cadd': (0.0, np.float64, ()), 'crem': (0.0, np.float64, ()),
+                'same': (0, np.int64, ()), 'prev': (np.nan, np.float64, ())}
+
+    def push(self, rows, x):
+        d, window = self.data, self.params['window']
+        pos, old = self._oldest(rows)
+        # 移出旧值 (remove_mean)
+        m = ~np.isnan(old)
+        r, v = rows[m], old[m]
+        d['nobs'][r] -= 1
+        y = -v - d['crem'][r]
+        t = d['sum'][r] + y
+        d['crem'][r] = t - d['sum'][r] - y
+        d['sum'][r] = t
+        d['neg'][r] -= np.signbit(v)
+        # 加入新值 (add_mean)
+        self._store(rows, pos, x)
+        m = ~np.isnan(x)
+        r, v = rows[m], x[m]
+        d['nobs'][r] += 1
+        y = v - d['cadd'][r]
+        t = d['sum'][r] + y
+        d['cadd'][r] = t - d['sum'][r] - y
+        d['sum'][r] = t
+        d['neg'][r] += np.signbit(v)
+        d['same'][r] = np.where(v == d['prev'][r], d['same'][r] + 1, 1)
+        d['prev'][r] = v
+        # calc_mean
+        n, neg = d['nobs'][rows], d['neg'][rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            res = d['sum'][rows] / n
+        res = np.where(d['same'][rows] >= n, d['prev'][rows],
+                       np.where((neg == 0) & (res < 0), 0.0, np.where((neg == n) & (res > 0), 0.0, res)))
+        return np.where((n >= window) & (n > 0), res, np.nan)
+
+
+class _RollingStd(_Window):
+    """pandas roll_var (ddof=1) 开方: 带 Kahan 补偿的 Welford，平方和骤降时用窗口剩余值重算"""
+    kind = "std"
+
+    def fields(self):
+        return {**super().fields(), 'nobs': (0, np.int64, ()), 'mean': (0.0, np.float64, ()),
+                'ssq': (0.0, np.float64, ()), 'cadd': (0.0, np.float64, ()), 'crem': (0.0, np.float64, ())}
+
+    def _add(self, r, v):
+        d = self.data
+        d['nobs'][r] += 1
+        mean, comp = d['mean'][r], d['cadd'][r]
+        prev_mean = mean - comp
+        y = v - comp
+        t = y - mean
+        d['cadd'][r] = t + mean - y
+        mean = mean + t / d['nobs'][r]
+        d['mean'][r] = mean
+        d['ssq'][r] = d['ssq'][r] + (v - prev_mean) * (v - mean)
+
+    def _remove(self, r, v, pos):
+        d = self.data
+        before = d['ssq'][r]
+        d['nobs'][r] -= 1
+        n = d['nobs'][r]
+        empty = n == 0
+        d['mean'][r[empty]] = 0.0
+        d['ssq'][r[empty]] = 0.0
+        rr, v, n = r[~empty], v[~empty], n[~empty]
+        mean, comp = d['mean'][rr], d['crem'][rr]
+        prev_mean = mean - comp
+        y = v - comp
+        t = y - mean
+        d['crem'][rr] = t + mean - y
+        mean = mean - t / n
+        d['mean'][rr] = mean
+        d['ssq'][rr] = d['ssq'][rr] - (v - prev_mean) * (v - mean)
+
+        redo = (d['nobs'][r] > 0) & (d['ssq'][r] < before * VAR_RECOMPUTE)
+        if redo.any():
+            self._recompute(r[redo], pos[redo])
+
+    def _recompute(self, r, pos):
+        """从零开始把窗口里剩下的 窗口-1 个值 (按时间顺序，不含 pos 处将被移出的值) 重新加一遍"""
+        d, window = self.data, self.params['window']
+        order = (pos[:, None] + 1 + np.arange(window - 1)) % window
+        values = d['buf'][r[:, None], order]
+        for name in ('nobs', 'mean', 'ssq', 'cadd', 'crem'):
+            d[name][r] = 0
+        for j in range(window - 1):
+            m = ~np.isnan(values[:, j])
+            self._add(r[m], values[m, j])
+
+    def push(self, rows, x):
+        d, window = self.data, self.params['window']
+        pos, old = self._oldest(rows)
+        m = ~np.isnan(old)
+        self._remove(rows[m], old[m], pos[m])
+        self._store(rows, pos, x)
+        m = ~np.isnan(x)
+        self._add(rows[m], x[m])
+        # calc_var + zsqrt
+        n = d['nobs'][rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = d['ssq'][rows] / (n - 1)
+            res = np.sqrt(var)
+        res[var < 0] = 0.0
+        return np.where((n >= window) & (n > 1), res, np.nan)
+
+
+class _RollingMin(_Window):
+    kind = "min"
+    reduce = np.fmin
+
+    def push(self, rows, x):
+        pos, _ = self._oldest(rows)
+        self._store(rows, pos, x)
+        win = self.data['buf'][rows]
+        full = (~np.isnan(win)).sum(axis=1) >= self.params['window']
+        return np.where(full, self.reduce.reduce(win, axis=1), np.nan)
+
+
+class _RollingMax(_RollingMin):
+    kind = "max"
+    reduce = np.fmax
+
+
+class _Shift(_Window):
+    """shift(k): 环形缓冲里 k 步之前的值就是输出 (前 k 步是初始的 NaN)"""
+    kind = "shift"
+
+    def push(self, rows, x):
+        pos, old = self._oldest(rows)
+        self._store(rows, pos, x)
+        return old
+
+
+class _Ewm(_Slot):
+    """pandas ewm (adjust=False, ignore_na=False) 的递推: weighted / old_wt / nobs"""
+    kind = "ewm"
+
+    def fields(self):
+        return {'weighted': (np.nan, np.float64, ()), 'old_wt': (1.0, np.float64, ()),
+                'nobs': (0, np.int64, ()), 'started': (False, np.bool_, ())}
+
+    def push(self, rows, x):
+        d, alpha = self.data, self.params['alpha']
+        obs = ~np.isnan(x)
+        # 每只代码的第一个值直接作为初值
+        first = ~d['started'][rows]
+        r = rows[first]
+        d['weighted'][r] = x[first]
+        d['nobs'][r] = obs[first]
+        d['started'][r] = True
+
+        rest = ~first
+        r, v, o = rows[rest], x[rest], obs[rest]
+        d['nobs'][r] += o
+        weighted, old_wt = d['weighted'][r], d['old_wt'][r]
+        live = ~np.isnan(weighted)
+        old_wt = np.where(live, old_wt * (1. - alpha), old_wt)
+        with np.errstate(invalid='ignore'):
+            mixed = (old_wt * weighted + alpha * v) / (old_wt + alpha)
+        weighted = np.where(live & o & (weighted != v), mixed, weighted)
+        old_wt = np.where(live & o, 1., old_wt)
+        weighted = np.where(~live & o, v, weighted)
+        d['weighted'][r] = weighted
+        d['old_wt'][r] = old_wt
+        return np.where(d['nobs'][rows] >= max(self.params['min_periods'], 1), d['weighted'][rows], np.nan)
+
+
+class _Cumsum(_Slot):
+    """groupby cumsum: Kahan 累加，NaN 处输出 NaN 且不改变累计值"""
+    kind = "cumsum"
+
+    def fields(self):
+        return {'total': (0.0, np.float64, ()), 'comp': (0.0, np.float64, ())}
+
+    def push(self, rows, x):
+        d = self.data
+        m = ~np.isnan(x)
+        r, v = rows[m], x[m]
+        y = v - d['comp'][r]
+        t = d['total'][r] + y
+        d['comp'][r] = t - d['total'][r] - y
+        d['total'][r] = t
+        return np.where(m, d['total'][rows], np.nan)
+
+
+SLOT_TYPES = {cls.kind: cls for cls in (_RollingMean, _RollingStd, _RollingMin, _RollingMax, _Shift, _Ewm, _Cumsum)}
+
+
+def _ewm_alpha(span=None, alpha=None):
+    """与 pandas 相同的换算 (先换成 com 再求 alpha)，保证逐位一致"""
+    com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+    return 1. / (1. + com)
+
+
+# ==================== 2. 增量时序算子 ====================
+class _StreamRolling:
+    def __init__(self, ops, x, window):
+        self.ops, self.x, self.window = ops, x, window
+
+    def mean(self):
+        return self.ops._push(self.x, _RollingMean, window=self.window)
+
+    def std(self):
+        return self.ops._push(self.x, _RollingStd, window=self.window)
+
+    def min(self):
+        return self.ops._push(self.x, _RollingMin, window=self.window)
+
+    def max(self):
+        return self.ops._push(self.x, _RollingMax, window=self.window)
+
+
+class StreamOps:
+    """
+    indicator_columns 的增量版时序算子: 输入是本步各代码的一行 (Series，长度 = 本步代码数)，
+    rows 是这些代码在 state 里的行号；每个调用点的状态按调用顺序存放在 state.slots。
+    """
+
+    def __init__(self, state, rows):
+        self.state = state
+        self.rows = rows
+        self.calls = 0
+
+    def _push(self, x, cls, **params):
+        slots, k = self.state.slots, self.calls
+        self.calls += 1
+        if k == len(slots):
+            slots.append(cls(len(self.state.tickers), **params))
+        if slots[k].kind != cls.kind or slots[k].params != params:
+            raise ValueError(f"指标状态与公式不一致 (第 {k} 个时序算子)，请重新 warmup")
+        out = slots[k].push(self.rows, x.to_numpy(dtype=np.float64))
+        return pd.Series(out, index=x.index)
+
+    def rolling(self, x, window):
+        return _StreamRolling(self, x, window)
+
+    def ewm_mean(self, x, span=None, alpha=None, min_periods=0, adjust=True):
+        if adjust:
+            raise ValueError("增量 EWM 只支持 adjust=False")
+        return self._push(x, _Ewm, alpha=_ewm_alpha(span, alpha), min_periods=min_periods)
+
+    def shift(self, x, periods):
+        return self._push(x, _Shift, window=periods)
+
+    def cumsum(self, x):
+        return self._push(x, _Cumsum)
+
+    def not_first(self, x):
+        return (self.state.bars[self.rows] > 0).astype(np.float64)
+
+
+# ==================== 3. 全市场状态 ====================
+class IndicatorState:
+    def __init__(self, features=None):
+        # 要计算的特征 (见 indicator_engine.parse_feature)，决定计算图和 slot 布局
+        self.features = list(FEATURE_COLS if features is None else features)
+        self.tickers = []
+        self.codes = {}
+        # 每只代码已处理的 K 线数 / 最后一根的时间 (UTC ns)
+        self.bars = np.zeros(0, dtype=np.int64)
+        self.last_time = np.zeros(0, dtype=np.int64)
+        self.slots = []
+
+    def _rows_for(self, tickers):
+        """代码 -> 状态行号，新代码追加新行"""
+        new = [t for t in tickers if t not in self.codes]
+        for t in new:
+            self.codes[t] = len(self.tickers)
+            self.tickers.append(t)
+        if new:
+            self.bars = np.concatenate([self.bars, np.zeros(len(new), dtype=np.int64)])
+            self.last_time = np.concatenate([self.last_time, np.full(len(new), NEVER, dtype=np.int64)])
+            for slot in self.slots:
+                slot.grow(len(new))
+        return np.array([self.codes[t] for t in tickers], dtype=np.int64)
+
+    def step(self, rows, inputs):
+        """rows 里的每只代码各前进一根 K 线 (inputs: {OHLCV 列: 数组})，返回 {指标名: float64 数组}"""
+        ops = StreamOps(self, rows)
+        cols = {c: pd.Series(inputs[c]) for c in INPUT_COLS}
+        out = indicator_columns(cols['Open'], cols['High'], cols['Low'], cols['Close'], cols['Volume'],
+                                ops=ops, features=self.features)
+        if ops.calls != len(self.slots):
+            raise ValueError("指标状态与公式不一致 (时序算子个数不同)，请重新 warmup")
+        self.bars[rows] += 1
+        return {c: out[c].to_numpy() for c in self.features}
+
+    def update(self, df, progress=None):
+        """
+        追加新 K 线 (长表: Ticker, Datetime, OHLCV，可含多只代码、每只多根)。
+        不晚于该代码已处理的最后时间的行直接跳过 (同一批数据重复喂入不会重复累加)。
+        返回实际处理的行 (按 Ticker, Datetime 排序)，追加 self.features 各列 (float32)。
+        progress: 可选回调 progress(本步处理的行数)。
+        """
+        df = df.sort_values(['Ticker', 'Datetime'], kind='stable', ignore_index=True)
+        codes, uniques = pd.factorize(df['Ticker'])
+        rows = self._rows_for([str(t) for t in uniques])[codes]
+        times = pd.DatetimeIndex(df['Datetime']).as_unit('ns').asi8
+        keep = times > self.last_time[rows]
+        if not keep.all():
+            df, rows, times = df[keep].reset_index(drop=True), rows[keep], times[keep]
+
+        # 每行是本代码的第几根新 K 线 -> 第 k 步处理所有代码的第 k 根
+        n = len(df)
+        start = np.r_[True, rows[1:] != rows[:-1]] if n else np.zeros(0, dtype=bool)
+        k = np.arange(n) - np.maximum.accumulate(np.where(start, np.arange(n), 0))
+        order = np.argsort(k, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(k))] if n else np.zeros(1, dtype=np.int64)
+
+        inputs = {c: df[c].to_numpy(dtype=np.float64) for c in INPUT_COLS}
+        results = {c: np.full(n, np.nan, dtype=np.float32) for c in self.features}
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            idx = order[a:b]
+            out = self.step(rows[idx], {c: inputs[c][idx] for c in INPUT_COLS})
+            for c in self.features:
+                results[c][idx] = out[c]
+            if progress:
+                progress(len(idx))
+
+        np.maximum.at(self.last_time, rows, times)
+        for c in self.features:
+            df[c] = results[c]
+        return df
+
+    def save(self, path):
+        """np.savez 单文件 (先写临时文件再原子替换)"""
+        arrays = {'tickers': np.array(self.tickers, dtype=str), 'bars': self.bars, 'last_time': self.last_time}
+        layout = []
+        for k, slot in enumerate(self.slots):
+            layout.append({"kind": slot.kind, "params": slot.params})
+            for name, arr in slot.data.items():
+                arrays[f"slot{k}_{name}"] = arr
+        meta = {"version": STATE_VERSION, "features": self.features, "layout": layout}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取状态；文件不存在或版本不一致时返回 None (需要重新 warmup)"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z['meta']))
+            if meta.get("version") != STATE_VERSION:
+                return None
+            state = cls(meta["features"])
+            state.tickers = [str(t) for t in z['tickers']]
+            state.codes = {t: i for i, t in enumerate(state.tickers)}
+            state.bars = z['bars']
+            state.last_time = z['last_time']
+            for k, spec in enumerate(meta["layout"]):
+                slot = SLOT_TYPES[spec["kind"]](0, **spec["params"])
+                slot.data = {name: z[f"slot{k}_{name}"] for name in slot.data}
+                state.slots.append(slot)
+        return state
+
+
+# ==================== 4. 主程序 ====================
+def cutoff_groups(state, max_groups=CUTOFF_GROUPS):
+    """
+    按 last_time 把代码分组，返回 [(截止时间 UTC ns, [代码, ...]), ...]。
+    不同的 last_time 超过 max_groups 个时按分位数合并，组内取最早的时间 (只会多读，不会漏读)。
+    """
+    if not state.tickers:
+        return []
+    times = np.unique(state.last_time)
+    edges = times[np.unique(np.linspace(0, len(times) - 1, max_groups).astype(np.int64))]
+    group = np.searchsorted(edges, state.last_time, side='right') - 1
+    tickers = np.array(state.tickers, dtype=object)
+    return [(int(edges[g]), tickers[group == g].tolist()) for g in np.unique(group)]
+
+
+def read_new_bars(input_file, state):
+    """
+    只读每只代码各自最后时间之后的 K 线: (Ticker in 组) & (Datetime > 组截止时间) 逐组 OR，
+    退市 / 停牌的代码不会把所有代码的读取窗口拖回历史起点；更早的行 update 里也会逐只跳过。
+    输入里新出现的代码 (没有状态) 读取完整历史。
+    """
+    partitioned = is_partitioned(input_file)
+    groups = cutoff_groups(state)
+    if not groups:
+        return read_market(input_file)
+
+    # 新上市的代码没有状态，需要从它的第一根 K 线读起 (先只读 Ticker 列找出来)
+    listed = read_market(input_file, columns=['Ticker'])['Ticker'].astype(str).unique()
+    new = sorted(set(listed) - set(state.codes))
+    if new:
+        print(f"🆕 新代码 {len(new)} 只，读取完整历史")
+        groups.append((NEVER, new))
+
+    if partitioned:
+        filters = None
+        for cutoff, tickers in groups:
+            since = None if cutoff == NEVER else pd.Timestamp(cutoff, tz='UTC')
+            expr = market_filter(tickers=tickers, start=since)
+            filters = expr if filters is None else filters | expr
+    else:
+        filters = []
+        for cutoff, tickers in groups:
+            term = [('Ticker', 'in', tickers)]
+            if cutoff != NEVER:
+                term.append(('Datetime', '>', pd.Timestamp(cutoff, tz='UTC').to_pydatetime()))
+            filters.append(term)
+    return read_market(input_file, filters=filters)
+
+
+def run_warmup(input_file=INPUT_FILE, state_file=STATE_FILE, check=False, features=None):
+    print("=" * 50)
+    print("🔥 在线指标引擎: 从全量历史建立状态")
+    print("=" * 50)
+    if not os.path.exists(input_file):
+        print(f"❌ 找不到输入文件: {input_file}")
+        return None
+
+    df = read_market(input_file, columns=['Datetime', 'Ticker'] + INPUT_COLS)
+    print(f"📊 历史数据: {len(df):,} 行 | 股票数: {df['Ticker'].nunique()}")
+    state = IndicatorState(features)
+    t0 = time.time()
+    with tqdm(total=len(df), desc="Warmup") as pbar:
+        out = state.update(df, progress=pbar.update)
+    state.save(state_file)
+    print(f"💾 状态已保存: {state_file} ({len(state.tickers)} 只代码, {len(state.features)} 个特征, {len(state.slots)} 个算子, {time.time() - t0:.1f}s)")
+
+    if check:
+        # 与批量引擎逐位对账 (out 已按 Ticker, Datetime 排序，满足 compute_indicators 的输入要求)
+        print("🔍 正在与批量引擎 (compute_indicators) 对账...")
+        ref = compute_indicators(out[['Ticker', 'Datetime'] + INPUT_COLS].copy(), features=state.features)
+        diff = [c for c in state.features if not np.array_equal(ref[c].to_numpy(), out[c].to_numpy(), equal_nan=True)]
+        if diff:
+            print(f"❌ 不一致的指标: {diff}")
+        else:
+            print(f"✅ {len(state.features)} 个指标与批量路径逐位一致")
+    return state
+
+
+def run_update(input_file=INPUT_FILE, state_file=STATE_FILE, output_file=OUTPUT_FILE):
+    print("=" * 50)
+    print("⚡ 在线指标引擎: 增量更新")
+    print("=" * 50)
+    state = IndicatorState.load(state_file)
+    if state is None:
+        print(f"❌ 没有可用的指标状态 ({state_file})，请先运行 warmup")
+        return None
+
+    df = read_new_bars(input_file, state)
+    tz = df.attrs['tz']
+
+    t0 = time.time()
+    out = state.update(df)
+    state.save(state_file)
+    elapsed = time.time() - t0
+    updated = out['Ticker'].nunique()
+    print(f"⚙️ 新 K 线 {len(out):,} 根 | {updated} 只代码 | {elapsed:.3f}s"
+          + (f" ({elapsed / updated * 1e6:.0f} µs/只)" if updated else ""))
+
+    # 与批量路径一致: 去掉仍在预热期 (含 NaN) 的行
+    out = out.dropna().reset_index(drop=True)
+    write_market(out, output_file, tz=tz)
+    print(f"💾 新特征行 {len(out):,} 行已保存: {output_file}")
+    if len(out):
+        print(out[['Datetime', 'Ticker', 'Close'] + state.features[:2]].head(3).to_string())
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在线 (增量) 技术指标引擎")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_warm = sub.add_parser("warmup", help="从全量历史建立每只代码的指标状态")
+    p_warm.add_argument("--input", default=INPUT_FILE, help="全市场 Parquet (或 Hive 分区目录)")
+    p_warm.add_argument("--state", default=STATE_FILE, help="状态文件路径")
+    p_warm.add_argument("--check", action="store_true", help="与批量引擎逐位对账")
+    p_warm.add_argument("--features", nargs="+", default=None, help="要计算的特征 (如 RSI_7 SMA_200)，默认全套 FEATURE_COLS")
+
+    p_up = sub.add_parser("update", help="只处理状态之后的新 K 线")
+    p_up.add_argument("--input", default=INPUT_FILE, help="含新 K 线的全市场 Parquet (或 Hive 分区目录)")
+    p_up.add_argument("--state", default=STATE_FILE, help="状态文件路径")
+    p_up.add_argument("--output", default=OUTPUT_FILE, help="新特征行的输出路径")
+
+    args = parser.parse_args()
+    if args.command == "warmup":
+        run_warmup(input_file=args.input, state_file=args.state, check=args.check, features=args.features)
+    else:
+        run_update(input_file=args.input, state_file=args.state, output_file=args.output)
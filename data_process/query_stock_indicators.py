@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import sys
 import argparse
 from datetime import datetime
 import pytz
@@ -8,18 +9,44 @@ import pytz
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_script_dir)
 
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data_get.market_schema import read_market
+from data_get.market_dataset import is_partitioned, market_filter
+from data_process.lazy_features import lazy_features, RAW_FILE
+
 # 指向生成的特征文件 (假设你已经运行了特征工程脚本)
 # 如果你的美股特征文件名字不同，请在这里修改
 DATA_FILE = os.path.join(project_root, "data_process", "output", "engineered_features_final.parquet")
+# [配置] 按需计算模式: 不读特征库，直接从原始 OHLCV (RAW_FILE) 现算指定指标 (可用 --lazy 打开，见 lazy_features.py)
+LAZY = False
 
 # ==================== 2. 核心查询类 (美股版) ====================
 class USStockQueryTool:
-    def __init__(self, file_path):
+    def __init__(self, file_path, lazy=LAZY, raw_file=RAW_FILE):
+        self.lazy = lazy
+        self.raw_file = raw_file
+        if lazy:
+            # 按需计算: 查询时只读该代码的 OHLCV 切片 + 预热期
+            if not os.path.exists(raw_file):
+                raise FileNotFoundError(f"找不到原始数据: {raw_file}")
+            print(f"📂 [美股模式] 按需计算模式，原始数据: {raw_file}")
+            self.path, self.df = raw_file, None
+            return
+
         print(f"📂 [美股模式] 正在加载数据库: {file_path} ...")
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到特征数据库: {file_path}\n请确保你已经针对美股数据运行了 feature_engineering.py！")
         
-        self.df = pd.read_parquet(file_path)
+        self.path = file_path
+        self.df = None
+        if is_partitioned(file_path):
+            # Hive 分区目录: 不整体加载，查询时按代码/时间下推过滤
+            print("✅ 分区数据集模式：按需读取。")
+            return
+
+        # 统一紧凑类型读取 (float32 / category)，内存不到原来的一半
+        self.df = read_market(file_path)
         print(f"✅ 数据库加载完成！共 {len(self.df):,} 条记录。")
         
         # 核心修改：强制转换为美东时间 (EST/EDT)
@@ -29,7 +56,24 @@ class USStockQueryTool:
         else:
              self.df['Datetime'] = self.df['Datetime'].dt.tz_convert('America/New_York')
 
-    def query(self, ticker, start_str, end_str):
+    def load_ticker(self, ticker, start=None, end=None):
+        """取一只代码的数据 (美东时间)；分区目录只读该代码所在的桶和月份"""
+        if self.df is not None:
+            return self.df[self.df['Ticker'] == ticker].copy()
+        df = read_market(self.path, filters=market_filter(tickers=[ticker], start=start, end=end))
+        df['Datetime'] = df['Datetime'].dt.tz_convert('America/New_York')
+        return df
+
+    def load_lazy(self, ticker, start, end, features=None):
+        """从原始 OHLCV 现算一只代码在 [start, end] 内的指标 (美东时间)，自动多读所需的预热 K 线"""
+        df = lazy_features(self.raw_file, ticker, start, end, features)
+        df['Datetime'] = df['Datetime'].dt.tz_convert('America/New_York')
+        needed = df.attrs['needed']
+        print(f"🧮 按需计算 {len(features) if features else '全套'} 个指标 | 预热 K 线: {df.attrs['warmup']}"
+              + (" (含累计型指标，读取全部历史)" if needed is None else f" / 需要 {needed}"))
+        return df
+
+    def query(self, ticker, start_str, end_str, features=None):
         # 1. 格式化 Ticker (美股处理逻辑)
         ticker = ticker.strip().upper()
         
@@ -39,31 +83,40 @@ class USStockQueryTool:
         
         print(f"\n🇺🇸 正在查询: [{ticker}] (美东时间) {start_str} 至 {end_str}")
 
-        # 2. 筛选 Ticker
-        stock_df = self.df[self.df['Ticker'] == ticker].copy()
+        # 2. 时间区间 (使用美东时间)
+        ny_tz = pytz.timezone('America/New_York')
+        try:
+            # 构造查询区间的开始和结束
+            start_date = ny_tz.localize(datetime.strptime(start_str, "%Y-%m-%d"))
+            end_date = ny_tz.localize(datetime.strptime(end_str + " 23:59:59", "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            print("❌ 日期格式错误！请使用 YYYY-MM-DD 格式。")
+            return
+
+        # 3. 筛选 Ticker (按需计算模式: 只读区间 + 预热期的原始数据并现算指标)
+        lazy = self.lazy or bool(features)
+        if lazy:
+            try:
+                stock_df = self.load_lazy(ticker, start_date, end_date, features)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return
+        else:
+            stock_df = self.load_ticker(ticker)
         
         if stock_df.empty:
             print(f"❌ 未找到代码为 {ticker} 的数据。")
             print("   提示：美股代码直接输入即可 (如 AAPL, SPY)。期货请带后缀 (如 ES=F, CL=F)。")
             return
 
-        # 3. 检查数据有效性范围
+        # 4. 检查数据有效性范围
         min_date = stock_df['Datetime'].min()
         max_date = stock_df['Datetime'].max()
         
         print(f"ℹ️ 数据有效覆盖期: {min_date.strftime('%Y-%m-%d')} 至 {max_date.strftime('%Y-%m-%d')}")
 
-        # 4. 时间过滤 (使用美东时间)
-        ny_tz = pytz.timezone('America/New_York')
-        try:
-            # 构造查询区间的开始和结束
-            start_date = ny_tz.localize(datetime.strptime(start_str, "%Y-%m-%d"))
-            end_date = ny_tz.localize(datetime.strptime(end_str + " 23:59:59", "%Y-%m-%d %H:%M:%S"))
-        except ValueError:
-            print("❌ 日期格式错误！请使用 YYYY-MM-DD 格式。")
-            return
-
-        if start_date < min_date:
+        # 按需计算模式的预热期在区间之前补齐，不会被剔除
+        if start_date < min_date and not lazy:
             print(f"⚠️ 警告: 开始时间早于数据起点。前 50 个周期可能因指标预热而被剔除。")
 
         mask = (stock_df['Datetime'] >= start_date) & (stock_df['Datetime'] <= end_date)
@@ -80,7 +133,7 @@ class USStockQueryTool:
         
         base_cols = ['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume']
         # 动态抓取所有计算出来的技术指标列
-        tech_cols = [c for c in result_df.columns if c not in base_cols and c != 'Ticker']
+        tech_cols = [c for c in result_df.columns if c not in base_cols and c not in ('Ticker', 'Market', 'Asset_Type')]
         
         # 检查 NaN 并解释原因
         nan_cols = result_df[tech_cols].isnull().sum()
@@ -107,8 +160,12 @@ class USStockQueryTool:
 
 # ==================== 3. 交互入口 ====================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="美股/期货特征查询器")
+    parser.add_argument("--lazy", action="store_true", default=LAZY, help="按需计算模式: 从原始 OHLCV 现算指标")
+    parser.add_argument("--raw", default=RAW_FILE, help="按需计算模式的原始数据 (Parquet 或 Hive 分区目录)")
+    args = parser.parse_args()
     # 自动定位文件路径
-    tool = USStockQueryTool(DATA_FILE)
+    tool = USStockQueryTool(DATA_FILE, lazy=args.lazy, raw_file=args.raw)
     
     while True:
         print("\n" + "-"*40)
@@ -119,5 +176,8 @@ if __name__ == "__main__":
             
         start_input = input("开始日期 (YYYY-MM-DD): ").strip()
         end_input = input("结束日期 (YYYY-MM-DD): ").strip()
+        features = None
+        if tool.lazy:
+            features = input("指标 (空格分隔，如 RSI_7 SMA_200；回车=全套): ").split() or None
         
-        tool.query(ticker_input, start_input, end_input)
\ No newline at end of file
+        tool.query(ticker_input, start_input, end_input, features=features)
\ No newline at end of file
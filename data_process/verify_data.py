@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
 import os
+import sys
 import matplotlib.pyplot as plt
 import warnings
 
@@ -12,6 +12,12 @@ current_script_dir = os.path.dirname(os.path.abspath(__file__))
 # 获取项目根目录 (Yfinance RPA) - 假设脚本在子文件夹中，向上一级
 project_root = os.path.dirname(current_script_dir)
 
+# 仓库根目录加入 sys.path (project_root 下面可能会回退，单独保存)
+REPO_ROOT = os.path.dirname(current_script_dir)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from data_get.market_schema import read_market
+
 # 如果脚本直接放在根目录下，上面的 project_root 可能会跑偏
 # 所以做一个简单的检查：如果 output 文件夹不在计算出的 root 下，就尝试当前目录
 if not os.path.exists(os.path.join(project_root, "output")):
@@ -40,7 +46,7 @@ def verify_data():
 
     print("📂 正在加载特征数据 (请稍候)...")
     try:
-        df = pd.read_parquet(OUTPUT_FILE)
+        df = read_market(OUTPUT_FILE)
     except Exception as e:
         print(f"❌ 读取失败: {e}")
         return
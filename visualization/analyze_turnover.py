@@ -2,12 +2,16 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
 
 # --- 1. 自动寻找数据文件 (复用之前的逻辑) ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 # 修正：以项目根为基准查找 output / data_process 下的 parquet 文件
 PROJECT_ROOT = os.path.abspath(os.path.join(current_dir, ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.market_schema import read_market
 possible_paths = [
     os.path.join(PROJECT_ROOT, "output", "engineered_features.parquet"),
     os.path.join(PROJECT_ROOT, "data_process", "full_market_data.parquet"),
@@ -45,7 +49,7 @@ def analyze_survivorship():
 
     print(f"📂 正在加载数据: {DATA_PATH}")
     # 只加载时间和代码列，速度极快
-    df = pd.read_parquet(DATA_PATH, columns=['Datetime', 'Ticker'])
+    df = read_market(DATA_PATH, columns=['Datetime', 'Ticker'])
     
     # 1. 计算全局时间范围 (整个班级的上课时间)
     global_start = df['Datetime'].min()
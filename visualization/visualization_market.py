@@ -1,8 +1,8 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import seaborn as sns
 import os
+import sys
 import numpy as np
 
 # --- 自动寻找数据文件 ---
@@ -13,6 +13,10 @@ PROJECT_ROOT = os.path.abspath(os.path.join(current_dir, ".."))
 DATA_PROCESS_DIR = os.path.join(PROJECT_ROOT, "data_process")
 OUTPUT_ROOT = os.path.join(PROJECT_ROOT, "output")
 
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from data_get.panel_store import ensure_panel
+
 # 优先顺序：output/engineered_features -> data_process/full_market_data -> output/full_market_data
 possible_paths = [
     os.path.join(OUTPUT_ROOT, "engineered_features.parquet"),
@@ -50,15 +54,15 @@ def run_visualization():
         return
 
     print(f"📂 正在加载数据: {DATA_PATH}")
-    print("   (文件较大，请耐心等待几秒...)")
+    print("   (首次运行会先构建 时间×代码 面板，之后直接内存映射打开)")
     
-    # 只加载必要的列，节省内存
-    df = pd.read_parquet(DATA_PATH, columns=['Datetime', 'Ticker', 'Close'])
+    # 稠密面板 (data_get/panel_store.py): 宽度统计和 pivot 都直接在 T×N 数组上做
+    panel = ensure_panel(DATA_PATH, fields=['Close'], market='US')
     
-    total_tickers = df['Ticker'].nunique()
-    total_rows = len(df)
-    min_date = df['Datetime'].min()
-    max_date = df['Datetime'].max()
+    total_tickers = len(panel.tickers)
+    total_rows = int(np.asarray(panel.valid).sum())
+    min_date = panel.index.min()
+    max_date = panel.index.max()
     
     print(f"✅ 数据加载完成！共 {total_rows:,} 行，{total_tickers} 只股票。")
 
@@ -69,8 +73,8 @@ def run_visualization():
     print("\n📈 正在绘制 [图1: 市场活跃度曲线]...")
     plt.figure(figsize=(12, 6))
     
-    # 按时间分组计数
-    active_counts = df.groupby('Datetime')['Ticker'].count()
+    # 每个时间点有数据的代码数 (面板 valid 矩阵按行求和)
+    active_counts = panel.breadth()
     
     # 绘图
     plt.plot(active_counts.index, active_counts.values, color='#2980b9', linewidth=1)
@@ -97,11 +101,10 @@ def run_visualization():
     plt.figure(figsize=(12, 6))
     
     # 随机抽 20 个 Ticker
-    sample_tickers = np.random.choice(df['Ticker'].unique(), 20, replace=False)
-    subset = df[df['Ticker'].isin(sample_tickers)].copy()
+    sample_tickers = np.random.choice(panel.tickers, min(20, total_tickers), replace=False)
     
-    # Pivot 表格以便绘图
-    pivot_df = subset.pivot(index='Datetime', columns='Ticker', values='Close')
+    # 直接从面板取宽表；面板时间轴覆盖全市场，去掉抽样代码全为 NaN 的行 (与原来的 pivot 一致)
+    pivot_df = panel.frame('Close', tickers=sample_tickers).dropna(how='all')
     
     # 归一化：全部除以第一天的价格，起跑线设为 1.0
     normalized_df = pivot_df / pivot_df.bfill().iloc[0]